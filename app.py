@@ -1,4 +1,5 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 from extensions import db, login_manager, csrf, migrate, mail
 from routes.auth import auth_bp
@@ -6,15 +7,51 @@ from routes.citizen import citizen_bp
 from routes.agency import agency_bp
 from routes.error import error_bp
 from routes.main import main_bp
+from token_store import init_token_store
+from session_store import init_session_store
+from rate_limit import init_rate_limiter
+from events import init_events
+from db_engine import engine_options_for, configure_engine
+from db_routing import configure_replica
+from counters import rebuild_counters_command
+from exports import export_applications_command
+from seed_data import generate_data_command
+from metrics import init_metrics
+from profiler import init_profiler
+from download_tokens import downloads_bp
+from page_cache import init_page_cache
+from compression import init_compression
+from static_assets import init_static_assets, build_static_command
+from storage_crypto import generate_storage_key_command
+from duplicates import init_duplicates, rebuild_fingerprints_command
 import os
 from datetime import timedelta
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
     app.config.from_object(Config)
+    if config_overrides:
+        app.config.update(config_overrides)
     
-    # Add verification cache
-    app.config['VERIFICATION_CACHE'] = {}
+    # Shared store for agency verification tokens and pending OTP registrations
+    init_token_store(app)
+    
+    # Client addresses from the trusted proxies' X-Forwarded-* headers
+    if app.config['PROXY_FIX_COUNT']:
+        count = app.config['PROXY_FIX_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=count, x_proto=count, x_host=count)
+    
+    # Throttle endpoints that send mail or hash passwords
+    init_rate_limiter(app)
+    
+    # Live status and notification events for citizens
+    init_events(app)
+    
+    # Cached public pages and the {% cache %} template tag
+    init_page_cache(app)
+    
+    # Photo hash index behind the reviewers' duplicate checks
+    init_duplicates(app)
     
     # Create uploads directory if it doesn't exist
     uploads_dir = os.path.join(app.root_path, 'uploads')
@@ -23,8 +60,24 @@ def create_app():
     # Set session timeout (30 minutes)
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
     
+    # Keep session data server-side so multi-step form drafts stay out of the cookie
+    init_session_store(app)
+    
+    # Pool sizing and SQLite pragmas tuned for the configured database
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options_for(app.config['SQLALCHEMY_DATABASE_URI'], app.config))
+    configure_replica(app)
+    
     # Initialize extensions
     db.init_app(app)
+    configure_engine(app)
+    
+    # Request timings, SQL counts and external-call spans; serves /metrics
+    init_metrics(app)
+    
+    # gzip/brotli for text responses and fingerprinted, long-cached static files
+    init_compression(app)
+    init_static_assets(app)
+    
     login_manager.init_app(app)
     csrf.init_app(app)
     migrate.init_app(app, db)
@@ -40,6 +93,18 @@ def create_app():
     app.register_blueprint(agency_bp, url_prefix="/agency")
     app.register_blueprint(error_bp)
     app.register_blueprint(main_bp)
+    app.register_blueprint(downloads_bp)
+    
+    # Sampling profiler under /agency/profiler, only when PROFILER_ENABLED is set
+    init_profiler(app)
+    
+    # Maintenance commands
+    app.cli.add_command(rebuild_counters_command)
+    app.cli.add_command(export_applications_command)
+    app.cli.add_command(generate_data_command)
+    app.cli.add_command(build_static_command)
+    app.cli.add_command(generate_storage_key_command)
+    app.cli.add_command(rebuild_fingerprints_command)
 
     return app
 
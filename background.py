@@ -0,0 +1,41 @@
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Named thread pools shared by all requests in a worker process, so a burst of
+# requests cannot start an unbounded number of threads.
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name, max_workers):
+    """Return the process-wide thread pool called ``name``, creating it on first use"""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+            _executors[name] = executor
+        return executor
+
+
+def in_app_context(fn):
+    """Wrap ``fn`` to run inside the current app's context, for work handed to a pool thread
+
+    Pool threads have no context of their own; with this they read the
+    running app's config (and its overrides) like the request that queued them.
+    """
+    app = current_app._get_current_object()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        with app.app_context():
+            return fn(*args, **kwargs)
+    return run
+
+
+def reset_executors():
+    """Forget pools inherited from a parent process; their threads did not survive the fork"""
+    global _executors, _executors_lock
+    _executors = {}
+    _executors_lock = threading.Lock()
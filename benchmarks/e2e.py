@@ -0,0 +1,118 @@
+"""End-to-end benchmark: realistic request sequences against a throwaway app
+
+Boots ``create_app`` on a temp SQLite database with the local storage backend
+and an in-process SMTP sink, runs each scenario and writes throughput and
+p50/p95/p99 latency per operation as JSON. With ``--baseline`` the run is
+compared against an earlier result and exits non-zero on a p95 regression.
+
+    python -m benchmarks.e2e --iterations 20 --output bench.json
+    python -m benchmarks.e2e --baseline bench.json --max-regression 0.25
+"""
+import argparse
+import json
+import logging
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from benchmarks.harness import BenchmarkEnvironment, Recorder, ROOT_DIR
+from benchmarks.scenarios import SCENARIOS
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenarios, iterations, storage_latency_ms=0):
+    results = {}
+    with BenchmarkEnvironment(storage_latency_ms=storage_latency_ms) as env:
+        env.app.logger.setLevel(logging.WARNING)
+        for name in scenarios:
+            recorder = Recorder()
+            start = time.perf_counter()
+            SCENARIOS[name](env, recorder, iterations)
+            wall_seconds = time.perf_counter() - start
+            operations = recorder.summary(wall_seconds)
+            total = sum(op['count'] + op['errors'] for op in operations.values())
+            results[name] = {
+                'wall_seconds': round(wall_seconds, 3),
+                'requests': total,
+                'throughput_per_s': round(total / wall_seconds, 2) if wall_seconds else None,
+                'operations': operations,
+            }
+        emails = env.sink.received
+    return results, emails
+
+
+def compare(results, baseline, max_regression):
+    """Return ``[(scenario, operation, baseline_p95, current_p95)]`` for every regression"""
+    regressions = []
+    for scenario, result in results.items():
+        previous = baseline.get('scenarios', {}).get(scenario, {}).get('operations', {})
+        for operation, summary in result['operations'].items():
+            before = previous.get(operation, {}).get('p95_ms')
+            after = summary['p95_ms']
+            if before and after and after > before * (1 + max_regression):
+                regressions.append((scenario, operation, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run; repeat to pick several (default: all)')
+    parser.add_argument('--storage-latency-ms', type=int, default=0,
+                        help='Delay added to each local storage call to mimic Drive')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Allowed p95 growth over the baseline, as a fraction')
+    args = parser.parse_args(argv)
+
+    scenarios = [name for name in SCENARIOS if not args.scenario or name in args.scenario]
+    results, emails = run(scenarios, args.iterations, args.storage_latency_ms)
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'iterations': args.iterations,
+            'storage_latency_ms': args.storage_latency_ms,
+            'emails_sent': emails,
+        },
+        'scenarios': results,
+    }
+
+    for name, result in results.items():
+        print(f"{name}: {result['requests']} requests, {result['throughput_per_s']}/s")
+        for operation, summary in result['operations'].items():
+            print(f"  {operation:<22} p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  "
+                  f"p99 {summary['p99_ms']} ms  errors {summary['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        for scenario, operation, before, after in regressions:
+            print(f"REGRESSION {scenario}/{operation}: p95 {before} ms -> {after} ms", file=sys.stderr)
+        if regressions:
+            return 1
+
+    errors = sum(op['errors'] for result in results.values() for op in result['operations'].values())
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""pytest fixtures for scaling regression tests on large synthetic datasets
+
+Load as a plugin and size the dataset from the command line:
+
+    pytest -p benchmarks.fixtures --dataset-applications 1000000 path/to/scaling_tests
+
+``bench_env`` is a ``BenchmarkEnvironment`` (temp SQLite database, local
+storage, SMTP sink) shared by the whole session. ``large_dataset`` fills it
+once with ``generate_dataset`` and returns the row counts per table.
+"""
+import pytest
+from benchmarks.harness import BenchmarkEnvironment
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('dastaavej-dataset')
+    group.addoption('--dataset-applications', type=int, default=10000,
+                    help='Synthetic applications to generate for large_dataset')
+    group.addoption('--dataset-citizens', type=int, default=None,
+                    help='Synthetic citizens (default: one per ten applications)')
+    group.addoption('--dataset-seed', type=int, default=1234)
+
+
+@pytest.fixture(scope='session')
+def bench_env():
+    env = BenchmarkEnvironment()
+    yield env
+    env.close()
+
+
+@pytest.fixture(scope='session')
+def large_dataset(bench_env, request):
+    from seed_data import generate_dataset
+    applications = request.config.getoption('--dataset-applications')
+    citizens = request.config.getoption('--dataset-citizens') or max(1, applications // 10)
+    with bench_env.app.app_context():
+        return generate_dataset(citizens=citizens, applications=applications,
+                                seed=request.config.getoption('--dataset-seed'))
+
+
+@pytest.fixture
+def agency_client(bench_env, large_dataset):
+    """Test client logged in as one of the synthetic agency users"""
+    from models import User
+    from seed_data import SYNTHETIC_PASSWORD
+    with bench_env.app.app_context():
+        username = User.query.filter_by(role='agency').order_by(User.id).first().username
+    client = bench_env.app.test_client()
+    client.post('/auth/login', data={'username': username, 'password': SYNTHETIC_PASSWORD})
+    return client
+
+
+@pytest.fixture
+def citizen_client(bench_env, large_dataset):
+    """Test client logged in as the synthetic citizen with the most applications"""
+    from sqlalchemy import func
+    from models import Application, User
+    from seed_data import SYNTHETIC_PASSWORD
+    with bench_env.app.app_context():
+        user_id = bench_env.db.session.query(Application.user_id).group_by(Application.user_id) \
+            .order_by(func.count(Application.id).desc()).limit(1).scalar()
+        username = bench_env.db.session.get(User, user_id).username
+    client = bench_env.app.test_client()
+    client.post('/auth/login', data={'username': username, 'password': SYNTHETIC_PASSWORD})
+    return client
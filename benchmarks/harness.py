@@ -0,0 +1,242 @@
+"""Shared plumbing for the end-to-end benchmarks and load tests
+
+``BenchmarkEnvironment`` builds the app against a throwaway SQLite database,
+the local storage backend and an in-process SMTP sink. ``Recorder`` collects
+per-operation latencies and summarizes them as throughput and percentiles.
+"""
+import io
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from benchmarks.smtp_sink import SMTPSink
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'Bench#Pass123'
+
+PASSPORT_FORM = {
+    'full_name': 'Asha Verma',
+    'date_of_birth': '1990-01-01',
+    'gender': 'female',
+    'permanent_address': '12 Long Street, Sector 4, Dwarka',
+    'permanent_state': 'Delhi',
+    'permanent_pincode': '110075',
+    'permanent_country': 'india',
+    'current_address': '12 Long Street, Sector 4, Dwarka',
+    'current_state': 'Delhi',
+    'current_pincode': '110075',
+    'current_country': 'india',
+    'phone': '9999999999',
+    'email': 'asha@example.com',
+    'next_of_kin': 'Kiran Verma',
+    'next_of_kin_relation': 'parent',
+    'next_of_kin_phone': '8888888888',
+}
+
+PANCARD_FORM = {
+    'full_name': 'Asha Verma',
+    'father_name': 'Ravi Verma',
+    'date_of_birth': '1990-01-01',
+    'gender': 'female',
+    'permanent_address': '12 Long Street, Sector 4, Dwarka',
+    'permanent_state': 'Delhi',
+    'permanent_pincode': '110075',
+    'permanent_country': 'india',
+    'current_address': '12 Long Street, Sector 4, Dwarka',
+    'current_state': 'Delhi',
+    'current_pincode': '110075',
+    'current_country': 'india',
+    'phone': '9999999999',
+    'email': 'asha@example.com',
+    'aadhaar_number': '123412341234',
+}
+
+# Smallest well-formed PDF: one empty page
+MINIMAL_PDF = (
+    b'%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n'
+    b'2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n'
+    b'3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n'
+    b'trailer<</Root 1 0 R>>\n%%EOF\n'
+)
+
+
+def sample_photo(size=(413, 531)):
+    """A passport-size JPEG, large enough to exercise the PDF photo path"""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 180, 160)).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def sample_signature(size=(300, 100)):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('L', size, 255).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def passport_files():
+    """Multipart fields for the four passport uploads"""
+    return {
+        'id_proof': (io.BytesIO(MINIMAL_PDF), 'id_proof.pdf'),
+        'photo': (io.BytesIO(sample_photo()), 'photo.jpg'),
+        'address_proof': (io.BytesIO(MINIMAL_PDF), 'address_proof.pdf'),
+        'dob_proof': (io.BytesIO(MINIMAL_PDF), 'dob_proof.pdf'),
+    }
+
+
+def pancard_files():
+    """Multipart fields for the four PAN card uploads"""
+    return {
+        'id_proof': (io.BytesIO(MINIMAL_PDF), 'id_proof.pdf'),
+        'photo': (io.BytesIO(sample_photo()), 'photo.jpg'),
+        'address_proof': (io.BytesIO(MINIMAL_PDF), 'address_proof.pdf'),
+        'signature': (io.BytesIO(sample_signature()), 'signature.png'),
+    }
+
+
+def environment_variables(root, smtp_port, storage_latency_ms=0):
+    """Settings that point every store, the storage backend and mail at ``root`` and the sink"""
+    return {
+        'DATABASE_URL': 'sqlite:///' + os.path.join(root, 'dastaavej.db'),
+        'TOKEN_STORE_PATH': os.path.join(root, 'token_store.db'),
+        'SESSION_STORE_PATH': os.path.join(root, 'sessions.db'),
+        'RATELIMIT_STORE_PATH': os.path.join(root, 'ratelimit.db'),
+        'PROFILER_STORE_PATH': os.path.join(root, 'profiler.db'),
+        'EVENTS_STORE_PATH': os.path.join(root, 'events.db'),
+        'METRICS_STORE_PATH': os.path.join(root, 'metrics'),
+        'RATELIMIT_ENABLED': 'false',
+        'STORAGE_BACKEND': 'local',
+        'LOCAL_STORAGE_PATH': os.path.join(root, 'storage'),
+        'DOCUMENT_CACHE_PATH': os.path.join(root, 'document_cache'),
+        'LOCAL_STORAGE_LATENCY_MS': str(storage_latency_ms),
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': str(smtp_port),
+        'MAIL_USE_TLS': 'false',
+    }
+
+
+class BenchmarkEnvironment:
+    """The app wired to a temp SQLite database, local storage and an SMTP sink"""
+
+    def __init__(self, storage_latency_ms=0, config_overrides=None):
+        self.root = tempfile.mkdtemp(prefix='dastaavej-bench-')
+        self.sink = SMTPSink().start()
+        self.env = environment_variables(self.root, self.sink.port, storage_latency_ms)
+
+        from app import create_app
+        from extensions import db
+        overrides = {
+            'SQLALCHEMY_DATABASE_URI': self.env['DATABASE_URL'],
+            'TOKEN_STORE_PATH': self.env['TOKEN_STORE_PATH'],
+            'SESSION_STORE_PATH': self.env['SESSION_STORE_PATH'],
+            'RATELIMIT_STORE_PATH': self.env['RATELIMIT_STORE_PATH'],
+            'PROFILER_STORE_PATH': self.env['PROFILER_STORE_PATH'],
+            'EVENTS_STORE_PATH': self.env['EVENTS_STORE_PATH'],
+            'METRICS_STORE_PATH': self.env['METRICS_STORE_PATH'],
+            'RATELIMIT_ENABLED': False,
+            'STORAGE_BACKEND': 'local',
+            'LOCAL_STORAGE_PATH': self.env['LOCAL_STORAGE_PATH'],
+            'DOCUMENT_CACHE_PATH': self.env['DOCUMENT_CACHE_PATH'],
+            'LOCAL_STORAGE_LATENCY_MS': storage_latency_ms,
+            'MAIL_SERVER': '127.0.0.1',
+            'MAIL_PORT': self.sink.port,
+            'MAIL_USE_TLS': False,
+            'MAIL_USERNAME': None,
+            'MAIL_PASSWORD': None,
+            'WTF_CSRF_ENABLED': False,
+        }
+        overrides.update(config_overrides or {})
+        self.app = create_app(overrides)
+        self.db = db
+        with self.app.app_context():
+            db.create_all()
+
+    def close(self):
+        with self.app.app_context():
+            for engine in self.db.engines.values():
+                engine.dispose()
+        self.sink.stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def create_user(self, username, email, role='citizen'):
+        from models import User
+        with self.app.app_context():
+            user = User(username=username, email=email, role=role, is_verified=True)
+            user.set_password(PASSWORD)
+            self.db.session.add(user)
+            self.db.session.commit()
+            return user.id
+
+    def client(self, username=None):
+        """A test client, logged in as ``username`` when given"""
+        client = self.app.test_client()
+        if username:
+            response = client.post('/auth/login', data={'username': username, 'password': PASSWORD})
+            if response.status_code != 302:
+                raise RuntimeError(f"Login failed for {username}")
+        return client
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(durations, errors=0, wall_seconds=None):
+    """Latency percentiles in milliseconds, plus throughput when the wall time is known"""
+    values = sorted(durations)
+    summary = {
+        'count': len(values),
+        'errors': errors,
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else None,
+        'p50_ms': None, 'p95_ms': None, 'p99_ms': None,
+        'max_ms': round(values[-1] * 1000, 3) if values else None,
+    }
+    for name, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+        value = percentile(values, fraction)
+        summary[name] = round(value * 1000, 3) if value is not None else None
+    if wall_seconds:
+        summary['throughput_per_s'] = round((len(values) + errors) / wall_seconds, 2)
+    return summary
+
+
+class Recorder:
+    """Collects latencies per operation name"""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    @contextmanager
+    def measure(self, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors[operation] += 1
+            raise
+        self.durations[operation].append(time.perf_counter() - start)
+
+    def add(self, operation, duration, ok=True):
+        if ok:
+            self.durations[operation].append(duration)
+        else:
+            self.errors[operation] += 1
+
+    def summary(self, wall_seconds=None):
+        operations = sorted(set(self.durations) | set(self.errors))
+        return {name: summarize(self.durations[name], self.errors[name], wall_seconds) for name in operations}
@@ -0,0 +1,398 @@
+"""Load test reproducing filing-deadline spikes against a local gunicorn server
+
+Each virtual citizen logs in, fills the passport or PAN form, uploads the
+four documents as multipart and then polls ``application_status`` the way a
+nervous applicant does. Concurrency is stepped up stage by stage; every
+stage reports throughput, error rate and p50/p95/p99 per route, and the run
+reports the saturation point where adding users stops adding throughput.
+
+By default the script starts gunicorn itself for every ``--workers`` x
+``--threads`` combination, backed by a temp SQLite database, the local
+storage backend and the in-process SMTP sink, so it runs fully offline:
+
+    python -m benchmarks.loadtest --workers 2,4 --threads 1,4 --stages 5,10,20,40 --output load.json
+
+Use ``--url`` to aim the same scenario at a server you started yourself; its
+citizens must have been created with ``flask generate-data``.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit, urlencode
+from benchmarks.harness import (
+    ROOT_DIR, PASSPORT_FORM, PANCARD_FORM, MINIMAL_PDF, Recorder,
+    environment_variables, sample_photo, sample_signature, summarize,
+)
+from benchmarks.smtp_sink import SMTPSink
+
+CSRF_PATTERN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+STATUS_LINK_PATTERN = re.compile(r'/citizen/application-status/(\d+)')
+
+# Upload payloads, rendered once in main()
+PHOTO = b''
+SIGNATURE = b''
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Browser:
+    """Keep-alive HTTP client with a cookie jar, enough to walk the site like a user"""
+
+    def __init__(self, base_url, timeout=60):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.connection = None
+
+    def _connect(self):
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for attempt in range(2):
+            if self.connection is None:
+                self._connect()
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed an idle keep-alive connection; retry once on a fresh one
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie(header)
+            for name, morsel in cookie.items():
+                self.cookies[name] = morsel.value
+        return response.status, response.headers, data
+
+    def get(self, path):
+        return self.request('GET', path)
+
+    def post_form(self, path, fields):
+        return self.request('POST', path, urlencode(fields),
+                            {'Content-Type': 'application/x-www-form-urlencoded'})
+
+    def post_multipart(self, path, fields, files):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in fields.items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for name, (filename, content_type, data) in files.items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                         f'Content-Type: {content_type}\r\n\r\n'.encode() + data + b'\r\n')
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return self.request('POST', path, b''.join(parts),
+                            {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+def csrf_token(page):
+    match = CSRF_PATTERN.search(page.decode('utf-8', 'replace'))
+    if not match:
+        raise HTTPError('No CSRF token on page')
+    return match.group(1)
+
+
+class CitizenJourney:
+    """One citizen's passage through the submission flow, recording each step"""
+
+    def __init__(self, browser, recorder, username, password, polls, think_time):
+        self.browser = browser
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.polls = polls
+        self.think_time = think_time
+
+    def step(self, operation, send, expected=(200, 302), location=None):
+        start = time.perf_counter()
+        try:
+            status, headers, body = send()
+        except (OSError, http.client.HTTPException):
+            self.recorder.add(operation, time.perf_counter() - start, ok=False)
+            raise HTTPError(f'{operation}: connection failed')
+        duration = time.perf_counter() - start
+        ok = status in expected and (location is None or location in (headers.get('Location') or ''))
+        if ok and headers.get('Content-Type', '').startswith('application/json'):
+            ok = json.loads(body).get('success', True)
+        self.recorder.add(operation, duration, ok)
+        if not ok:
+            raise HTTPError(f'{operation}: unexpected response {status}')
+        return body
+
+    def pause(self):
+        if self.think_time:
+            time.sleep(random.uniform(0, self.think_time))
+
+    def login(self):
+        page = self.step('get_login', lambda: self.browser.get('/auth/login'), expected=(200,))
+        self.step('login', lambda: self.browser.post_form('/auth/login', {
+            'csrf_token': csrf_token(page), 'username': self.username, 'password': self.password,
+        }), expected=(302,), location='/citizen/dashboard')
+
+    def submit(self, document_type):
+        if document_type == 'passport':
+            form_path, upload_path, form = '/citizen/passport-application', '/citizen/upload-passport', PASSPORT_FORM
+            files = {
+                'id_proof': ('id_proof.pdf', 'application/pdf', MINIMAL_PDF),
+                'photo': ('photo.jpg', 'image/jpeg', PHOTO),
+                'address_proof': ('address_proof.pdf', 'application/pdf', MINIMAL_PDF),
+                'dob_proof': ('dob_proof.pdf', 'application/pdf', MINIMAL_PDF),
+            }
+        else:
+            form_path, upload_path, form = '/citizen/pancard-application', '/citizen/upload-pancard', PANCARD_FORM
+            files = {
+                'id_proof': ('id_proof.pdf', 'application/pdf', MINIMAL_PDF),
+                'photo': ('photo.jpg', 'image/jpeg', PHOTO),
+                'address_proof': ('address_proof.pdf', 'application/pdf', MINIMAL_PDF),
+                'signature': ('signature.png', 'image/png', SIGNATURE),
+            }
+
+        page = self.step(f'get_{document_type}_application', lambda: self.browser.get(form_path), expected=(200,))
+        self.pause()
+        self.step(f'{document_type}_application', lambda: self.browser.post_form(
+            form_path, dict(form, csrf_token=csrf_token(page))), expected=(302,), location=upload_path)
+        page = self.step(f'get_upload_{document_type}', lambda: self.browser.get(upload_path), expected=(200,))
+        self.pause()
+        self.step(f'upload_{document_type}', lambda: self.browser.post_multipart(
+            upload_path, {'csrf_token': csrf_token(page)}, files), expected=(200,))
+
+    def poll_status(self):
+        page = self.step('dashboard', lambda: self.browser.get('/citizen/dashboard'), expected=(200,))
+        ids = STATUS_LINK_PATTERN.findall(page.decode('utf-8', 'replace'))
+        for _ in range(self.polls):
+            if not ids:
+                break
+            self.pause()
+            application_id = random.choice(ids)
+            self.step('application_status', lambda: self.browser.get(f'/citizen/application-status/{application_id}'),
+                      expected=(200,))
+
+    def run(self, document_type):
+        self.login()
+        self.submit(document_type)
+        self.poll_status()
+
+
+def run_stage(base_url, accounts, users, duration, polls, think_time, passport_share):
+    """Run ``users`` concurrent citizens for ``duration`` seconds and summarize the stage"""
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    journeys = [0]
+    failures = [0]
+    lock = threading.Lock()
+
+    def virtual_user():
+        while time.monotonic() < deadline:
+            with lock:
+                username, password = next(accounts)
+            browser = Browser(base_url)
+            journey = CitizenJourney(browser, recorder, username, password, polls, think_time)
+            document_type = 'passport' if random.random() < passport_share else 'pancard'
+            try:
+                journey.run(document_type)
+                with lock:
+                    journeys[0] += 1
+            except HTTPError:
+                with lock:
+                    failures[0] += 1
+            finally:
+                browser.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, daemon=True) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    operations = recorder.summary(wall_seconds)
+    requests = sum(op['count'] + op['errors'] for op in operations.values())
+    errors = sum(op['errors'] for op in operations.values())
+    all_latencies = [d for durations in recorder.durations.values() for d in durations]
+    overall = summarize(all_latencies, errors, wall_seconds)
+    return {
+        'users': users,
+        'wall_seconds': round(wall_seconds, 3),
+        'journeys_completed': journeys[0],
+        'journeys_failed': failures[0],
+        'requests': requests,
+        'throughput_per_s': round(requests / wall_seconds, 2),
+        'error_rate': round(errors / requests, 4) if requests else 0.0,
+        'p50_ms': overall['p50_ms'], 'p95_ms': overall['p95_ms'], 'p99_ms': overall['p99_ms'],
+        'operations': operations,
+    }
+
+
+def saturation_point(stages, min_gain=0.05, max_error_rate=0.01):
+    """The stage with the best throughput before gains flatten out or errors appear"""
+    best = None
+    for stage in stages:
+        if stage['error_rate'] > max_error_rate:
+            break
+        if best is not None and stage['throughput_per_s'] < best['throughput_per_s'] * (1 + min_gain):
+            break
+        best = stage
+    if best is None:
+        return None
+    return {'users': best['users'], 'throughput_per_s': best['throughput_per_s'], 'p95_ms': best['p95_ms']}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_server(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup; see its log')
+        try:
+            status, _, _ = Browser(base_url, timeout=2).get('/auth/login')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+class LocalServer:
+    """gunicorn on a fresh temp database, local storage and an SMTP sink"""
+
+    def __init__(self, workers, threads, citizens, storage_latency_ms):
+        import tempfile
+        self.root = tempfile.mkdtemp(prefix='dastaavej-load-')
+        self.sink = SMTPSink().start()
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        env = dict(os.environ, **environment_variables(self.root, self.sink.port, storage_latency_ms))
+        env.update({
+            'GUNICORN_BIND': f'127.0.0.1:{self.port}',
+            'GUNICORN_WORKERS': str(workers),
+            'GUNICORN_THREADS': str(threads),
+            'GUNICORN_LOG_LEVEL': 'warning',
+            'FLASK_APP': 'app',
+        })
+        subprocess.run([sys.executable, '-c', 'from app import create_app; from extensions import db\n'
+                        'app = create_app()\nwith app.app_context(): db.create_all()'],
+                       cwd=ROOT_DIR, env=env, check=True)
+        subprocess.run([sys.executable, '-m', 'flask', 'generate-data', '--citizens', str(citizens),
+                        '--agency-users', '1', '--applications', '0'],
+                       cwd=ROOT_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+        self.log_path = os.path.join(self.root, 'gunicorn.log')
+        self.log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                                        cwd=ROOT_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        _wait_for_server(self.url, self.process)
+
+    def close(self):
+        import shutil
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+        self.sink.stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def synthetic_accounts(citizens, first_id=2):
+    """Cycle through the citizens ``flask generate-data`` creates after its one agency user"""
+    from seed_data import SYNTHETIC_PASSWORD
+    return itertools.cycle([(f'SynCitizen!{user_id}', SYNTHETIC_PASSWORD)
+                            for user_id in range(first_id, first_id + citizens)])
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',')]
+
+
+def main(argv=None):
+    global PHOTO, SIGNATURE
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Target an already running server instead of starting gunicorn')
+    parser.add_argument('--workers', type=_int_list, default=[2], help='Comma-separated gunicorn worker counts')
+    parser.add_argument('--threads', type=_int_list, default=[1], help='Comma-separated threads per worker')
+    parser.add_argument('--stages', type=_int_list, default=[5, 10, 20, 40],
+                        help='Comma-separated concurrent users per stage')
+    parser.add_argument('--stage-seconds', type=float, default=30)
+    parser.add_argument('--citizens', type=int, default=500, help='Citizen accounts to spread the load over')
+    parser.add_argument('--polls', type=int, default=3, help='application_status polls after each submission')
+    parser.add_argument('--think-time', type=float, default=0.5, help='Max random pause between steps, seconds')
+    parser.add_argument('--passport-share', type=float, default=0.6)
+    parser.add_argument('--storage-latency-ms', type=int, default=150,
+                        help='Delay per local storage call to mimic Drive round trips')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    PHOTO = sample_photo()
+    SIGNATURE = sample_signature()
+
+    if args.url:
+        configurations = [(None, None)]
+    else:
+        configurations = list(itertools.product(args.workers, args.threads))
+
+    report = {'scenario': 'filing_deadline_spike', 'settings': vars(args), 'runs': []}
+    for workers, threads in configurations:
+        server = None
+        if args.url:
+            base_url = args.url
+        else:
+            server = LocalServer(workers, threads, args.citizens, args.storage_latency_ms)
+            base_url = server.url
+        try:
+            accounts = synthetic_accounts(args.citizens)
+            stages = []
+            for users in args.stages:
+                stage = run_stage(base_url, accounts, users, args.stage_seconds, args.polls,
+                                  args.think_time, args.passport_share)
+                stages.append(stage)
+                print(f"workers={workers} threads={threads} users={users}: {stage['throughput_per_s']} req/s, "
+                      f"errors {stage['error_rate']:.2%}, p50 {stage['p50_ms']} ms, p95 {stage['p95_ms']} ms, "
+                      f"p99 {stage['p99_ms']} ms")
+        finally:
+            if server:
+                server.close()
+        run = {'workers': workers, 'threads': threads, 'stages': stages,
+               'saturation': saturation_point(stages)}
+        report['runs'].append(run)
+        print(f"  saturation: {run['saturation']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
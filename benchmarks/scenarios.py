@@ -0,0 +1,138 @@
+"""End-to-end scenarios driven through the Flask test client
+
+Each scenario takes a ``BenchmarkEnvironment``, a ``Recorder`` and an
+iteration count, and records one latency sample per request it issues.
+"""
+import itertools
+import time
+from benchmarks.harness import PASSWORD, PASSPORT_FORM, PANCARD_FORM, passport_files, pancard_files
+
+STATUSES = ('pending', 'under review', 'approved', 'rejected')
+
+_ids = itertools.count(1)
+
+
+def _unique(prefix):
+    return f"{prefix}{next(_ids):06d}"
+
+
+def timed(recorder, operation, send, expected=(200, 302), redirect_to=None):
+    """Issue one request, record its latency and return the response
+
+    A response counts as an error unless its status is in ``expected``, it
+    redirects to a path ending in ``redirect_to`` (when given) and, for JSON
+    responses, its ``success`` flag is not false.
+    """
+    start = time.perf_counter()
+    response = send()
+    duration = time.perf_counter() - start
+    ok = response.status_code in expected
+    if ok and redirect_to:
+        ok = (response.location or '').endswith(redirect_to)
+    if ok and response.is_json:
+        ok = response.get_json().get('success', True)
+    recorder.add(operation, duration, ok)
+    return response
+
+
+def _ensure_citizen(env):
+    if not hasattr(env, 'bench_citizen'):
+        env.bench_citizen = _unique('Citizen!')
+        env.create_user(env.bench_citizen, f"{env.bench_citizen.lower().replace('!', '')}@example.com")
+    return env.bench_citizen
+
+
+def _ensure_agency(env):
+    if not hasattr(env, 'bench_agency'):
+        env.bench_agency = _unique('Agency!')
+        env.create_user(env.bench_agency, f"{env.bench_agency.lower().replace('!', '')}@example.com", role='agency')
+    return env.bench_agency
+
+
+def registration_otp(env, recorder, iterations):
+    """Citizen registration followed by OTP verification read back from the SMTP sink"""
+    for _ in range(iterations):
+        client = env.client()
+        username = _unique('Bench!')
+        email = f"{username.lower().replace('!', '')}@example.com"
+        timed(recorder, 'register', lambda: client.post('/auth/register', data={
+            'username': username, 'email': email, 'password': PASSWORD,
+            'confirm_password': PASSWORD, 'role': 'citizen',
+        }), expected=(302,), redirect_to='/auth/verify-otp')
+        otp = env.sink.otp_for(email)
+        timed(recorder, 'verify_otp', lambda: client.post('/auth/verify-otp', data={'otp': otp}),
+              expected=(302,), redirect_to='/auth/login')
+
+
+def passport_submission(env, recorder, iterations):
+    """Passport form followed by the four-file document upload"""
+    client = env.client(_ensure_citizen(env))
+    for _ in range(iterations):
+        timed(recorder, 'passport_application', lambda: client.post('/citizen/passport-application', data=PASSPORT_FORM),
+              expected=(302,), redirect_to='/citizen/upload-passport')
+        timed(recorder, 'upload_passport', lambda: client.post('/citizen/upload-passport', data=passport_files(),
+                                                               content_type='multipart/form-data'),
+              expected=(200,))
+
+
+def pancard_submission(env, recorder, iterations):
+    """PAN card form followed by the four-file document upload"""
+    client = env.client(_ensure_citizen(env))
+    for _ in range(iterations):
+        timed(recorder, 'pancard_application', lambda: client.post('/citizen/pancard-application', data=PANCARD_FORM),
+              expected=(302,), redirect_to='/citizen/upload-pancard')
+        timed(recorder, 'upload_pancard', lambda: client.post('/citizen/upload-pancard', data=pancard_files(),
+                                                              content_type='multipart/form-data'),
+              expected=(200,))
+
+
+def review_queue(env, recorder, iterations):
+    """Agency reviewers flipping through every status tab of the review queue"""
+    client = env.client(_ensure_agency(env))
+    for _ in range(iterations):
+        for status in STATUSES:
+            timed(recorder, 'review_applications', lambda: client.get(f'/agency/review-applications/{status}'),
+                  expected=(200,))
+        timed(recorder, 'agency_dashboard', lambda: client.get('/agency/dashboard'), expected=(200,))
+
+
+def bulk_status_updates(env, recorder, iterations):
+    """Claim a batch from the work queue, then move up to ``iterations`` pending applications to 'under review'"""
+    from models import Application
+    client = env.client(_ensure_agency(env))
+    timed(recorder, 'claim_batch', lambda: client.post('/agency/work-queue/claim'), expected=(302,))
+    with env.app.app_context():
+        pending = [(a.id, a.version) for a in Application.query.filter_by(status='pending').limit(iterations)]
+    for application_id, version in pending:
+        timed(recorder, 'update_status', lambda: client.post(f'/agency/update-status/{application_id}', data={
+            'status': 'under review', 'comment': 'Documents received, review started', 'version': version,
+        }), expected=(302,), redirect_to='/agency/review-applications/under%20review')
+
+
+def document_viewing(env, recorder, iterations):
+    """Agency reviewers opening application details and each uploaded document"""
+    from models import Document
+    client = env.client(_ensure_agency(env))
+    with env.app.app_context():
+        documents = [(d.id, d.application_id) for d in Document.query.order_by(Document.id).limit(iterations)]
+    for document_id, application_id in documents:
+        timed(recorder, 'application_details', lambda: client.get(f'/agency/application-details/{application_id}'),
+              expected=(200,))
+        response = timed(recorder, 'view_document', lambda: client.get(f'/agency/view-document/{document_id}'),
+                         expected=(200, 302))
+        if response.status_code == 302:
+            # Documents are handed out as signed links; any other redirect is a failure
+            link = response.location or ''
+            timed(recorder, 'fetch_document', lambda: client.get(link),
+                  expected=(200,) if link.startswith('/files/') else ())
+
+
+# Run order matters: later scenarios review and view what earlier ones submitted
+SCENARIOS = {
+    'registration_otp': registration_otp,
+    'passport_submission': passport_submission,
+    'pancard_submission': pancard_submission,
+    'review_queue': review_queue,
+    'bulk_status_updates': bulk_status_updates,
+    'document_viewing': document_viewing,
+}
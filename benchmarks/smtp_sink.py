@@ -0,0 +1,137 @@
+"""Minimal in-process SMTP server that accepts every message and keeps it in memory
+
+Stands in for Gmail during benchmarks and load tests so mail-sending code
+paths run end to end without leaving the machine.
+
+    python -m benchmarks.smtp_sink --port 2525
+"""
+import argparse
+import email
+from collections import deque
+import re
+import socketserver
+import threading
+import time
+
+OTP_PATTERN = re.compile(r'verification code for Dastaavej registration is: (\d{6})')
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.reply('220 dastaavej-sink ESMTP')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 dastaavej-sink')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                chunks = []
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    # Undo dot-stuffing
+                    chunks.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                self.server.sink.deliver(recipients, b''.join(chunks))
+                self.reply('250 OK: queued')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # RSET, NOOP and anything else
+                self.reply('250 OK')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Thread-backed SMTP server
+
+    ``messages`` keeps the newest ``max_messages`` deliveries as
+    ``(recipients, email.message.Message)``; ``received`` counts all of them.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, max_messages=10000):
+        self.messages = deque(maxlen=max_messages)
+        self.received = 0
+        self._lock = threading.Condition()
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def deliver(self, recipients, raw):
+        message = email.message_from_bytes(raw)
+        with self._lock:
+            self.messages.append((recipients, message))
+            self.received += 1
+            self._lock.notify_all()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait_for(self, recipient, timeout=5):
+        """Return the newest message sent to ``recipient``, waiting for it if necessary"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                for recipients, message in reversed(self.messages):
+                    if recipient in recipients:
+                        return message
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No mail for {recipient}")
+                self._lock.wait(remaining)
+
+    def otp_for(self, recipient, timeout=5):
+        """Extract the registration OTP from the newest mail sent to ``recipient``"""
+        message = self.wait_for(recipient, timeout)
+        for part in message.walk():
+            if part.get_content_type() == 'text/plain':
+                match = OTP_PATTERN.search(part.get_payload(decode=True).decode('utf-8', 'replace'))
+                if match:
+                    return match.group(1)
+        raise ValueError(f"No OTP in mail for {recipient}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    args = parser.parse_args(argv)
+
+    sink = SMTPSink(args.host, args.port).start()
+    print(f"SMTP sink listening on {sink.host}:{sink.port}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"{sink.received} messages received")
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Startup benchmark: how long a worker spends importing and building the app
+
+Runs ``create_app()`` in fresh interpreters under ``python -X importtime``
+and reports the median import and factory time together with the slowest
+top-level imports. With ``--budget-ms`` the script exits non-zero when the
+median startup time goes over budget, and it always fails if a module that
+must stay lazy (ReportLab, Pillow, the Google client) is imported at startup.
+
+    python -m benchmarks.startup --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported on the code paths that need them
+LAZY_MODULES = ('reportlab', 'PIL', 'googleapiclient', 'google.oauth2')
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (done - imported) * 1000,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return ``[(module, self_us, cumulative_us, depth)]`` from ``-X importtime`` output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        head, cumulative_us, name = line.split('|')
+        self_us = int(head.split(':')[1])
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), self_us, int(cumulative_us), depth))
+    return rows
+
+
+def run_once():
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='0')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['imports'] = parse_importtime(proc.stderr)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='fail when the median import + create_app time exceeds this')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest top-level imports to list')
+    parser.add_argument('--json', dest='json_path', help='write the report to this file')
+    args = parser.parse_args(argv)
+
+    # The first run warms the bytecode cache and is not counted
+    run_once()
+    runs = [run_once() for _ in range(args.runs)]
+
+    totals = [r['import_ms'] + r['create_app_ms'] for r in runs]
+    last = runs[-1]
+    top_level = sorted((row for row in last['imports'] if row[3] <= 1), key=lambda row: -row[2])
+    loaded_lazy = sorted({m for m in last['modules'] for lazy in LAZY_MODULES
+                          if m == lazy or m.startswith(lazy + '.')})
+
+    report = {
+        'runs': args.runs,
+        'startup_ms_median': statistics.median(totals),
+        'startup_ms_min': min(totals),
+        'import_ms_median': statistics.median(r['import_ms'] for r in runs),
+        'create_app_ms_median': statistics.median(r['create_app_ms'] for r in runs),
+        'slowest_imports': [{'module': name, 'cumulative_ms': cumulative / 1000}
+                            for name, _, cumulative, _ in top_level[:args.top]],
+        'lazy_modules_loaded': loaded_lazy,
+    }
+
+    print(f"startup median: {report['startup_ms_median']:.1f} ms "
+          f"(import {report['import_ms_median']:.1f} ms, create_app {report['create_app_ms_median']:.1f} ms)")
+    for entry in report['slowest_imports']:
+        print(f"  {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if loaded_lazy:
+        print(f"FAIL: modules that should load lazily were imported at startup: {', '.join(loaded_lazy[:5])}")
+        failed = True
+    if args.budget_ms is not None and report['startup_ms_median'] > args.budget_ms:
+        print(f"FAIL: startup {report['startup_ms_median']:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import os
+import posixpath
+import zipfile
+from concurrent.futures import wait, FIRST_COMPLETED
+from datetime import datetime
+from sqlalchemy import select
+from extensions import db
+from models import Application, Document
+from background import get_executor, in_app_context
+from drive_api import download_drive_bytes
+
+# Formats that are already compressed; deflating them only burns CPU
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.pdf'}
+
+
+class _ZipOutput:
+    """Write-only, non-seekable sink that collects what ZipFile writes until it is drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def bundle_documents(application_ids):
+    """Document rows for the given applications, in archive order"""
+    return db.session.execute(
+        select(Document.id, Document.file_path, Document.filename, Document.document_type,
+               Application.application_number)
+        .join(Application, Document.application_id == Application.id)
+        .where(Document.application_id.in_(application_ids))
+        .order_by(Application.application_number, Document.id)
+    ).all()
+
+
+def _archive_name(document):
+    extension = os.path.splitext(document.filename or '')[1].lower() or '.pdf'
+    filename = f"{document.document_type}_{document.id}{extension}"
+    return posixpath.join(document.application_number, filename)
+
+
+def generate_zip(documents, max_workers=8, download=download_drive_bytes):
+    """Yield a ZIP archive of ``documents`` chunk by chunk as their blobs arrive
+
+    Blobs are fetched concurrently, but at most ``2 * max_workers`` downloads
+    are in flight or waiting to be written, so memory stays bounded however
+    many documents the archive holds. Entries are written in the order their
+    downloads finish; documents that cannot be fetched are listed in
+    MISSING.txt at the end of the archive.
+    """
+    output = _ZipOutput()
+    executor = get_executor('bundle-download', max_workers)
+    window = max_workers * 2
+    remaining = iter(documents)
+    pending = {}
+    missing = []
+
+    # Runs under stream_with_context, so the app is known once the first chunk is asked for
+    download = in_app_context(download)
+
+    def submit_next():
+        document = next(remaining, None)
+        if document is not None:
+            pending[executor.submit(download, document.file_path)] = document
+
+    with zipfile.ZipFile(output, mode='w', allowZip64=True) as archive:
+        for _ in range(window):
+            submit_next()
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    document = pending.pop(future)
+                    submit_next()
+
+                    data = future.result()
+                    name = _archive_name(document)
+                    if data is None:
+                        missing.append(name)
+                        continue
+
+                    info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+                    stored = os.path.splitext(name)[1] in STORED_EXTENSIONS
+                    info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                    archive.writestr(info, data)
+                    yield output.drain()
+        finally:
+            # The client went away or a write failed; don't keep downloading for nobody
+            for future in pending:
+                future.cancel()
+
+        if missing:
+            archive.writestr('MISSING.txt', '\n'.join(missing) + '\n')
+
+    yield output.drain()
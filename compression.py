@@ -0,0 +1,68 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Text formats worth compressing; PDFs, images and ZIPs are already compressed
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml',
+}
+
+
+def choose_encoding(accept_encodings, allow_brotli=True):
+    """Best content coding the client accepts: 'br', 'gzip' or None"""
+    if allow_brotli and brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=6, brotli_quality=5):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def should_compress(response, min_size):
+    """Whether a response is a buffered, uncompressed text body of at least ``min_size`` bytes"""
+    if response.direct_passthrough or response.is_streamed:
+        # File downloads and streams (exports, bundles, SSE) are passed through untouched
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206) or response.status_code >= 300:
+        return False
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return False
+    return response.content_length is not None and response.content_length >= min_size
+
+
+def init_compression(app):
+    """Compress HTML, JSON and other text responses with brotli or gzip"""
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+    level = app.config.get('COMPRESS_LEVEL', 6)
+    brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+    allow_brotli = app.config.get('COMPRESS_BROTLI', True)
+
+    @app.after_request
+    def compress_response(response):
+        if request.method == 'HEAD' or not should_compress(response, min_size):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings, allow_brotli)
+        if encoding is None:
+            return response
+
+        response.set_data(compress(response.get_data(), encoding, level, brotli_quality))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body is a different byte sequence; a weak ETag still revalidates with 304
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -8,17 +8,140 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///" + os.path.join(INSTANCE_DIR, "dastaavej.db"))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Optional read replica for agency and citizen read-only views
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+    DATABASE_REPLICA_STICKY_SECONDS = 5  # reads stay on the primary this long after a user's write
+    
+    # Connection pool sizing; None picks the default for the database backend
+    SQLALCHEMY_POOL_SIZE = int(os.getenv("SQLALCHEMY_POOL_SIZE", "0")) or None
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ["SQLALCHEMY_MAX_OVERFLOW"]) if os.getenv("SQLALCHEMY_MAX_OVERFLOW") else None
+    
+    # SQLite pragmas applied to every connection (WAL mode is always on)
+    SQLITE_BUSY_TIMEOUT = 15000  # milliseconds to wait for the write lock
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB = 16 * 1024  # page cache per connection
+    
     # Fix upload folder path
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
+    # Uploads are checked from their headers (magic bytes, image size) before they are stored
+    UPLOAD_SNIFF_BYTES = 8192  # leading bytes read to detect the file type
+    UPLOAD_JPEG_SCAN_BYTES = 256 * 1024  # how far into a JPEG to look for the frame header
+    UPLOAD_MIN_IMAGE_SIDE = 50  # pixels
+    UPLOAD_MAX_IMAGE_PIXELS = 40 * 1000 * 1000
+    
+    # Token/OTP store shared by all workers (memory, sqlite or tiered)
+    TOKEN_STORE_BACKEND = os.getenv("TOKEN_STORE_BACKEND", "tiered")
+    TOKEN_STORE_PATH = os.getenv("TOKEN_STORE_PATH", os.path.join(INSTANCE_DIR, "token_store.db"))
+    TOKEN_STORE_MAX_ENTRIES = 10000
+    TOKEN_STORE_LOCAL_TTL = 2  # seconds a worker may serve a token from memory
+    TOKEN_STORE_SWEEP_INTERVAL = 60  # seconds between expiry sweeps
+    OTP_TTL = 600  # 10 minutes
+    REGISTRATION_TTL = 1800  # pending registrations outlive a single OTP so it can be resent
+    AGENCY_VERIFICATION_TTL = 7 * 24 * 3600  # 7 days
+    
+    # Server-side sessions: the cookie carries only an opaque id ('server' or 'cookie')
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "server")
+    SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", os.path.join(INSTANCE_DIR, "sessions.db"))
+    SESSION_CACHE_SIZE = 1000  # sessions kept deserialized per worker
+    
+    # Rate limiting for OTP, login and contact endpoints ('memory' or 'sqlite')
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "true").lower() == "true"
+    RATELIMIT_BACKEND = os.getenv("RATELIMIT_BACKEND", "sqlite")
+    RATELIMIT_STORE_PATH = os.getenv("RATELIMIT_STORE_PATH", os.path.join(INSTANCE_DIR, "ratelimit.db"))
+    # Reverse proxies in front of the app (nginx = 1) whose X-Forwarded-For/-Proto/-Host are trusted;
+    # without it every proxied client shares the proxy's address, and so its per-IP limits
+    PROXY_FIX_COUNT = int(os.getenv("PROXY_FIX_COUNT", "0"))
+    
+    # Server-Sent Events for live status and notification updates. Each open
+    # stream holds a worker thread, so run gunicorn with GUNICORN_THREADS > 1.
+    EVENTS_STORE_PATH = os.getenv("EVENTS_STORE_PATH", os.path.join(INSTANCE_DIR, "events.db"))
+    EVENTS_RETENTION = 24 * 3600  # seconds events stay available for replay
+    EVENTS_POLL_INTERVAL = 1.0  # seconds between checks for events published by other workers
+    EVENTS_KEEPALIVE = 15  # seconds between keepalive comments on idle streams
+    EVENTS_MAX_STREAM_SECONDS = 300  # streams are closed and resumed by the browser after this
+    EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", "100"))  # open streams per worker process
+    
+    # Rendered public pages and {% cache %} fragments, keyed by template version
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+    PAGE_CACHE_MAX_ENTRIES = 500  # pages and fragments kept per worker process
+    PAGE_CACHE_MAX_AGE = int(os.getenv("PAGE_CACHE_MAX_AGE", "0"))  # 0: browsers revalidate with the ETag
+    
+    # Compression of text responses (brotli is used when the package is installed)
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+    COMPRESS_MIN_SIZE = 500  # bytes; smaller bodies are not worth the CPU
+    COMPRESS_LEVEL = 6  # gzip level
+    COMPRESS_BROTLI_QUALITY = 5
+    
+    # Fingerprinted static files from `flask build-static` are cached by browsers for this long
+    STATIC_MAX_AGE = 365 * 24 * 3600
+    
+    # Request instrumentation: Server-Timing headers and a Prometheus /metrics endpoint
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "true").lower() == "true"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # scrapers send it as a bearer token; unset, only localhost may scrape
+    METRICS_STORE_PATH = os.getenv("METRICS_STORE_PATH", os.path.join(INSTANCE_DIR, "metrics"))  # per-worker snapshots
+    METRICS_FLUSH_INTERVAL = 5  # seconds between a worker's snapshot writes
+    
+    # Opt-in sampling profiler for agency staff; nothing is registered unless enabled
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    PROFILER_STORE_PATH = os.getenv("PROFILER_STORE_PATH", os.path.join(INSTANCE_DIR, "profiler.db"))
+    PROFILER_MAX_DEPTH = 64  # frames kept per sample
+    PROFILER_MAX_OVERHEAD = 0.05  # share of one core the sampler thread may use
+    
+    # Bulk ZIP downloads of application documents
+    BUNDLE_DOWNLOAD_WORKERS = 8  # concurrent Drive downloads per worker process
+    BUNDLE_MAX_APPLICATIONS = 500
+    
+    # Reviewer work queue: applications are leased to one reviewer at a time
+    REVIEW_BATCH_SIZE = 10  # applications a reviewer holds at once
+    REVIEW_LEASE_SECONDS = 15 * 60  # unfinished applications return to the queue after this
+    
+    # Duplicate detection: Aadhaar and phone are indexed as keyed hashes, photos by perceptual hash.
+    # Changing FINGERPRINT_KEY (SECRET_KEY when unset) needs `flask rebuild-fingerprints`.
+    FINGERPRINT_KEY = os.getenv("FINGERPRINT_KEY", "")
+    PHOTO_MATCH_DISTANCE = 10  # differing bits (of 64) at which two photos still count as the same
+    
+    # Reviewer dossiers: application form and all documents merged into one cached PDF
+    DOSSIER_WORKERS = 2  # dossiers rendered at once per worker process
+    DOSSIER_TIMEOUT = 60  # seconds a request waits for a render
+    DOSSIER_IMAGE_MAX_SIDE = 1600  # pixels; photos and scans are downscaled to this
+    DOSSIER_IMAGE_QUALITY = 85  # JPEG quality of embedded images
+    
+    # Document storage: 'drive' for Google Drive, 'local' for a directory (benchmarks, offline runs)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "drive")
+    LOCAL_STORAGE_PATH = os.getenv("LOCAL_STORAGE_PATH", os.path.join(INSTANCE_DIR, "storage"))
+    LOCAL_STORAGE_LATENCY_MS = int(os.getenv("LOCAL_STORAGE_LATENCY_MS", "0"))  # emulate Drive round trips
+    
+    # At-rest encryption of stored documents (AES-256-GCM in chunks, one data key per file).
+    # STORAGE_ENCRYPTION_KEYS is "id:base64key,..." from `flask generate-storage-key`; the
+    # first key encrypts new files, the others stay listed so older files can still be read.
+    STORAGE_ENCRYPTION_KEYS = os.getenv("STORAGE_ENCRYPTION_KEYS", "")
+    STORAGE_ENCRYPTION_CHUNK_SIZE = 64 * 1024  # plaintext bytes per authenticated chunk
+    
+    # Local copies of stored documents, served by the front proxy when offload is on.
+    # DOCUMENT_OFFLOAD is 'x-accel' (nginx), 'x-sendfile' (Apache/lighttpd) or empty to stream from Flask.
+    DOCUMENT_OFFLOAD = os.getenv("DOCUMENT_OFFLOAD", "").lower()
+    DOCUMENT_OFFLOAD_PREFIX = os.getenv("DOCUMENT_OFFLOAD_PREFIX", "/protected-documents/")  # nginx internal location
+    DOCUMENT_CACHE_PATH = os.getenv("DOCUMENT_CACHE_PATH", os.path.join(INSTANCE_DIR, "document_cache"))
+    DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+    DOCUMENT_CACHE_PRUNE_INTERVAL = 60  # seconds between size checks per worker process
+    DOCUMENT_CACHE_MIN_AGE = 60  # seconds a file is safe from pruning after its last use
+    
+    # Signed, expiring document links: access is checked once when the link is minted
+    DOWNLOAD_TOKENS_ENABLED = os.getenv("DOWNLOAD_TOKENS_ENABLED", "true").lower() == "true"
+    DOWNLOAD_TOKEN_TTL = int(os.getenv("DOWNLOAD_TOKEN_TTL", "300"))  # seconds a link stays valid
+    DOWNLOAD_TOKEN_WINDOW = 60  # links minted within this many seconds are identical
+    SESSION_EXEMPT_PATHS = ('/files/',)  # signed links never touch the session, so edge caches can keep them
+    
     # Google Drive API Credentials
     GOOGLE_DRIVE_CREDENTIALS = os.path.join(BASE_DIR, "dastaavej-drive-api.json")
     
     # Mail Settings
-    MAIL_SERVER = 'smtp.gmail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    MAIL_SERVER = os.getenv("MAIL_SERVER", 'smtp.gmail.com')
+    MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
+    MAIL_USE_TLS = os.getenv("MAIL_USE_TLS", "true").lower() == "true"
     MAIL_USERNAME = "officialdastaavej@gmail.com"
     MAIL_PASSWORD = "laxn onoj qwoo ksmw"
     MAIL_DEFAULT_SENDER = ("Dastaavej Document Services", "officialdastaavej@gmail.com")  # Use tuple format with name
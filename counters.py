@@ -0,0 +1,84 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from extensions import db
+from models import Application, ApplicationCounter
+
+APPLICATION_STATUSES = ['pending', 'under review', 'approved', 'rejected']
+
+
+def adjust_application_count(status, document_type, delta):
+    """Add ``delta`` to a counter inside the caller's transaction"""
+    table = ApplicationCounter.__table__
+    dialect = db.session.get_bind(mapper=ApplicationCounter).dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        # Single-statement upsert, so concurrent first inserts cannot collide
+        stmt = insert(table).values(status=status, document_type=document_type, count=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.status, table.c.document_type],
+            set_={'count': table.c.count + delta}
+        )
+        db.session.execute(stmt)
+        return
+
+    result = db.session.execute(
+        table.update()
+        .where(table.c.status == status, table.c.document_type == document_type)
+        .values(count=table.c.count + delta)
+    )
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(status=status, document_type=document_type, count=delta))
+
+
+def record_new_application(application):
+    """Count a newly created application; call in the transaction that creates it"""
+    adjust_application_count(application.status or 'pending', application.document_type, 1)
+
+
+def record_status_change(document_type, old_status, new_status):
+    """Move an application between status counters; call in the transaction that changes it"""
+    if old_status == new_status:
+        return
+    adjust_application_count(old_status, document_type, -1)
+    adjust_application_count(new_status, document_type, 1)
+
+
+def get_status_counts(document_type=None):
+    """Get ``{status: count}`` from the counters table, summed over document types unless one is given"""
+    query = db.session.query(ApplicationCounter.status, func.sum(ApplicationCounter.count))
+    if document_type:
+        query = query.filter(ApplicationCounter.document_type == document_type)
+    counts = dict.fromkeys(APPLICATION_STATUSES, 0)
+    for status, count in query.group_by(ApplicationCounter.status):
+        counts[status] = int(count or 0)
+    return counts
+
+
+def rebuild_application_counters():
+    """Recompute every counter from the Application table in one transaction"""
+    rows = db.session.query(
+        Application.status, Application.document_type, func.count(Application.id)
+    ).filter(Application.status.isnot(None)).group_by(Application.status, Application.document_type).all()
+
+    db.session.query(ApplicationCounter).delete()
+    db.session.add_all(
+        ApplicationCounter(status=status, document_type=document_type, count=count)
+        for status, document_type, count in rows
+    )
+    db.session.commit()
+    return rows
+
+
+@click.command('rebuild-counters')
+@with_appcontext
+def rebuild_counters_command():
+    """Rebuild the per-status application counters from scratch."""
+    rows = rebuild_application_counters()
+    for status, document_type, count in rows:
+        print(f"{document_type:<12} {status:<14} {count}")
+    print("Application counters rebuilt")
@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from extensions import db
+from db_routing import REPLICA_BIND_KEY
+
+# Serializes write transactions inside one worker process. SQLite allows a
+# single writer at a time anyway; queueing threads here is cheaper than
+# having them spin on the database lock.
+_write_lock = threading.RLock()
+
+
+def engine_options_for(uri, config):
+    """SQLAlchemy engine options tuned for the database backend behind ``uri``"""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # Flask-SQLAlchemy picks a static pool for in-memory databases
+            return {}
+        return {
+            'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000},
+            # One writer at a time means a handful of connections is plenty
+            'pool_size': config['SQLALCHEMY_POOL_SIZE'] or 5,
+            'max_overflow': config['SQLALCHEMY_MAX_OVERFLOW'] if config['SQLALCHEMY_MAX_OVERFLOW'] is not None else 10,
+        }
+    return {
+        'pool_size': config['SQLALCHEMY_POOL_SIZE'] or 10,
+        'max_overflow': config['SQLALCHEMY_MAX_OVERFLOW'] if config['SQLALCHEMY_MAX_OVERFLOW'] is not None else 20,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+
+
+def _sqlite_pragma_listener(config, read_only=False):
+    pragmas = [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),
+        ('temp_store', 'MEMORY'),
+    ]
+    if read_only:
+        # Guards the replica against writes routed to it by mistake
+        pragmas.append(('query_only', 'ON'))
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return set_sqlite_pragmas
+
+
+def configure_engine(app):
+    """Apply per-connection SQLite pragmas to every engine of the app
+
+    Must run right after ``db.init_app(app)``, before any connection is made.
+    """
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                listener = _sqlite_pragma_listener(app.config, read_only=bind_key == REPLICA_BIND_KEY)
+                event.listen(engine, 'connect', listener)
+
+
+def is_lock_error(error):
+    """Check whether an OperationalError means the database was busy"""
+    message = str(getattr(error, 'orig', error)).lower()
+    return 'database is locked' in message or 'database is busy' in message \
+        or 'deadlock detected' in message or 'could not serialize' in message
+
+
+def write_transaction(retries=5, base_delay=0.05):
+    """Run a view helper's database writes as one transaction, retrying on lock contention
+
+    The decorated function should only touch the database; it is re-run from
+    the start after a rollback, then committed. Sleeps between attempts use
+    exponential backoff with full jitter so retrying workers spread out.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapped(*args, **kwargs):
+            for attempt in range(retries + 1):
+                try:
+                    with _write_lock:
+                        result = fn(*args, **kwargs)
+                        db.session.commit()
+                    return result
+                except OperationalError as e:
+                    db.session.rollback()
+                    if attempt == retries or not is_lock_error(e):
+                        raise
+                    time.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+        return wrapped
+    return decorator
@@ -0,0 +1,80 @@
+import sqlite3
+import time
+from functools import wraps
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND_KEY = 'replica'
+
+
+class RoutingSession(Session):
+    """Session that sends reads from read-only views to the replica bind
+
+    Everything else, and every write, goes to the primary as before. When no
+    replica is configured this behaves exactly like Flask-SQLAlchemy's session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            is_write = self._flushing or isinstance(clause, sa.UpdateBase)
+            if is_write:
+                # Remember the write so the user's next reads stick to the primary
+                g.db_wrote = True
+            elif g.get('db_read_only'):
+                engine = self._db.engines.get(REPLICA_BIND_KEY)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Serve a view's queries from the replica unless the user wrote recently
+
+    Reads stay on the primary for ``DATABASE_REPLICA_STICKY_SECONDS`` after
+    the user's own last write, so they always see their own changes.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        written_at = session.get('_db_written_at')
+        sticky = current_app.config.get('DATABASE_REPLICA_STICKY_SECONDS', 5)
+        g.db_read_only = not written_at or time.time() - written_at > sticky
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def configure_replica(app):
+    """Register the replica bind from ``DATABASE_REPLICA_URL``; call before ``db.init_app``"""
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if not replica_url:
+        return
+
+    from db_engine import engine_options_for
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    binds[REPLICA_BIND_KEY] = dict(engine_options_for(replica_url, app.config), url=replica_url)
+
+    @app.after_request
+    def remember_write(response):
+        if g.get('db_wrote'):
+            session['_db_written_at'] = time.time()
+        return response
+
+    @app.cli.command('sync-replica')
+    def sync_replica_command():
+        """Copy the SQLite primary database into the replica file."""
+        sync_sqlite_replica(app.config['SQLALCHEMY_DATABASE_URI'], replica_url)
+        print("Replica synchronized from primary")
+
+
+def sync_sqlite_replica(primary_url, replica_url):
+    """Copy a SQLite primary into the replica file; a local stand-in for replication"""
+    primary_path = make_url(primary_url).database
+    replica_path = make_url(replica_url).database
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from flask import current_app, request, send_file
+from werkzeug.utils import send_file as werkzeug_send_file
+from drive_api import download_from_drive
+from background import get_executor
+import storage_crypto
+
+# Offload modes: the front proxy streams the file named by this response header
+OFFLOAD_HEADERS = {'x-accel': 'X-Accel-Redirect', 'x-sendfile': 'X-Sendfile'}
+
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def _relative_path(key):
+    # Keys are hashed so Drive ids and generated names never reach the filesystem as-is
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(digest[:2], digest)
+
+
+def _cache_path(key):
+    return os.path.join(current_app.config['DOCUMENT_CACHE_PATH'], _relative_path(key))
+
+
+def _touch(path):
+    # Pruning evicts by modification time, so a hit keeps a file around
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def cached_document(file_id):
+    """Path of a local copy of a stored document, downloading it on the first request
+
+    Returns None when the download fails. Stored documents never change, so a
+    cached copy stays valid until pruning removes it. Encrypted documents are
+    cached as ciphertext; ``send_document`` decrypts them as they are sent.
+    """
+    path = _cache_path(file_id)
+    if os.path.exists(path):
+        _touch(path)
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = f"{path}.{uuid.uuid4().hex}.part"
+    if not download_from_drive(file_id, partial_path, decrypt=False):
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return None
+    # Concurrent fills of the same document are harmless: the last rename wins
+    os.replace(partial_path, path)
+    _maybe_prune()
+    return path
+
+
+def cache_file(key, source_path):
+    """Move a file generated for this request into the cache and return its new path"""
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = f"{path}.{uuid.uuid4().hex}.part"
+    if storage_crypto.encryption_enabled():
+        # Generated forms hold the same personal data as the uploads, so they are kept encrypted too
+        storage_crypto.encrypt_file(source_path, partial_path)
+        os.remove(source_path)
+    else:
+        shutil.move(source_path, partial_path)
+    os.replace(partial_path, path)
+    _maybe_prune()
+    return path
+
+
+def cached_file(key):
+    """Path of a file previously stored with ``cache_file``, or None"""
+    path = _cache_path(key)
+    if os.path.exists(path):
+        _touch(path)
+        return path
+    return None
+
+
+def _maybe_prune():
+    global _last_prune
+    now = time.monotonic()
+    with _prune_lock:
+        if now - _last_prune < current_app.config['DOCUMENT_CACHE_PRUNE_INTERVAL']:
+            return
+        _last_prune = now
+    # Walking the cache can take a while; it runs off the request thread, one prune at a time
+    config = current_app.config
+    get_executor('cache-prune', 1).submit(prune_cache, config['DOCUMENT_CACHE_PATH'],
+                                          config['DOCUMENT_CACHE_MAX_BYTES'], config['DOCUMENT_CACHE_MIN_AGE'])
+
+
+def prune_cache(cache_dir, max_bytes, min_age=0):
+    """Delete the least recently used files until the cache fits in ``max_bytes``
+
+    Files used in the last ``min_age`` seconds are kept even if the cache stays
+    over its size for a while: the proxy may be about to send one of them after
+    an X-Accel-Redirect or X-Sendfile response, or it may still be filling.
+    """
+    entries = []
+    total = 0
+    newest_evictable = time.time() - min_age
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    removed = 0
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= max_bytes or mtime > newest_evictable:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def send_document(path, mimetype, as_attachment=False, download_name=None):
+    """Send a cached file, letting the front proxy stream it when offload is configured
+
+    With ``DOCUMENT_OFFLOAD`` set to ``x-accel`` (nginx) or ``x-sendfile``
+    (Apache, lighttpd) the response carries only headers; the worker is free
+    as soon as they are written. Otherwise the file is streamed by Flask.
+    Encrypted files are always streamed by Flask, since the proxy cannot
+    decrypt them.
+    """
+    if storage_crypto.is_encrypted(path):
+        return _send_decrypted(path, mimetype, as_attachment, download_name)
+
+    mode = current_app.config.get('DOCUMENT_OFFLOAD')
+    if mode not in OFFLOAD_HEADERS:
+        return send_file(path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name)
+
+    response = werkzeug_send_file(
+        path,
+        request.environ,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        use_x_sendfile=True,
+        response_class=current_app.response_class,
+        # Ranges and revalidation are answered by the proxy against the real file
+        conditional=False,
+        etag=False,
+    )
+    del response.headers['X-Sendfile']
+    # The body sent here is empty; the proxy sets the length of what it streams
+    response.content_length = 0
+    if mode == 'x-accel':
+        relative = os.path.relpath(path, current_app.config['DOCUMENT_CACHE_PATH']).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = current_app.config['DOCUMENT_OFFLOAD_PREFIX'].rstrip('/') + '/' + relative
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    return response
+
+
+def _send_decrypted(path, mimetype, as_attachment, download_name):
+    # Only the chunks covering the requested bytes are decrypted, so Range
+    # requests (PDF viewers fetch pages this way) stay cheap on large files
+    file, size = storage_crypto.open_decrypted(path)
+    stat = os.stat(path)
+    response = werkzeug_send_file(
+        file,
+        request.environ,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        response_class=current_app.response_class,
+        last_modified=stat.st_mtime,
+        etag=f"{os.path.basename(path)[:16]}-{int(stat.st_mtime)}-{size}",
+        conditional=False,
+    )
+    response.content_length = size
+    return response.make_conditional(request, accept_ranges=True, complete_length=size)
@@ -0,0 +1,248 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import wait
+from sqlalchemy import select
+from extensions import db
+from models import Document
+from background import get_executor, in_app_context
+from document_cache import cache_file, cached_file
+from drive_api import download_drive_bytes
+from utils import generate_application_pdf
+
+# Sections after the application form, in the order reviewers check them
+SECTION_ORDER = ['id_proof', 'photo', 'address_proof', 'dob_proof', 'signature']
+SECTION_TITLES = {'id_proof': 'ID Proof', 'dob_proof': 'Date of Birth Proof'}
+IMAGE_MIMETYPES = {'image/jpeg', 'image/png'}
+
+# Plain snapshots of the rows a dossier needs; renders run on pool threads, away from the request's session
+DossierApplication = namedtuple('DossierApplication', [
+    'id', 'application_number', 'document_type', 'name', 'dob', 'gender', 'address', 'status',
+    'created_at', 'updated_at',
+])
+
+# Builds in progress, so reviewers opening the same dossier share one render
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def dossier_application(application):
+    return DossierApplication(**{field: getattr(application, field) for field in DossierApplication._fields})
+
+
+def dossier_documents(application_id):
+    """Document rows of one application, with just the columns a dossier needs"""
+    return db.session.execute(
+        select(Document.id, Document.document_type, Document.file_path, Document.mime_type, Document.updated_at)
+        .where(Document.application_id == application_id)
+        .order_by(Document.id)
+    ).all()
+
+
+def section_title(document_type):
+    return SECTION_TITLES.get(document_type) or document_type.replace('_', ' ').title()
+
+
+def dossier_key(application, documents):
+    """Document cache key of an application's dossier
+
+    It covers the application version and every document's id, stored blob
+    and timestamp, so adding, replacing or removing a document yields a new key.
+    """
+    digest = hashlib.sha256()
+    version = application.updated_at.isoformat() if application.updated_at else ''
+    digest.update(f"{application.id}:{version}:{application.status}".encode())
+    for document in sorted(documents, key=lambda d: d.id):
+        stamp = document.updated_at.isoformat() if document.updated_at else ''
+        digest.update(f"|{document.id}:{document.document_type}:{document.file_path}:{stamp}".encode())
+    return f"dossier:{application.id}:{digest.hexdigest()[:32]}"
+
+
+def _is_image(document, data):
+    if document.mime_type:
+        return document.mime_type in IMAGE_MIMETYPES
+    return data[:3] == b'\xff\xd8\xff' or data[:8] == b'\x89PNG\r\n\x1a\n'
+
+
+def image_page(data, title, max_side=1600, quality=85):
+    """One-page PDF with a downscaled copy of an image, fitted below a heading"""
+    from PIL import Image
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    image = Image.open(io.BytesIO(data))
+    # JPEGs are decoded at a reduced DCT scale, which is far cheaper than a full decode
+    image.draft('RGB', (max_side, max_side))
+    image = image.convert('RGB')
+    image.thumbnail((max_side, max_side))
+    encoded = io.BytesIO()
+    image.save(encoded, 'JPEG', quality=quality, optimize=True)
+    encoded.seek(0)
+
+    output = io.BytesIO()
+    page_width, page_height = A4
+    margin = 36
+    pdf = canvas.Canvas(output, pagesize=A4)
+    pdf.setTitle(title)
+    pdf.setFont('Helvetica-Bold', 14)
+    pdf.drawString(margin, page_height - margin - 14, title)
+    box_width = page_width - 2 * margin
+    box_height = page_height - 2 * margin - 30
+    scale = min(box_width / image.width, box_height / image.height, 1)
+    width, height = image.width * scale, image.height * scale
+    pdf.drawImage(ImageReader(encoded), margin + (box_width - width) / 2, page_height - margin - 30 - height,
+                  width=width, height=height)
+    pdf.showPage()
+    pdf.save()
+    return output.getvalue()
+
+
+def placeholder_page(title, message):
+    """One-page PDF standing in for a document that could not be included"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    output = io.BytesIO()
+    pdf = canvas.Canvas(output, pagesize=A4)
+    pdf.setFont('Helvetica-Bold', 14)
+    pdf.drawString(36, A4[1] - 50, title)
+    pdf.setFont('Helvetica', 11)
+    pdf.drawString(36, A4[1] - 75, message)
+    pdf.showPage()
+    pdf.save()
+    return output.getvalue()
+
+
+def render_section(document, download=download_drive_bytes, max_side=1600, quality=85):
+    """``(title, pdf_bytes)`` for one document: PDFs as stored, images downscaled onto a page"""
+    title = section_title(document.document_type)
+    data = download(document.file_path)
+    if not data:
+        return title, placeholder_page(title, 'This document could not be fetched from storage.')
+    if not _is_image(document, data):
+        return title, data
+    try:
+        return title, image_page(data, title, max_side, quality)
+    except Exception:
+        return title, placeholder_page(title, 'This image could not be read.')
+
+
+def application_form_data(application):
+    """Fields shown on a generated application form"""
+    return {
+        'full_name': application.name,
+        'application_number': application.application_number,
+        'document_type': application.document_type,
+        'date_of_birth': application.dob.strftime('%Y-%m-%d') if application.dob else 'Not provided',
+        'gender': application.gender,
+        'address': application.address,
+        'status': application.status,
+        'created_at': application.created_at.strftime('%Y-%m-%d'),
+    }
+
+
+def _generated_form(app, application, photo_data, temp_dir):
+    photo_path = ''
+    if photo_data:
+        photo_path = os.path.join(temp_dir, 'photo')
+        with open(photo_path, 'wb') as f:
+            f.write(photo_data)
+    pdf_path = generate_application_pdf(app, application_form_data(application), photo_path,
+                                         application.document_type, temp_dir)
+    if not pdf_path:
+        return placeholder_page('Application Form', 'The application form could not be generated.')
+    with open(pdf_path, 'rb') as f:
+        return f.read()
+
+
+def build_dossier(app, application, documents, output_path, download=download_drive_bytes):
+    """Merge the application form and every document into one bookmarked PDF at ``output_path``
+
+    Documents are fetched and rendered concurrently; only the merge is
+    sequential. A stored application form is used as is, otherwise one is
+    generated. Damaged documents become a placeholder page.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    config = app.config
+    executor = get_executor('dossier-section', config.get('BUNDLE_DOWNLOAD_WORKERS', 8))
+    max_side = config.get('DOSSIER_IMAGE_MAX_SIDE', 1600)
+    quality = config.get('DOSSIER_IMAGE_QUALITY', 85)
+
+    form = next((d for d in documents if d.document_type == 'application_form'), None)
+    rank = {name: index for index, name in enumerate(SECTION_ORDER)}
+    sections = sorted((d for d in documents if d.document_type != 'application_form'),
+                      key=lambda d: (rank.get(d.document_type, len(rank)), d.id))
+
+    section = in_app_context(render_section)
+    download = in_app_context(download)
+    futures = [executor.submit(section, d, download, max_side, quality) for d in sections]
+    if form is not None:
+        form_future = executor.submit(download, form.file_path)
+    else:
+        photo = next((d for d in documents if d.document_type == 'photo'), None)
+        form_future = executor.submit(download, photo.file_path) if photo else None
+    wait(futures + ([form_future] if form_future else []))
+
+    form_data = form_future.result() if form_future else None
+    if form is None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            form_data = _generated_form(app, application, form_data, temp_dir)
+    elif not form_data:
+        form_data = placeholder_page('Application Form', 'The application form could not be fetched from storage.')
+
+    writer = PdfWriter()
+    writer.add_metadata({'/Title': f"{application.application_number} dossier"})
+    for title, data in [('Application Form', form_data)] + [f.result() for f in futures]:
+        try:
+            writer.append(PdfReader(io.BytesIO(data)), outline_item=title, import_outline=False)
+        except Exception as e:
+            app.logger.warning(f"Dossier for {application.application_number}: {title} is not a readable PDF: {e}")
+            writer.append(PdfReader(io.BytesIO(placeholder_page(title, 'This PDF could not be read.'))),
+                          outline_item=title)
+    writer.page_mode = '/UseOutlines'
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+    return output_path
+
+
+def _render_and_cache(app, application, documents, key):
+    with app.app_context():
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = build_dossier(app, application, documents, os.path.join(temp_dir, 'dossier.pdf'))
+            return cache_file(key, path)
+
+
+def get_dossier(app, application, documents):
+    """Path of the cached dossier for this document set, rendering it in the dossier pool if needed
+
+    Concurrent requests for the same dossier wait on a single render.
+    Raises ``TimeoutError`` if rendering takes longer than DOSSIER_TIMEOUT.
+    """
+    key = dossier_key(application, documents)
+    path = cached_file(key)
+    if path:
+        return path
+
+    started = False
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        if future is None:
+            executor = get_executor('dossier', app.config.get('DOSSIER_WORKERS', 2))
+            future = executor.submit(_render_and_cache, app, application, documents, key)
+            _in_flight[key] = future
+            started = True
+    # Outside the lock: a render that has already finished runs the callback right here
+    if started:
+        future.add_done_callback(lambda done: _forget(key, done))
+    return future.result(timeout=app.config.get('DOSSIER_TIMEOUT', 60))
+
+
+def _forget(key, future):
+    with _in_flight_lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
@@ -0,0 +1,83 @@
+import time
+from flask import Blueprint, current_app, redirect, url_for, abort
+from itsdangerous import URLSafeTimedSerializer, TimestampSigner, BadSignature, SignatureExpired
+from document_cache import cached_document, send_document
+
+downloads_bp = Blueprint('downloads', __name__)
+
+
+class WindowedSigner(TimestampSigner):
+    """Timestamp signer that rounds the time down to ``window`` seconds
+
+    Every link minted for the same document within one window is identical,
+    so browsers and edge caches see one URL instead of one per page view.
+    """
+
+    def __init__(self, *args, window=60, **kwargs):
+        self.window = window
+        super().__init__(*args, **kwargs)
+
+    def get_timestamp(self):
+        return int(time.time()) // self.window * self.window
+
+
+def _serializer(windowed=True):
+    # Links are minted with windowed timestamps but checked against the real clock
+    signer_options = {}
+    if windowed:
+        signer_options = {'signer': WindowedSigner,
+                          'signer_kwargs': {'window': current_app.config['DOWNLOAD_TOKEN_WINDOW']}}
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='document-download-salt', **signer_options)
+
+
+def generate_download_token(file_id, mimetype, download_name=None, as_attachment=False):
+    """Sign everything the fetch route needs, so it never has to query the database"""
+    payload = {'f': file_id, 'm': mimetype, 'a': as_attachment}
+    if download_name:
+        payload['n'] = download_name
+    return _serializer().dumps(payload)
+
+
+def download_url(file_id, mimetype, download_name=None, as_attachment=False):
+    """Short-lived link to a stored document; only mint it after checking access"""
+    token = generate_download_token(file_id, mimetype, download_name, as_attachment)
+    return url_for('downloads.fetch_document', token=token)
+
+
+def serve_document(file_id, mimetype, as_attachment=False, download_name=None):
+    """Response for an authorized request of a stored document, or None if it cannot be fetched
+
+    The document is cached locally first, then the browser is sent to a
+    signed link (or, with DOWNLOAD_TOKENS_ENABLED off, given the file directly).
+    """
+    cached_path = cached_document(file_id)
+    if not cached_path:
+        return None
+    if current_app.config.get('DOWNLOAD_TOKENS_ENABLED'):
+        return redirect(download_url(file_id, mimetype, download_name, as_attachment))
+    return send_document(cached_path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name)
+
+
+@downloads_bp.route('/files/<token>')
+def fetch_document(token):
+    """Serve a document named by a signed token; no login or database access"""
+    ttl = current_app.config['DOWNLOAD_TOKEN_TTL']
+    try:
+        payload, issued_at = _serializer(windowed=False).loads(token, max_age=ttl, return_timestamp=True)
+    except SignatureExpired:
+        abort(410)
+    except BadSignature:
+        abort(404)
+
+    cached_path = cached_document(payload['f'])
+    if not cached_path:
+        abort(404)
+
+    response = send_document(cached_path, mimetype=payload['m'], as_attachment=payload['a'],
+                             download_name=payload.get('n'))
+    # Anyone holding the link may fetch it until it expires, so shared caches may too
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = max(int(issued_at.timestamp() + ttl - time.time()), 0)
+    response.headers['Referrer-Policy'] = 'no-referrer'
+    return response
@@ -1,40 +1,91 @@
 import os
+import json
 import mimetypes
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-import io
-from googleapiclient.http import MediaIoBaseDownload
+import operator
+import threading
 from config import Config
-
-# Load Google Drive API credentials
-try:
-    if not os.path.exists(Config.GOOGLE_DRIVE_CREDENTIALS):
-        raise FileNotFoundError(f"Credentials file not found at {Config.GOOGLE_DRIVE_CREDENTIALS}")
-        
-    credentials = Credentials.from_service_account_file(
-        Config.GOOGLE_DRIVE_CREDENTIALS, 
-        scopes=["https://www.googleapis.com/auth/drive"]
-    )
-    drive_service = build("drive", "v3", credentials=credentials)
-    print("Google Drive API initialized successfully")
-except Exception as e:
-    print(f"Failed to initialize Google Drive API: {str(e)}")
-    drive_service = None
+from metrics import traced
+import local_storage
+import storage_crypto
 
 # Define the fixed folder ID for "Dastaavej Uploads"
 FOLDER_ID = "1RelKng-XcPvST4W02147Rr0R3YNaqtVe"
 
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive"]
+
+# The Google client libraries are slow to import and the discovery document is
+# slow to parse, so both are deferred until the first Drive call. Credentials
+# and the parsed document are shared; each thread gets its own service object
+# because the underlying httplib2 connection is not thread-safe.
+_init_lock = threading.Lock()
+_thread_local = threading.local()
+_credentials = None
+_discovery_document = None
+_init_failed = False
+
+def _load_drive_client():
+    """Load credentials and the Drive discovery document once per process"""
+    global _credentials, _discovery_document, _init_failed
+    with _init_lock:
+        if _discovery_document is not None or _init_failed:
+            return
+        try:
+            if not os.path.exists(Config.GOOGLE_DRIVE_CREDENTIALS):
+                raise FileNotFoundError(f"Credentials file not found at {Config.GOOGLE_DRIVE_CREDENTIALS}")
+            
+            from google.oauth2.service_account import Credentials
+            from googleapiclient.discovery_cache import get_static_doc
+            
+            _credentials = Credentials.from_service_account_file(
+                Config.GOOGLE_DRIVE_CREDENTIALS, 
+                scopes=DRIVE_SCOPES
+            )
+            _discovery_document = json.loads(get_static_doc("drive", "v3"))
+            print("Google Drive API initialized successfully")
+        except Exception as e:
+            print(f"Failed to initialize Google Drive API: {str(e)}")
+            _init_failed = True
+
+def warm_drive_client():
+    """Load credentials and the discovery document ahead of the first request"""
+    _load_drive_client()
+    return _discovery_document is not None
+
+def reset_drive_service():
+    """Forget per-thread services, e.g. after a fork, so no connection is shared between processes"""
+    global _thread_local
+    _thread_local = threading.local()
+
 def get_drive_service():
-    """Get the Google Drive service object"""
-    return drive_service
+    """Get the Google Drive service object for the current thread, building it on first use"""
+    service = getattr(_thread_local, 'service', None)
+    if service is not None:
+        return service
+    
+    _load_drive_client()
+    if _discovery_document is None:
+        return None
+    
+    from googleapiclient.discovery import build_from_document
+    service = build_from_document(_discovery_document, credentials=_credentials)
+    _thread_local.service = service
+    return service
 
 def get_folder_id():
     """Get the folder ID for uploads"""
     return FOLDER_ID
 
+@traced('drive', failed_if=operator.not_)
 def upload_to_drive(file_path, file_name, app=None):
     """Upload a file to Google Drive and return the file ID"""
+    if local_storage.is_local_storage():
+        if not os.path.exists(file_path):
+            return None
+        if storage_crypto.encryption_enabled():
+            with storage_crypto.encrypting_reader(file_path) as reader:
+                return local_storage.save_stream(reader)
+        return local_storage.save_file(file_path, file_name)
+    
     try:
         if app:
             app.logger.info(f"Uploading {file_path} to Google Drive as {file_name}")
@@ -67,26 +118,38 @@ def upload_to_drive(file_path, file_name, app=None):
             app.logger.info(f"Detected MIME type: {mime_type}")
         
         # Create media
-        media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True)
+        from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+        encrypted = storage_crypto.encryption_enabled()
+        if encrypted:
+            # Chunks are encrypted as the upload reads them; Drive only ever holds ciphertext
+            reader = storage_crypto.encrypting_reader(file_path)
+            media = MediaIoBaseUpload(reader, mimetype='application/octet-stream', resumable=True)
+        else:
+            media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True)
         
         # Upload file
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        try:
+            file = service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id'
+            ).execute()
+        finally:
+            if encrypted:
+                reader.close()
         
         file_id = file.get('id')
         
         if app:
             app.logger.info(f"Successfully uploaded to Drive with ID: {file_id}")
         
-        # Set permissions to anyone with the link can view
-        service.permissions().create(
-            fileId=file_id,
-            body={'type': 'anyone', 'role': 'reader'},
-            fields='id'
-        ).execute()
+        # Set permissions to anyone with the link can view; encrypted files are only read through the app
+        if not encrypted:
+            service.permissions().create(
+                fileId=file_id,
+                body={'type': 'anyone', 'role': 'reader'},
+                fields='id'
+            ).execute()
         
         return file_id
         
@@ -97,9 +160,20 @@ def upload_to_drive(file_path, file_name, app=None):
             app.logger.error(traceback.format_exc())
         return None
 
-def download_from_drive(file_id, destination_path):
-    """Downloads a file from Google Drive by its ID and saves it to the specified path."""
+@traced('drive', failed_if=operator.not_)
+def download_from_drive(file_id, destination_path, decrypt=True):
+    """Downloads a file from Google Drive by its ID and saves it to the specified path.
+
+    Encrypted files are decrypted unless ``decrypt`` is False, which keeps the
+    stored ciphertext (the document cache serves it through ``open_decrypted``).
+    """
+    if local_storage.is_local_storage():
+        if not local_storage.copy_file(file_id, destination_path):
+            return False
+        return _decrypt_download(destination_path) if decrypt else True
+    
     try:
+        drive_service = get_drive_service()
         if not drive_service:
             raise RuntimeError("Google Drive service not initialized")
             
@@ -114,6 +188,7 @@ def download_from_drive(file_id, destination_path):
         # Ensure destination directory exists
         os.makedirs(os.path.dirname(destination_path), exist_ok=True)
         
+        from googleapiclient.http import MediaIoBaseDownload
         with open(destination_path, 'wb') as f:
             downloader = MediaIoBaseDownload(f, request)
             done = False
@@ -122,7 +197,7 @@ def download_from_drive(file_id, destination_path):
                 print(f"Download progress: {int(status.progress() * 100)}%")
         
         print(f"Successfully downloaded file to: {destination_path}")
-        return True
+        return _decrypt_download(destination_path) if decrypt else True
         
     except Exception as e:
         print(f"Error downloading file from Google Drive: {str(e)}")
@@ -132,12 +207,27 @@ def download_from_drive(file_id, destination_path):
             os.remove(destination_path)
         return False
 
+def _decrypt_download(path):
+    try:
+        storage_crypto.decrypt_file(path)
+        return True
+    except storage_crypto.DecryptionError as e:
+        print(f"Error decrypting downloaded file {path}: {str(e)}")
+        os.remove(path)
+        return False
+
+@traced('drive')
 def get_drive_preview_url(file_id):
     """Get a preview URL for a Google Drive file"""
+    if local_storage.is_local_storage() or storage_crypto.encryption_enabled():
+        # No hosted preview (Drive only sees ciphertext); callers fall back to serving the downloaded file
+        return None
+    
     try:
         if not file_id:
             return None
             
+        drive_service = get_drive_service()
         if not drive_service:
             return None
         file = drive_service.files().get(
@@ -151,13 +241,19 @@ def get_drive_preview_url(file_id):
         print(f"Error getting preview URL: {str(e)}")
         return None
 
+@traced('drive')
 def get_direct_image_url(file_id):
     """Get a direct URL for viewing an image from Google Drive"""
+    if local_storage.is_local_storage() or storage_crypto.encryption_enabled():
+        # Encrypted files must not be made public; they are served by the app instead
+        return None
+    
     if not file_id:
         return None
     
     try:
         # First verify the file exists and get its metadata
+        drive_service = get_drive_service()
         if not drive_service:
             return None
         file = drive_service.files().get(
@@ -180,4 +276,39 @@ def get_direct_image_url(file_id):
         return f"https://drive.google.com/uc?id={file_id}"
     except Exception as e:
         print(f"Error creating direct image URL: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+@traced('drive', failed_if=operator.not_)
+def download_drive_bytes(file_id):
+    """Download a Google Drive file into memory and return its bytes, or None on failure
+
+    Safe to call from worker threads; each thread uses its own Drive service.
+    """
+    if local_storage.is_local_storage():
+        data = local_storage.read_file(file_id)
+        try:
+            return storage_crypto.decrypt_bytes(data) if data is not None else None
+        except storage_crypto.DecryptionError as e:
+            print(f"Error decrypting file {file_id}: {str(e)}")
+            return None
+    
+    try:
+        drive_service = get_drive_service()
+        if not drive_service:
+            raise RuntimeError("Google Drive service not initialized")
+        
+        if not file_id or len(file_id) < 10:
+            raise ValueError("Invalid Google Drive file ID")
+        
+        import io
+        from googleapiclient.http import MediaIoBaseDownload
+        buffer = io.BytesIO()
+        downloader = MediaIoBaseDownload(buffer, drive_service.files().get_media(fileId=file_id))
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+        return storage_crypto.decrypt_bytes(buffer.getvalue())
+        
+    except Exception as e:
+        print(f"Error downloading file {file_id} from Google Drive: {str(e)}")
+        return None
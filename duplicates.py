@@ -0,0 +1,308 @@
+import hashlib
+import hmac
+import io
+import math
+import threading
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+from itertools import combinations
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, or_, select
+from extensions import db
+from models import Application, Document, Fingerprint
+from background import get_executor, in_app_context
+from drive_api import download_drive_bytes
+
+IDENTIFIER_KINDS = ('aadhaar', 'phone')
+HASH_SIZE = 8  # the hash keeps the lowest 8x8 DCT frequencies, 64 bits
+SAMPLE_SIZE = 32  # photos are reduced to 32x32 greyscale before the DCT
+# Rows committed out of id order (long upload transactions) are picked up by re-reading this far back
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+# DCT-II basis for the frequencies the hash keeps: _COSINES[u][x] = cos((2x + 1) u pi / 2N)
+_COSINES = [[math.cos((2 * x + 1) * u * math.pi / (2 * SAMPLE_SIZE)) for x in range(SAMPLE_SIZE)]
+            for u in range(HASH_SIZE)]
+
+DuplicateMatch = namedtuple('DuplicateMatch', [
+    'kind', 'application_id', 'application_number', 'name', 'status', 'same_account', 'distance',
+])
+
+
+def normalize_aadhaar(value):
+    digits = ''.join(c for c in value or '' if c.isdigit())
+    return digits if len(digits) == 12 else None
+
+
+def normalize_phone(value):
+    # +91 98765 43210, 098765-43210 and 9876543210 are the same number
+    digits = ''.join(c for c in value or '' if c.isdigit())
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def identifier_digest(kind, value):
+    """Keyed hash of a normalized identifier, so the index never holds the raw number"""
+    key = current_app.config.get('FINGERPRINT_KEY') or current_app.config['SECRET_KEY']
+    return hmac.new(key.encode(), f"{kind}:{value}".encode(), hashlib.sha256).hexdigest()
+
+
+def application_identifiers(application):
+    """``{kind: digest}`` of an application's identifiers that are present and well formed"""
+    values = {
+        'aadhaar': normalize_aadhaar(application.aadhaar_number),
+        'phone': normalize_phone(application.phone),
+    }
+    return {kind: identifier_digest(kind, value) for kind, value in values.items() if value}
+
+
+def perceptual_hash(source):
+    """64-bit DCT perceptual hash of an image path or file object, or None if it cannot be read
+
+    Re-encoding, resizing and mild colour or brightness changes move the hash
+    by only a few bits, so near-identical photos stay within a small Hamming
+    distance of each other.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(source)
+        # JPEGs are decoded at a reduced scale; only a 32x32 thumbnail is needed
+        image.draft('L', (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        pixels = image.convert('L').resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.LANCZOS).tobytes()
+    except Exception:
+        return None
+    finally:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    rows = [pixels[y * SAMPLE_SIZE:(y + 1) * SAMPLE_SIZE] for y in range(SAMPLE_SIZE)]
+    # Separable DCT, computing only the low frequencies: first along rows, then down columns
+    row_terms = [[sum(c * p for c, p in zip(basis, row)) for basis in _COSINES] for row in rows]
+    coefficients = [sum(basis[y] * row_terms[y][u] for y in range(SAMPLE_SIZE))
+                    for basis in _COSINES for u in range(HASH_SIZE)]
+    ordered = sorted(coefficients)
+    median = (ordered[len(ordered) // 2 - 1] + ordered[len(ordered) // 2]) / 2
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(width, radius):
+    """Every mask of ``width`` bits with at most ``radius`` bits set"""
+    return tuple(sum(1 << bit for bit in bits)
+                 for count in range(radius + 1) for bits in combinations(range(width), count))
+
+
+class MultiIndexHash:
+    """Hamming-radius search over 64-bit hashes, split into equal chunks each with its own hash table
+
+    If two hashes are within radius r, at least one of their m chunks is
+    within r // m bits (pigeonhole), so a query only probes the few table
+    keys near each of its chunks and checks the full distance of what it
+    finds there, instead of comparing against every stored hash.
+    """
+
+    def __init__(self, chunks=4, bits=64):
+        self.chunks = chunks
+        self.width = bits // chunks
+        self._mask = (1 << self.width) - 1
+        self._tables = [defaultdict(list) for _ in range(chunks)]
+        self._items = {}
+
+    def __len__(self):
+        return sum(len(items) for items in self._items.values())
+
+    def _parts(self, value):
+        return [(value >> (index * self.width)) & self._mask for index in range(self.chunks)]
+
+    def add(self, value, item):
+        if value in self._items:
+            self._items[value].append(item)
+            return
+        self._items[value] = [item]
+        for table, part in zip(self._tables, self._parts(value)):
+            table[part].append(value)
+
+    def search(self, value, radius):
+        """``[(distance, item)]`` for every stored hash within ``radius`` of ``value``"""
+        masks = _flip_masks(self.width, radius // self.chunks)
+        candidates = set()
+        for table, part in zip(self._tables, self._parts(value)):
+            for mask in masks:
+                candidates.update(table.get(part ^ mask, ()))
+        found = []
+        for candidate in candidates:
+            distance = hamming_distance(value, candidate)
+            if distance <= radius:
+                found.extend((distance, item) for item in self._items[candidate])
+        return found
+
+
+class PhotoIndex:
+    """Per-process multi-index of photo hashes, topped up from the fingerprint table on each query
+
+    Only new rows are read on a query, so rows deleted since (by a rebuild in
+    another process, or a replaced photo) are still indexed. Every match is
+    confirmed against the table, and a deleted one makes the index start over.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._tree = MultiIndexHash()
+        self._seen = set()
+        self._loaded_until = None
+
+    def refresh(self):
+        now = datetime.utcnow()
+        query = select(Fingerprint.id, Fingerprint.application_id, Fingerprint.digest).where(Fingerprint.kind == 'photo')
+        if self._loaded_until is not None:
+            query = query.where(Fingerprint.created_at >= self._loaded_until - REFRESH_OVERLAP)
+        for fingerprint_id, application_id, digest in db.session.execute(query):
+            if fingerprint_id not in self._seen:
+                self._seen.add(fingerprint_id)
+                self._tree.add(int(digest, 16), (fingerprint_id, application_id))
+        self._loaded_until = now
+
+    def search(self, value, radius):
+        """``[(distance, application_id)]`` for every photo hash within ``radius`` of ``value``"""
+        with self._lock:
+            self.refresh()
+            found = self._tree.search(value, radius)
+            fingerprint_ids = {fingerprint_id for _, (fingerprint_id, _) in found}
+            live = set(db.session.scalars(select(Fingerprint.id).where(Fingerprint.id.in_(fingerprint_ids)))) \
+                if fingerprint_ids else set()
+            if live != fingerprint_ids:
+                # Reload from the table on the next query rather than keep deleted hashes around
+                self.reset()
+            return [(distance, application_id) for distance, (fingerprint_id, application_id) in found
+                    if fingerprint_id in live]
+
+
+def init_duplicates(app):
+    app.extensions['photo_index'] = PhotoIndex()
+
+
+def get_photo_index():
+    return current_app.extensions['photo_index']
+
+
+def index_application(application, photo_hash=None):
+    """Add an application's fingerprints to the session; call in the transaction that creates it
+
+    ``photo_hash`` is the ``perceptual_hash`` of the uploaded photo, computed
+    beforehand so the transaction only does database work.
+    """
+    fingerprints = [Fingerprint(application_id=application.id, kind=kind, digest=digest)
+                    for kind, digest in application_identifiers(application).items()]
+    if photo_hash is not None:
+        fingerprints.append(Fingerprint(application_id=application.id, kind='photo', digest=f"{photo_hash:016x}"))
+    db.session.add_all(fingerprints)
+    return fingerprints
+
+
+def find_duplicates(application):
+    """Other applications sharing an Aadhaar number or phone, or with a near-identical photo
+
+    Identifiers are matched exactly through the (kind, digest) index; photos
+    within PHOTO_MATCH_DISTANCE bits are found through the multi-index. Photo matches
+    are ordered by distance, after the identifier matches.
+    """
+    matches = {}
+    identifiers = application_identifiers(application)
+    if identifiers:
+        rows = db.session.execute(
+            select(Fingerprint.kind, Fingerprint.application_id)
+            .where(Fingerprint.application_id != application.id,
+                   or_(*(and_(Fingerprint.kind == kind, Fingerprint.digest == digest)
+                         for kind, digest in identifiers.items())))
+        )
+        for kind, application_id in rows:
+            matches.setdefault((kind, application_id), 0)
+
+    photo_digest = db.session.scalar(
+        select(Fingerprint.digest).where(Fingerprint.application_id == application.id, Fingerprint.kind == 'photo')
+    )
+    if photo_digest:
+        radius = current_app.config.get('PHOTO_MATCH_DISTANCE', 10)
+        for distance, application_id in get_photo_index().search(int(photo_digest, 16), radius):
+            if application_id != application.id:
+                key = ('photo', application_id)
+                matches[key] = min(distance, matches.get(key, distance))
+
+    if not matches:
+        return []
+    others = {row.id: row for row in db.session.execute(
+        select(Application.id, Application.user_id, Application.application_number, Application.name, Application.status)
+        .where(Application.id.in_({application_id for _, application_id in matches}))
+    )}
+    # Applications deleted since their photo was indexed have no row left and drop out here
+    results = [
+        DuplicateMatch(kind, application_id, others[application_id].application_number, others[application_id].name,
+                       others[application_id].status, others[application_id].user_id == application.user_id, distance)
+        for (kind, application_id), distance in matches.items() if application_id in others
+    ]
+    return sorted(results, key=lambda m: (m.kind == 'photo', m.distance, m.application_id))
+
+
+def _download_and_hash(file_id):
+    data = download_drive_bytes(file_id)
+    return perceptual_hash(io.BytesIO(data)) if data else None
+
+
+def rebuild_fingerprints(batch_size=200):
+    """Recompute every application's fingerprints, downloading photos in parallel; returns counts per kind
+
+    Each batch's old rows are replaced by its new ones in a single
+    transaction, so duplicate checks keep working while this runs.
+    """
+    executor = get_executor('fingerprint', current_app.config.get('BUNDLE_DOWNLOAD_WORKERS', 8))
+    counts = dict.fromkeys(IDENTIFIER_KINDS + ('photo',), 0)
+
+    last_id = 0
+    while True:
+        applications = Application.query.filter(Application.id > last_id).order_by(Application.id).limit(batch_size).all()
+        if not applications:
+            break
+        last_id = applications[-1].id
+        photos = dict(db.session.execute(
+            select(Document.application_id, Document.file_path)
+            .where(Document.document_type == 'photo', Document.application_id.in_([a.id for a in applications]))
+        ).all())
+        hashes = dict(zip(photos, executor.map(in_app_context(_download_and_hash), photos.values())))
+        db.session.query(Fingerprint).filter(
+            Fingerprint.application_id.in_([a.id for a in applications])
+        ).delete(synchronize_session=False)
+        for application in applications:
+            for kind, digest in application_identifiers(application).items():
+                db.session.add(Fingerprint(application_id=application.id, kind=kind, digest=digest))
+                counts[kind] += 1
+            if hashes.get(application.id) is not None:
+                db.session.add(Fingerprint(application_id=application.id, kind='photo',
+                                           digest=f"{hashes[application.id]:016x}"))
+                counts['photo'] += 1
+        db.session.commit()
+        db.session.expunge_all()
+
+    get_photo_index().reset()
+    return counts
+
+
+@click.command('rebuild-fingerprints')
+@with_appcontext
+def rebuild_fingerprints_command():
+    """Rebuild the duplicate-detection fingerprints of every application."""
+    counts = rebuild_fingerprints()
+    for kind, count in counts.items():
+        click.echo(f"{kind:<8} {count}")
+    click.echo("Fingerprints rebuilt")
@@ -0,0 +1,207 @@
+import json
+import queue
+import threading
+import time
+from flask import current_app
+from token_store import SQLiteStore
+
+
+class EventLog(SQLiteStore):
+    """Append-only per-user event log shared by every worker process
+
+    Ids increase monotonically, so a client reconnecting with the last id it
+    saw gets exactly the events it missed. Entries expire after ``retention``.
+    """
+
+    def __init__(self, path, table='events', retention=86400, busy_timeout=5.0):
+        self.retention = retention
+        super().__init__(path, table, sweep_interval=300, busy_timeout=busy_timeout)
+
+    def _create_schema(self, conn):
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, '
+            'type TEXT NOT NULL, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{self.table}_user_id ON {self.table} (user_id, id)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{self.table}_expires_at ON {self.table} (expires_at)')
+
+    def append(self, user_id, event_type, data):
+        cursor = self._connection().execute(
+            f'INSERT INTO {self.table} (user_id, type, data, expires_at) VALUES (?, ?, ?, ?)',
+            (user_id, event_type, json.dumps(data, separators=(',', ':')), time.time() + self.retention)
+        )
+        self._maybe_sweep()
+        return cursor.lastrowid
+
+    def since(self, last_id, user_id=None, limit=500):
+        """Events after ``last_id`` as ``(id, user_id, type, data)``, optionally for one user"""
+        sql = f'SELECT id, user_id, type, data FROM {self.table} WHERE id > ?'
+        params = [last_id]
+        if user_id is not None:
+            sql += ' AND user_id = ?'
+            params.append(user_id)
+        sql += ' ORDER BY id LIMIT ?'
+        params.append(limit)
+        return self._connection().execute(sql, params).fetchall()
+
+    def latest_id(self):
+        row = self._connection().execute(f'SELECT MAX(id) FROM {self.table}').fetchone()
+        return row[0] or 0
+
+
+class EventBroker:
+    """In-process pub/sub that fans events out to the SSE streams of this worker
+
+    Events published by other workers reach this one through a single tailing
+    thread that polls the shared log, however many streams are open.
+    """
+
+    def __init__(self, log, poll_interval=1.0, max_streams=500):
+        self.log = log
+        self.poll_interval = poll_interval
+        self.max_streams = max_streams
+        self._subscribers = {}  # user_id -> set of queues
+        self._lock = threading.Lock()
+        self._tail_thread = None
+        self._tail_position = 0
+
+    def _open_streams(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    @property
+    def enabled(self):
+        return self.max_streams > 0
+
+    def is_full(self):
+        """Whether this worker already holds ``max_streams`` open streams"""
+        with self._lock:
+            return self._open_streams() >= self.max_streams
+
+    def subscribe(self, user_id):
+        """Register a stream; returns None when the worker is already at ``max_streams``"""
+        with self._lock:
+            if self._open_streams() >= self.max_streams:
+                return None
+            subscription = queue.Queue(maxsize=100)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            if self._tail_thread is None or not self._tail_thread.is_alive():
+                self._tail_position = self.log.latest_id()
+                self._tail_thread = threading.Thread(target=self._tail, name='event-tail', daemon=True)
+                self._tail_thread.start()
+            return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues:
+                queues.discard(subscription)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def dispatch(self, event_id, user_id, event_type, data):
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for subscription in queues:
+            try:
+                subscription.put_nowait((event_id, event_type, data))
+            except queue.Full:
+                # A stalled client; it will catch up from the log when it reconnects
+                pass
+
+    def publish(self, user_id, event_type, data):
+        """Record an event in the shared log and deliver it to local streams right away"""
+        event_id = self.log.append(user_id, event_type, data)
+        self.dispatch(event_id, user_id, event_type, data)
+        return event_id
+
+    def _tail(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                if not self._subscribers:
+                    self._tail_thread = None
+                    return
+            try:
+                rows = self.log.since(self._tail_position)
+            except Exception:
+                continue
+            for event_id, user_id, event_type, data in rows:
+                self._tail_position = event_id
+                self.dispatch(event_id, user_id, event_type, json.loads(data))
+
+
+def format_event(event_id, event_type, data):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+def event_stream(broker, user_id, last_event_id, keepalive=15, max_seconds=300, retry_ms=3000):
+    """Yield SSE frames for one user until ``max_seconds`` pass or the client goes away
+
+    Events are de-duplicated by id because a local publish reaches the stream
+    both directly and through the log tail.
+    """
+    subscription = broker.subscribe(user_id)
+    if subscription is None:
+        return
+    try:
+        yield f'retry: {retry_ms}\n\n'
+
+        last_id = last_event_id
+        if last_id is None:
+            last_id = broker.log.latest_id()
+        else:
+            # Replay what the client missed while it was disconnected
+            for event_id, _, event_type, data in broker.log.since(last_id, user_id=user_id):
+                last_id = event_id
+                yield format_event(event_id, event_type, json.loads(data))
+
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            try:
+                event_id, event_type, data = subscription.get(timeout=keepalive)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if event_id <= last_id:
+                continue
+            last_id = event_id
+            yield format_event(event_id, event_type, data)
+    finally:
+        broker.unsubscribe(user_id, subscription)
+
+
+def init_events(app):
+    """Attach the event log and broker to the app"""
+    log = EventLog(app.config['EVENTS_STORE_PATH'], retention=app.config['EVENTS_RETENTION'])
+    app.extensions['event_broker'] = EventBroker(log,
+                                                 poll_interval=app.config['EVENTS_POLL_INTERVAL'],
+                                                 max_streams=app.config['EVENTS_MAX_STREAMS'])
+    # Pages only open a stream when this worker can serve one
+    app.jinja_env.globals['live_updates_enabled'] = lambda: app.extensions['event_broker'].enabled
+
+
+def limit_event_streams(app, threads):
+    """Cap a worker's open streams at half its request threads
+
+    Every stream holds a thread for up to EVENTS_MAX_STREAM_SECONDS, so the
+    other half stays free for page requests. A single-threaded (sync)
+    worker serves no streams at all.
+    """
+    broker = app.extensions['event_broker']
+    broker.max_streams = min(app.config['EVENTS_MAX_STREAMS'], threads // 2)
+    return broker.max_streams
+
+
+def get_event_broker():
+    """Get the event broker of the current app"""
+    return current_app.extensions['event_broker']
+
+
+def publish_event(user_id, event_type, data):
+    """Push an event to every open stream of ``user_id``; never fails the caller's request"""
+    try:
+        return get_event_broker().publish(user_id, event_type, data)
+    except Exception as e:
+        current_app.logger.error(f"Failed to publish {event_type} event: {str(e)}")
+        return None
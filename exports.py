@@ -0,0 +1,176 @@
+import csv
+import io
+import json
+import sys
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from extensions import db
+from models import Application, StatusUpdate, Document
+
+APPLICATION_COLUMNS = [
+    Application.id,
+    Application.application_number,
+    Application.document_type,
+    Application.status,
+    Application.user_id,
+    Application.name,
+    Application.dob,
+    Application.gender,
+    Application.phone,
+    Application.email,
+    Application.father_name,
+    Application.aadhaar_number,
+    Application.next_of_kin,
+    Application.next_of_kin_relation,
+    Application.next_of_kin_phone,
+    Application.created_at,
+    Application.updated_at,
+]
+
+CSV_HEADER = [column.key for column in APPLICATION_COLUMNS] + [
+    'status_update_count', 'last_status_comment', 'last_status_at', 'status_history',
+    'document_count', 'document_types',
+]
+
+# Flush the CSV buffer to the client once it holds this many characters
+CSV_CHUNK_SIZE = 64 * 1024
+# Excel and LibreOffice evaluate cells starting with these; the CSV writer prefixes them with a quote
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    """Neutralize text a spreadsheet would run as a formula, e.g. ``=HYPERLINK(...)`` typed into a name"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _mask_aadhaar(number):
+    return f"XXXXXXXX{number[-4:]}" if number else number
+
+
+def iter_application_records(status=None, document_type=None, batch_size=1000):
+    """Yield one dict per application with its status history and document metadata
+
+    Applications are read through a server-side cursor ``batch_size`` rows
+    at a time. History and documents are fetched with one query each per
+    batch, so memory use does not grow with the number of rows exported.
+    """
+    stmt = select(*APPLICATION_COLUMNS).order_by(Application.id)
+    if status:
+        stmt = stmt.where(Application.status == status)
+    if document_type:
+        stmt = stmt.where(Application.document_type == document_type)
+
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        ids = [row.id for row in batch]
+
+        history = {}
+        for row in db.session.execute(
+            select(StatusUpdate.application_id, StatusUpdate.status, StatusUpdate.comment,
+                   StatusUpdate.updated_by, StatusUpdate.updated_at)
+            .where(StatusUpdate.application_id.in_(ids))
+            .order_by(StatusUpdate.application_id, StatusUpdate.updated_at)
+        ):
+            history.setdefault(row.application_id, []).append({
+                'status': row.status,
+                'comment': row.comment,
+                'updated_by': row.updated_by,
+                'updated_at': _serialize(row.updated_at),
+            })
+
+        documents = {}
+        for row in db.session.execute(
+            select(Document.application_id, Document.id, Document.document_type, Document.filename,
+                   Document.mime_type, Document.uploaded_at)
+            .where(Document.application_id.in_(ids))
+            .order_by(Document.application_id, Document.id)
+        ):
+            documents.setdefault(row.application_id, []).append({
+                'id': row.id,
+                'document_type': row.document_type,
+                'filename': row.filename,
+                'mime_type': row.mime_type,
+                'uploaded_at': _serialize(row.uploaded_at),
+            })
+
+        for row in batch:
+            record = {key: _serialize(value) for key, value in row._mapping.items()}
+            record['aadhaar_number'] = _mask_aadhaar(record['aadhaar_number'])
+            record['status_history'] = history.get(row.id, [])
+            record['documents'] = documents.get(row.id, [])
+            yield record
+
+
+def generate_ndjson(records):
+    """Encode records as newline-delimited JSON, one line per chunk"""
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def generate_csv(records):
+    """Encode records as CSV, flattening history and documents into summary columns
+
+    Citizens type most of these values, so cells that a spreadsheet would
+    treat as a formula are prefixed with ``'``. NDJSON output stays raw.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+
+    for record in records:
+        history = record['status_history']
+        last = history[-1] if history else {}
+        row = [record[key] for key in CSV_HEADER[:len(APPLICATION_COLUMNS)]]
+        row += [
+            len(history),
+            last.get('comment'),
+            last.get('updated_at'),
+            ';'.join(f"{entry['status']}@{entry['updated_at']}" for entry in history),
+            len(record['documents']),
+            ';'.join(document['document_type'] for document in record['documents']),
+        ]
+        writer.writerow([_csv_cell(value) for value in row])
+
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'csv': (generate_csv, 'text/csv'),
+    'ndjson': (generate_ndjson, 'application/x-ndjson'),
+}
+
+
+@click.command('export-applications')
+@click.option('--format', 'export_format', type=click.Choice(sorted(EXPORT_FORMATS)), default='csv')
+@click.option('--status', default=None, help='Only export applications with this status.')
+@click.option('--document-type', default=None, help='Only export passport or pancard applications.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='File to write to; defaults to standard output.')
+@click.option('--batch-size', default=1000, show_default=True)
+@with_appcontext
+def export_applications_command(export_format, status, document_type, output, batch_size):
+    """Stream applications with status history and document metadata as CSV or NDJSON."""
+    generate, _ = EXPORT_FORMATS[export_format]
+    records = iter_application_records(status=status, document_type=document_type, batch_size=batch_size)
+
+    out = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        for chunk in generate(records):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
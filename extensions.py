@@ -3,9 +3,10 @@ from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from flask_migrate import Migrate
 from flask_mail import Mail
+from db_routing import RoutingSession
 
 # Initialize Flask extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # reads from read-only views may go to a replica
 login_manager = LoginManager()
 csrf = CSRFProtect()
 migrate = Migrate()
@@ -1,11 +1,12 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectField, SubmitField, TextAreaField, FileField, HiddenField, EmailField, BooleanField
+from wtforms import StringField, PasswordField, SelectField, SubmitField, TextAreaField, FileField, HiddenField, EmailField, BooleanField, SelectMultipleField, IntegerField, FloatField
 from wtforms.fields import DateField  # Add this import for DateField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError, Regexp
+from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError, Regexp, NumberRange
 from flask_wtf.file import FileField, FileRequired, FileAllowed
 import re  # Add this import for regular expressions
 from datetime import date
 from flask_wtf.file import FileField, FileRequired, FileAllowed
+from upload_validation import FileContent
 
 class UpdateStatusForm(FlaskForm):
     status = SelectField('Status', 
@@ -17,39 +18,44 @@ class UpdateStatusForm(FlaskForm):
                         ],
                         validators=[DataRequired()])
     comment = TextAreaField('Comment')
+    version = HiddenField()  # application version the reviewer saw
 
 class PassportDocumentForm(FlaskForm):
     id_proof = FileField('ID Proof', 
                         validators=[
                             FileRequired(),
-                            FileAllowed(['jpg', 'png', 'pdf'], 'Images and PDF only!')
+                            FileAllowed(['jpg', 'png', 'pdf'], 'Images and PDF only!'),
+                            FileContent()
                         ])
     photo = FileField('Photo',
                      validators=[
                          FileRequired(),
-                         FileAllowed(['jpg', 'png'], 'Images only!')
+                         FileAllowed(['jpg', 'png'], 'Images only!'),
+                         FileContent()
                      ])
     address_proof = FileField('Address Proof',
                             validators=[
                                 FileRequired(),
-                                FileAllowed(['jpg', 'png', 'pdf'], 'Images and PDF only!')
+                                FileAllowed(['jpg', 'png', 'pdf'], 'Images and PDF only!'),
+                                FileContent()
                             ])
     dob_proof = FileField('Proof of Date of Birth',
                          validators=[
                              FileRequired(),
-                             FileAllowed(['jpg', 'png', 'pdf'], 'Images and PDF only!')
+                             FileAllowed(['jpg', 'png', 'pdf'], 'Images and PDF only!'),
+                             FileContent()
                          ])
     submit = SubmitField('Upload Documents')
 
 class PanCardDocumentForm(FlaskForm):
     id_proof = FileField('ID Proof (Aadhaar/Voter ID/Driving License)', 
-                        validators=[FileRequired(), FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'PDF or images only!')])
+                        validators=[FileRequired(), FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'PDF or images only!'), FileContent()])
     photo = FileField('Recent Passport Size Photo', 
-                     validators=[FileRequired(), FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!')])
+                     validators=[FileRequired(), FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!'), FileContent()])
     address_proof = FileField('Address Proof', 
-                             validators=[FileRequired(), FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'PDF or images only!')])
+                             validators=[FileRequired(), FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'PDF or images only!'), FileContent()])
     signature = FileField('Signature', 
-                         validators=[FileRequired(), FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!')])
+                         validators=[FileRequired(), FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!'), FileContent()])
     submit = SubmitField('Upload Documents')
 
 class ForgotPasswordForm(FlaskForm):
@@ -341,22 +347,29 @@ class UploadDocumentForm(FlaskForm):
     
     # Fields for passport
     id_proof = FileField('ID Proof', 
-                       validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!')])
+                       validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!'), FileContent()])
     photo = FileField('Photo', 
-                    validators=[FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!')])
+                    validators=[FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!'), FileContent()])
     address_proof = FileField('Address Proof', 
-                           validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!')])
+                           validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!'), FileContent()])
     dob_proof = FileField('Date of Birth Proof', 
-                        validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!')])
+                        validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!'), FileContent()])
     
     # Fields for PAN Card
     pan_id_proof = FileField('ID Proof', 
-                          validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!')])
+                          validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!'), FileContent()])
     pan_photo = FileField('Photo', 
-                       validators=[FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!')])
+                       validators=[FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!'), FileContent()])
     pan_address_proof = FileField('Address Proof', 
-                              validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!')])
+                              validators=[FileAllowed(['pdf', 'jpg', 'jpeg', 'png'], 'Images and PDFs only!'), FileContent()])
     pan_signature = FileField('Signature', 
-                           validators=[FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!')])
+                           validators=[FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!'), FileContent()])
     
     submit = SubmitField('Upload Documents')
+
+class ProfilerForm(FlaskForm):
+    endpoints = SelectMultipleField('Endpoints', validators=[DataRequired()])
+    duration = IntegerField('Duration (seconds)', default=300, validators=[DataRequired(), NumberRange(min=10, max=3600)])
+    interval_ms = IntegerField('Sampling interval (ms)', default=10, validators=[DataRequired(), NumberRange(min=1, max=1000)])
+    sample_rate = FloatField('Fraction of requests to sample', default=1.0, validators=[DataRequired(), NumberRange(min=0.01, max=1.0)])
+    submit = SubmitField('Start Profiling')
@@ -0,0 +1,74 @@
+import os
+import re
+import shutil
+import time
+import uuid
+from flask import current_app
+from config import Config
+
+# Ids handed out by this backend; anything else is rejected before touching the disk
+FILE_ID_PATTERN = re.compile(r'^local-[0-9a-f]{32}$')
+
+
+def setting(name):
+    """A storage setting from the running app's config; pool work runs under ``in_app_context``"""
+    return current_app.config.get(name, getattr(Config, name))
+
+
+def is_local_storage():
+    """Whether documents go to a local directory instead of Google Drive"""
+    return setting('STORAGE_BACKEND') == 'local'
+
+
+def _simulate_latency():
+    latency_ms = setting('LOCAL_STORAGE_LATENCY_MS')
+    if latency_ms:
+        time.sleep(latency_ms / 1000)
+
+
+def _path_for(file_id):
+    if not file_id or not FILE_ID_PATTERN.match(file_id):
+        return None
+    return os.path.join(setting('LOCAL_STORAGE_PATH'), file_id)
+
+
+def save_file(file_path, file_name):
+    """Copy a file into local storage and return its id"""
+    _simulate_latency()
+    file_id = f"local-{uuid.uuid4().hex}"
+    storage_dir = setting('LOCAL_STORAGE_PATH')
+    os.makedirs(storage_dir, exist_ok=True)
+    shutil.copyfile(file_path, os.path.join(storage_dir, file_id))
+    return file_id
+
+
+def save_stream(stream):
+    """Write a readable stream into local storage and return its id"""
+    _simulate_latency()
+    file_id = f"local-{uuid.uuid4().hex}"
+    storage_dir = setting('LOCAL_STORAGE_PATH')
+    os.makedirs(storage_dir, exist_ok=True)
+    with open(os.path.join(storage_dir, file_id), 'wb') as f:
+        shutil.copyfileobj(stream, f)
+    return file_id
+
+
+def copy_file(file_id, destination_path):
+    """Copy a stored file to ``destination_path``; returns False if it does not exist"""
+    _simulate_latency()
+    path = _path_for(file_id)
+    if not path or not os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    shutil.copyfile(path, destination_path)
+    return True
+
+
+def read_file(file_id):
+    """Return a stored file's bytes, or None if it does not exist"""
+    _simulate_latency()
+    path = _path_for(file_id)
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,346 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from flask import Blueprint, Response, current_app, g, has_request_context, request, abort
+from sqlalchemy import event
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Server-Timing names for the external-call spans, in header order
+SPAN_KINDS = ('drive', 'pdf', 'smtp')
+
+# Registry fields that are plain counters and histograms, in snapshot files
+COUNTERS = ('requests', 'sql_queries', 'sql_seconds', 'span_errors', 'rate_limit')
+HISTOGRAMS = ('request_latency', 'span_latency')
+
+# Scrapes without METRICS_TOKEN are only answered for these addresses, and never through a proxy
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+class Histogram:
+    """Cumulative latency histogram in the shape Prometheus expects"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """Per-process request, SQL and external-call metrics
+
+    Workers write a snapshot of theirs to a shared directory now and then;
+    a scrape merges every worker's snapshot, so counters do not depend on
+    which worker answers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.request_latency = defaultdict(Histogram)  # (endpoint, method)
+            self.requests = defaultdict(int)  # (endpoint, method, status)
+            self.sql_queries = defaultdict(int)  # (endpoint,)
+            self.sql_seconds = defaultdict(float)  # (endpoint,)
+            self.span_latency = defaultdict(Histogram)  # (kind, operation)
+            self.span_errors = defaultdict(int)  # (kind, operation)
+            self.rate_limit = defaultdict(int)  # (scope, outcome), merged from snapshots only
+
+    def record_request(self, endpoint, method, status, duration, sql_count, sql_time):
+        with self._lock:
+            self.request_latency[(endpoint, method)].observe(duration)
+            self.requests[(endpoint, method, status)] += 1
+            self.sql_queries[(endpoint,)] += sql_count
+            self.sql_seconds[(endpoint,)] += sql_time
+
+    def record_span(self, kind, operation, duration, failed):
+        with self._lock:
+            self.span_latency[(kind, operation)].observe(duration)
+            if failed:
+                self.span_errors[(kind, operation)] += 1
+
+    def snapshot(self, rate_limit_stats=None):
+        """JSON-ready copy of the recorded metrics"""
+        with self._lock:
+            counters = {name: [[list(key), value] for key, value in getattr(self, name).items()]
+                        for name in COUNTERS}
+            histograms = {name: [[list(key), h.counts, h.count, h.sum] for key, h in getattr(self, name).items()]
+                          for name in HISTOGRAMS}
+        if rate_limit_stats:
+            counters['rate_limit'] = [[list(key), value] for key, value in rate_limit_stats.items()]
+        return {'counters': counters, 'histograms': histograms}
+
+    def merge(self, snapshot):
+        """Add another registry's snapshot to this one"""
+        with self._lock:
+            for name, items in snapshot.get('counters', {}).items():
+                target = getattr(self, name)
+                for key, value in items:
+                    target[tuple(key)] += value
+            for name, items in snapshot.get('histograms', {}).items():
+                target = getattr(self, name)
+                for key, counts, count, total in items:
+                    histogram = target[tuple(key)]
+                    histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                    histogram.count += count
+                    histogram.sum += total
+
+    def render(self):
+        """Prometheus text exposition of everything recorded so far"""
+        lines = []
+        with self._lock:
+            _render_histogram(lines, 'dastaavej_request_duration_seconds',
+                              'Request latency by endpoint', ('endpoint', 'method'), self.request_latency)
+            _render_counter(lines, 'dastaavej_requests_total',
+                            'Requests by endpoint and status', ('endpoint', 'method', 'status'), self.requests)
+            _render_counter(lines, 'dastaavej_sql_queries_total',
+                            'SQL statements executed by endpoint', ('endpoint',), self.sql_queries)
+            _render_counter(lines, 'dastaavej_sql_seconds_total',
+                            'Time spent in SQL statements by endpoint', ('endpoint',), self.sql_seconds)
+            _render_histogram(lines, 'dastaavej_external_call_duration_seconds',
+                              'Drive, PDF and SMTP call latency', ('kind', 'operation'), self.span_latency)
+            _render_counter(lines, 'dastaavej_external_call_errors_total',
+                            'Drive, PDF and SMTP calls that failed', ('kind', 'operation'), self.span_errors)
+            _render_counter(lines, 'dastaavej_rate_limit_decisions_total',
+                            'Rate limiter decisions by scope', ('scope', 'outcome'), self.rate_limit)
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values):
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return ','.join(pairs)
+
+
+def _render_counter(lines, name, help_text, label_names, values):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{{{_labels(label_names, key)}}} {value}')
+
+
+def _render_histogram(lines, name, help_text, label_names, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(histograms.items()):
+        labels = _labels(label_names, key)
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+
+registry = MetricsRegistry()
+
+
+def _snapshot_path(app, pid):
+    return os.path.join(app.config['METRICS_STORE_PATH'], f"{pid}.json")
+
+
+def flush_metrics(app):
+    """Write this process's snapshot for the other workers' scrapes to merge"""
+    from rate_limit import get_rate_limit_stats
+    with app.app_context():
+        snapshot = registry.snapshot(get_rate_limit_stats())
+    path = _snapshot_path(app, os.getpid())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(partial_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(partial_path, path)
+
+
+_flusher = {'pid': None}
+_flusher_lock = threading.Lock()
+
+
+def _flush_periodically(app):
+    interval = app.config['METRICS_FLUSH_INTERVAL']
+    while True:
+        time.sleep(interval)
+        try:
+            flush_metrics(app)
+        except OSError as e:
+            app.logger.warning(f"Could not write the metrics snapshot: {e}")
+
+
+def _start_flusher(app):
+    # Threads do not survive a fork, so each worker starts its own on its first request
+    if _flusher['pid'] == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher['pid'] != os.getpid():
+            _flusher['pid'] = os.getpid()
+            threading.Thread(target=_flush_periodically, args=(app,), name='metrics-flush', daemon=True).start()
+
+
+def clear_metrics_store(app):
+    """Forget the snapshots of a previous run; call once before workers start"""
+    directory = app.config['METRICS_STORE_PATH']
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def merged_registry(app):
+    """Every worker's metrics summed, this process's taken live rather than from its snapshot
+
+    Snapshots of workers that have exited stay in the directory, so
+    counters keep growing across worker restarts until the server restarts.
+    """
+    from rate_limit import get_rate_limit_stats
+    merged = MetricsRegistry()
+    directory = app.config['METRICS_STORE_PATH']
+    own = f"{os.getpid()}.json"
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        if not name.endswith('.json') or name == own:
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                merged.merge(json.load(f))
+        except (OSError, ValueError):
+            continue
+    merged.merge(registry.snapshot(get_rate_limit_stats()))
+    return merged
+
+
+def traced(kind, operation=None, failed_if=None):
+    """Time calls to an external service and attribute them to the current request
+
+    Calls that raise count as failures, as do those whose result makes
+    ``failed_if`` true (for helpers that catch their own errors and
+    return None or False). Works outside a request too (e.g. in download
+    threads); those calls only feed the process-wide histograms.
+    """
+    def decorator(fn):
+        name = operation or fn.__name__
+
+        @wraps(fn)
+        def wrapped(*args, **kwargs):
+            start = time.perf_counter()
+            failed = False
+            try:
+                result = fn(*args, **kwargs)
+                failed = failed_if is not None and failed_if(result)
+                return result
+            except Exception:
+                failed = True
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                registry.record_span(kind, name, duration, failed)
+                if has_request_context() and 'request_metrics' in g:
+                    spans = g.request_metrics['spans']
+                    spans[kind] = spans.get(kind, 0.0) + duration
+        return wrapped
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    if has_request_context() and 'request_metrics' in g:
+        g.request_metrics['sql_count'] += 1
+        g.request_metrics['sql_time'] += time.perf_counter() - started
+
+
+def _handle_error(exception_context):
+    # Keep the start-time stack balanced when a statement fails
+    starts = exception_context.connection.info.get('query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def server_timing_header(metrics, total):
+    """Build a Server-Timing value: total, SQL and one entry per external-call kind"""
+    parts = [f'app;dur={total * 1000:.1f}',
+             f'db;dur={metrics["sql_time"] * 1000:.1f};desc="{metrics["sql_count"]} queries"']
+    for kind in SPAN_KINDS:
+        if kind in metrics['spans']:
+            parts.append(f'{kind};dur={metrics["spans"][kind] * 1000:.1f}')
+    return ', '.join(parts)
+
+
+@metrics_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint with the metrics of every worker process"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            abort(403)
+    elif request.remote_addr not in LOCAL_ADDRESSES or 'X-Forwarded-For' in request.headers:
+        # Without a token only a scraper on this host may read it, not clients through the proxy
+        abort(403)
+
+    body = merged_registry(current_app).render()
+    response = Response(body, mimetype='text/plain; version=0.0.4')
+    response.headers['X-Worker-Pid'] = str(os.getpid())
+    return response
+
+
+def init_metrics(app):
+    """Hook request timing, SQL events and mail spans into the app; call after ``db.init_app``"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    from extensions import db, mail
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics = {'start': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0, 'spans': {}}
+
+    @app.after_request
+    def finish_request_metrics(response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        total = time.perf_counter() - metrics['start']
+        endpoint = request.endpoint or 'unmatched'
+        registry.record_request(endpoint, request.method, response.status_code, total,
+                                metrics['sql_count'], metrics['sql_time'])
+        _start_flusher(app)
+        if app.config.get('METRICS_SERVER_TIMING', True):
+            response.headers['Server-Timing'] = server_timing_header(metrics, total)
+        return response
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+
+    # Every module sends through the shared Mail object, so wrapping it covers them all
+    if not getattr(mail.send, '_traced', False):
+        mail.send = traced('smtp', 'send')(mail.send)
+        mail.send._traced = True
+
+    app.register_blueprint(metrics_bp)
@@ -0,0 +1,36 @@
+"""Add application_counter table
+
+Revision ID: 3b7c51d2a9e4
+Revises: 7e4ab1c18fcd
+Create Date: 2026-10-19 05:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7c51d2a9e4'
+down_revision = '7e4ab1c18fcd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('application_counter',
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('document_type', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('status', 'document_type')
+    )
+
+    # Seed the counters from the applications that already exist
+    op.execute(
+        "INSERT INTO application_counter (status, document_type, count) "
+        "SELECT status, document_type, COUNT(*) FROM application "
+        "WHERE status IS NOT NULL GROUP BY status, document_type"
+    )
+
+
+def downgrade():
+    op.drop_table('application_counter')
@@ -0,0 +1,39 @@
+"""Add fingerprint table for duplicate detection
+
+Revision ID: 5d2a8e61c0f4
+Revises: 9c4e2f7a1b83
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2a8e61c0f4'
+down_revision = '9c4e2f7a1b83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('fingerprint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('application_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['application_id'], ['application.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('fingerprint', schema=None) as batch_op:
+        batch_op.create_index('ix_fingerprint_application_id', ['application_id'], unique=False)
+        batch_op.create_index('ix_fingerprint_kind_digest', ['kind', 'digest'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('fingerprint', schema=None) as batch_op:
+        batch_op.drop_index('ix_fingerprint_kind_digest')
+        batch_op.drop_index('ix_fingerprint_application_id')
+
+    op.drop_table('fingerprint')
@@ -0,0 +1,36 @@
+"""Add review queue leases and version to application
+
+Revision ID: 9c4e2f7a1b83
+Revises: 3b7c51d2a9e4
+Create Date: 2026-10-19 06:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e2f7a1b83'
+down_revision = '3b7c51d2a9e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_by', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.create_foreign_key('fk_application_claimed_by_user', 'user', ['claimed_by'], ['id'])
+        batch_op.create_index('ix_application_claimed_by', ['claimed_by'], unique=False)
+        batch_op.create_index('ix_application_status_created_at', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.drop_index('ix_application_status_created_at')
+        batch_op.drop_index('ix_application_claimed_by')
+        batch_op.drop_constraint('fk_application_claimed_by_user', type_='foreignkey')
+        batch_op.drop_column('version')
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('claimed_by')
@@ -14,7 +14,7 @@ class User(db.Model, UserMixin):
     is_verified = db.Column(db.Boolean, default=False)
     
     # Relationships
-    applications = db.relationship('Application', backref='user', lazy=True)
+    applications = db.relationship('Application', backref='user', lazy=True, foreign_keys='Application.user_id')
     notifications = db.relationship('Notification', backref='user', lazy=True)
     status_updates = db.relationship('StatusUpdate', backref='updater', lazy=True)
     
@@ -50,13 +50,41 @@ class Application(db.Model):
     next_of_kin_relation = db.Column(db.String(50))
     next_of_kin_phone = db.Column(db.String(15))
     
+    # Review work queue: the reviewer holding the lease and when it lapses
+    claimed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    # Bumped by every ORM update; a stale version makes the UPDATE match no row
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
     # Relationships
     documents = db.relationship('Document', backref='application', lazy=True, cascade="all, delete-orphan")
     status_updates = db.relationship('StatusUpdate', backref='application', lazy=True, cascade="all, delete-orphan")
+    reviewer = db.relationship('User', foreign_keys=[claimed_by], lazy=True)
+    fingerprints = db.relationship('Fingerprint', backref='application', lazy=True, cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        db.Index('ix_application_status_created_at', 'status', 'created_at'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+    
+    def lease_holder(self, now=None):
+        """Id of the reviewer whose lease is still running, or None"""
+        if self.claimed_by and self.lease_expires_at and self.lease_expires_at > (now or datetime.utcnow()):
+            return self.claimed_by
+        return None
     
     def __repr__(self):
         return f'<Application {self.application_number}>'
 
+class ApplicationCounter(db.Model):
+    """Number of applications per status and document type, kept in step with Application"""
+    status = db.Column(db.String(20), primary_key=True)
+    document_type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ApplicationCounter {self.document_type}/{self.status}: {self.count}>'
+
 class Document(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False)
@@ -71,6 +99,21 @@ class Document(db.Model):
     def __repr__(self):
         return f'<Document {self.document_type} for Application {self.application_id}>'
 
+class Fingerprint(db.Model):
+    """Keyed hash of an identifier (Aadhaar, phone) or perceptual hash of a photo, for duplicate checks"""
+    id = db.Column(db.Integer, primary_key=True)
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'aadhaar', 'phone' or 'photo'
+    digest = db.Column(db.String(64), nullable=False)  # HMAC-SHA256 hex, or the 64-bit photo hash as 16 hex digits
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_fingerprint_kind_digest', 'kind', 'digest'),
+    )
+    
+    def __repr__(self):
+        return f'<Fingerprint {self.kind} for Application {self.application_id}>'
+
 class StatusUpdate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False)
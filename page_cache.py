@@ -0,0 +1,165 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from jinja2 import meta, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class PageCache:
+    """Per-process LRU of rendered pages and template fragments
+
+    Keys include the version of the templates involved, so entries never go
+    stale on a deploy; they are simply no longer looked up.
+    """
+
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def template_version(self, env, name):
+        """Hash of a template's source and of every template it extends, includes or imports"""
+        # With auto-reload (debug) templates may change under a running worker
+        if not env.auto_reload:
+            version = self._versions.get(name)
+            if version is not None:
+                return version
+
+        digest = hashlib.sha256()
+        seen = set()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            source = env.loader.get_source(env, current)[0]
+            digest.update(current.encode())
+            digest.update(source.encode())
+            pending.extend(ref for ref in meta.find_referenced_templates(env.parse(source)) if ref)
+        version = digest.hexdigest()[:16]
+        self._versions[name] = version
+        return version
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, ... %}...{% endcache %}`` caches a block's output
+
+    The key expressions are evaluated on every render; the block body is only
+    rendered when this template version has not seen that key before. Put
+    everything the block depends on into the key.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render_fragment', [nodes.Const(parser.name), nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, template_name, key_parts, caller):
+        cache = get_page_cache()
+        if cache is None or template_name is None:
+            return caller()
+        version = cache.template_version(self.environment, template_name)
+        key = ('fragment', template_name, version, repr(key_parts))
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = str(caller())
+            cache.set(key, fragment)
+        return Markup(fragment)
+
+
+def auth_variant():
+    """What a public page may show differently depending on who is logged in"""
+    if current_user.is_authenticated:
+        return current_user.role
+    return 'anonymous'
+
+
+def cached_page(template_name):
+    """Serve a GET view's rendered output from the page cache
+
+    The key is the path, the auth variant and the version of
+    ``template_name``. Responses carry an ETag, so browsers revalidate with a
+    304 instead of downloading the page again. Pages are never cached while
+    flash messages are pending, since rendering them consumes the messages.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            cache = get_page_cache()
+            if cache is None or request.method != 'GET' or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            variant = auth_variant()
+            version = cache.template_version(current_app.jinja_env, template_name)
+            key = ('page', request.path, variant, version)
+            entry = cache.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or '_flashes' in session:
+                    return response
+                body = response.get_data()
+                entry = (body, response.mimetype, hashlib.sha256(body).hexdigest()[:32])
+                cache.set(key, entry)
+
+            body, mimetype, etag = entry
+            response = current_app.response_class(body, mimetype=mimetype)
+            response.set_etag(etag)
+            max_age = current_app.config.get('PAGE_CACHE_MAX_AGE', 0)
+            # Logged-in variants differ per role, so only anonymous pages may sit in shared caches
+            if variant == 'anonymous':
+                response.cache_control.public = True
+            else:
+                response.cache_control.private = True
+            if max_age:
+                response.cache_control.max_age = max_age
+            else:
+                response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapped
+    return decorator
+
+
+def init_page_cache(app):
+    """Register the ``{% cache %}`` tag and, when PAGE_CACHE_ENABLED is set, the cache behind it"""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if app.config.get('PAGE_CACHE_ENABLED', True):
+        app.extensions['page_cache'] = PageCache(max_entries=app.config.get('PAGE_CACHE_MAX_ENTRIES', 500))
+
+
+def get_page_cache():
+    """Get the page cache of the current app, or None when it is disabled"""
+    return current_app.extensions.get('page_cache')
@@ -0,0 +1,244 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, request
+from token_store import SQLiteStore
+
+SESSION_KEY = 'session'
+
+
+class ProfileStore(SQLiteStore):
+    """The armed profiling session and the collapsed-stack counts of every worker
+
+    Keeping both in a shared SQLite file lets one request arm all workers and
+    lets the download aggregate samples taken by any of them.
+    """
+
+    def __init__(self, path, table='profiler', busy_timeout=5.0):
+        super().__init__(path, table, busy_timeout=busy_timeout)
+
+    def _create_schema(self, conn):
+        super()._create_schema(conn)
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table}_samples ('
+            'stack TEXT PRIMARY KEY, count INTEGER NOT NULL)'
+        )
+
+    def arm(self, endpoints, duration, interval, sample_rate):
+        """Start a new session, discarding the samples of the previous one"""
+        session = {
+            'endpoints': sorted(endpoints),
+            'interval': interval,
+            'sample_rate': sample_rate,
+            'started_at': time.time(),
+            'expires_at': time.time() + duration,
+        }
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(f'DELETE FROM {self.table}_samples')
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                (SESSION_KEY, json.dumps(session), session['expires_at'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return session
+
+    def disarm(self):
+        self.discard(SESSION_KEY)
+
+    def get_session(self):
+        row = self._connection().execute(
+            f'SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?',
+            (SESSION_KEY, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_samples(self, counts):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                f'INSERT INTO {self.table}_samples (stack, count) VALUES (?, ?) '
+                'ON CONFLICT (stack) DO UPDATE SET count = count + excluded.count',
+                counts.items()
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def collapsed(self):
+        """Samples as ``frame;frame;frame count`` lines, the input format of flamegraph tools"""
+        rows = self._connection().execute(
+            f'SELECT stack, count FROM {self.table}_samples ORDER BY count DESC'
+        )
+        return ''.join(f'{stack} {count}\n' for stack, count in rows)
+
+    def sample_total(self):
+        row = self._connection().execute(f'SELECT COALESCE(SUM(count), 0) FROM {self.table}_samples').fetchone()
+        return row[0]
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+    return f'{module}:{code.co_name}'
+
+
+class StackSampler:
+    """Background thread that samples the stacks of threads serving profiled requests
+
+    Only threads attached with ``attach`` are sampled, so unrelated requests
+    pay nothing. The thread exits once nothing has been attached for a while.
+    """
+
+    def __init__(self, store, max_depth=64, max_overhead=0.05, flush_interval=1.0):
+        self.store = store
+        self.max_depth = max_depth
+        self.max_overhead = max_overhead
+        self.flush_interval = flush_interval
+        self.interval = 0.005
+        self._targets = {}
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def attach(self, thread_id, label, interval):
+        with self._lock:
+            self._targets[thread_id] = label
+            self.interval = interval
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def detach(self, thread_id):
+        with self._lock:
+            self._targets.pop(thread_id, None)
+
+    def _sample(self):
+        with self._lock:
+            targets = dict(self._targets)
+        if not targets:
+            return False
+
+        frames = sys._current_frames()
+        for thread_id, label in targets.items():
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                stack.append(label)
+                self._counts[';'.join(reversed(stack))] += 1
+        return True
+
+    def flush(self):
+        if not self._counts:
+            return
+        counts, self._counts = self._counts, Counter()
+        try:
+            self.store.add_samples(counts)
+        except Exception:
+            # Profiling must never take a worker down; drop this batch instead
+            pass
+
+    def _run(self):
+        last_flush = time.monotonic()
+        idle_since = None
+        while True:
+            started = time.perf_counter()
+            sampled = self._sample()
+            spent = time.perf_counter() - started
+
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = now
+
+            if sampled:
+                idle_since = None
+            elif idle_since is None:
+                idle_since = now
+            elif now - idle_since > 5:
+                with self._lock:
+                    if not self._targets:
+                        self._thread = None
+                        break
+
+            # Never spend more than max_overhead of one core on sampling
+            time.sleep(max(self.interval, spent * (1 / self.max_overhead - 1)))
+        self.flush()
+
+
+class Profiler:
+    """Per-worker glue between request hooks, the shared session and the sampler"""
+
+    def __init__(self, store, max_depth=64, max_overhead=0.05):
+        self.store = store
+        self.sampler = StackSampler(store, max_depth=max_depth, max_overhead=max_overhead)
+        self._session = None
+        self._session_checked = 0.0
+
+    def current_session(self):
+        # Re-read the shared session at most once a second per worker
+        now = time.monotonic()
+        if now - self._session_checked > 1:
+            self._session = self.store.get_session()
+            self._session_checked = now
+        if self._session and self._session['expires_at'] <= time.time():
+            self._session = None
+        return self._session
+
+    def refresh(self):
+        self._session_checked = 0.0
+
+    def start_request(self, endpoint):
+        session = self.current_session()
+        if not session or endpoint not in session['endpoints']:
+            return False
+        if random.random() >= session['sample_rate']:
+            return False
+        self.sampler.attach(threading.get_ident(), endpoint, session['interval'])
+        return True
+
+    def finish_request(self):
+        self.sampler.detach(threading.get_ident())
+
+
+def init_profiler(app):
+    """Register the sampling profiler; does nothing unless PROFILER_ENABLED is set"""
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+
+    store = ProfileStore(app.config['PROFILER_STORE_PATH'])
+    profiler = Profiler(store,
+                        max_depth=app.config.get('PROFILER_MAX_DEPTH', 64),
+                        max_overhead=app.config.get('PROFILER_MAX_OVERHEAD', 0.05))
+    app.extensions['profiler'] = profiler
+
+    @app.before_request
+    def start_profiling():
+        if request.endpoint and profiler.start_request(request.endpoint):
+            g.profiling = True
+
+    @app.teardown_request
+    def stop_profiling(exception=None):
+        if g.pop('profiling', False):
+            profiler.finish_request()
+
+    from routes.profiler import profiler_bp
+    app.register_blueprint(profiler_bp, url_prefix='/agency/profiler')
+
+
+def get_profiler():
+    """Get the profiler of the current app, or None when profiling is disabled"""
+    return current_app.extensions.get('profiler')
@@ -0,0 +1,215 @@
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from functools import wraps
+from flask import current_app, request
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+from token_store import SQLiteStore
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+
+def parse_rate(rate):
+    """Parse a rate such as '5/minute' into ``(limit, window_seconds)``"""
+    count, _, period = rate.partition('/')
+    period = period.strip().rstrip('s')
+    if period not in PERIODS:
+        raise ValueError(f"Unknown rate limit period: {rate}")
+    return int(count), PERIODS[period]
+
+
+class MemoryRateLimiter:
+    """Sliding-window log kept in process memory
+
+    Each key holds at most ``limit`` timestamps, so memory stays bounded
+    no matter how hard a single client hammers an endpoint.
+    """
+
+    def __init__(self, sweep_interval=60):
+        self.sweep_interval = sweep_interval
+        self._hits = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def hit(self, key, limit, window):
+        """Record a hit and return ``(allowed, remaining, retry_after)``"""
+        now = time.monotonic()
+        with self._lock:
+            # Each key keeps its own window, so sweeps judge it against its own limit
+            _, hits = self._hits.setdefault(key, (window, deque()))
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return False, 0, hits[0] + window - now
+            hits.append(now)
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep_locked(now)
+            return True, limit - len(hits), 0
+
+    def _sweep_locked(self, now):
+        # Drop keys whose newest hit has aged out of that key's window
+        stale = [key for key, (window, hits) in self._hits.items() if not hits or hits[-1] <= now - window]
+        for key in stale:
+            del self._hits[key]
+        self._last_sweep = now
+
+    def reset(self):
+        with self._lock:
+            self._hits.clear()
+
+
+class SQLiteRateLimiter(SQLiteStore):
+    """Token buckets kept in a SQLite file shared by every worker process"""
+
+    def __init__(self, path, table='rate_limits', sweep_interval=60, busy_timeout=1.0):
+        super().__init__(path, table, sweep_interval=sweep_interval, busy_timeout=busy_timeout)
+
+    def _create_schema(self, conn):
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{self.table}_expires_at ON {self.table} (expires_at)')
+
+    def hit(self, key, limit, window):
+        """Take a token from the bucket and return ``(allowed, remaining, retry_after)``"""
+        refill_rate = limit / window
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                f'SELECT tokens, updated_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                tokens = float(limit)
+            else:
+                tokens = min(float(limit), row[0] + (now - row[1]) * refill_rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # A bucket that has refilled completely carries no state and can be swept
+            expires_at = now + (limit - tokens) / refill_rate
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, tokens, updated_at, expires_at) VALUES (?, ?, ?, ?)',
+                (key, tokens, now, expires_at)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._maybe_sweep()
+        if allowed:
+            return True, int(tokens), 0
+        return False, 0, (1 - tokens) / refill_rate
+
+    def reset(self):
+        self._connection().execute(f'DELETE FROM {self.table}')
+
+
+class RateLimiter:
+    """Applies limits through a backend and counts outcomes for monitoring"""
+
+    def __init__(self, backend, enabled=True):
+        self.backend = backend
+        self.enabled = enabled
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def hit(self, scope, key, limit, window):
+        try:
+            result = self.backend.hit(f'{scope}:{key}', limit, window)
+        except sqlite3.OperationalError as e:
+            # Fail open: a busy limiter must never take the endpoint down with it
+            current_app.logger.warning(f"Rate limiter unavailable for {scope}: {str(e)}")
+            result = (True, limit, 0)
+        with self._stats_lock:
+            self.stats[(scope, 'allowed' if result[0] else 'limited')] += 1
+        return result
+
+    def get_stats(self):
+        """Snapshot of ``{(scope, outcome): count}`` since the worker started"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+
+def _client_ip():
+    # The client's own address once PROXY_FIX_COUNT trusts the proxies in front of the app
+    return request.remote_addr or 'unknown'
+
+
+def _user_key():
+    # Logged-in user id, otherwise the username being tried on the login form
+    if current_user.is_authenticated:
+        return f'id:{current_user.id}'
+    username = request.form.get('username')
+    return f'name:{username.strip().lower()}' if username else None
+
+
+def _email_key():
+    email = request.form.get('email')
+    return email.strip().lower() if email else None
+
+
+KEY_FUNCTIONS = {
+    'ip': _client_ip,
+    'user': _user_key,
+    'email': _email_key,
+}
+
+
+def rate_limit(rate, keys=('ip',), methods=('POST',)):
+    """Limit a view to ``rate`` hits per key
+
+    ``keys`` names entries of ``KEY_FUNCTIONS`` or are callables returning
+    the key for the current request; a key that resolves to None is skipped.
+    Only requests whose method is in ``methods`` are counted.
+    """
+    limit, window = parse_rate(rate)
+    key_functions = [(k, KEY_FUNCTIONS[k]) if isinstance(k, str) else (k.__name__, k) for k in keys]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            limiter = current_app.extensions.get('rate_limiter')
+            if limiter is None or not limiter.enabled or (methods and request.method not in methods):
+                return view(*args, **kwargs)
+
+            for name, key_function in key_functions:
+                value = key_function()
+                if value is None:
+                    continue
+                allowed, _, retry_after = limiter.hit(request.endpoint, f'{name}:{value}', limit, window)
+                if not allowed:
+                    current_app.logger.warning(f"Rate limit exceeded on {request.endpoint} for {name} key")
+                    raise TooManyRequests(retry_after=max(1, int(retry_after + 0.999)))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def init_rate_limiter(app):
+    """Attach the rate limiter configured by ``RATELIMIT_BACKEND`` to the app"""
+    backend_name = app.config.get('RATELIMIT_BACKEND', 'sqlite')
+    if backend_name == 'memory':
+        backend = MemoryRateLimiter()
+    elif backend_name == 'sqlite':
+        backend = SQLiteRateLimiter(app.config['RATELIMIT_STORE_PATH'])
+    else:
+        raise ValueError(f"Unknown rate limit backend: {backend_name}")
+    app.extensions['rate_limiter'] = RateLimiter(backend, enabled=app.config.get('RATELIMIT_ENABLED', True))
+
+
+def get_rate_limit_stats():
+    """Counters of allowed and limited requests per endpoint for this worker"""
+    limiter = current_app.extensions.get('rate_limiter')
+    return limiter.get_stats() if limiter else {}
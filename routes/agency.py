@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file, jsonify, Response, stream_with_context, abort
 from flask_login import login_required, current_user
 from models import Application, StatusUpdate, Notification, User, Document
 from extensions import db, mail
@@ -8,11 +8,58 @@ import tempfile
 import os
 import time
 from utils import generate_application_pdf
+from db_engine import write_transaction
+from db_routing import read_only
+from counters import record_status_change, get_status_counts
+from exports import iter_application_records, EXPORT_FORMATS
+from bundles import bundle_documents, generate_zip
+from datetime import datetime, timedelta
+from events import publish_event
+from document_cache import cached_file, cache_file, send_document
+from download_tokens import serve_document
+from dossier import dossier_application, dossier_documents, get_dossier
+from duplicates import find_duplicates
+from work_queue import claim_batch, acquire_lease, release_lease, claimed_applications, queue_depth
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
 
 agency_bp = Blueprint('agency', __name__)
 
+@write_transaction()
+def record_status_update(application, status, comment, notification_title, notification_message):
+    """Save a status change, its history entry and the citizen's notification in one transaction"""
+    record_status_change(application.document_type, application.status, status)
+    application.status = status
+    # The review is done; the application leaves this reviewer's queue
+    application.claimed_by = None
+    application.lease_expires_at = None
+    
+    status_update = StatusUpdate(
+        application_id=application.id,
+        status=status,
+        comment=comment,
+        updated_by=current_user.id
+    )
+    
+    # Create notification for the citizen
+    notification = Notification(
+        user_id=application.user_id,
+        title=notification_title,
+        message=notification_message,
+        is_read=False
+    )
+    
+    db.session.add(status_update)
+    db.session.add(notification)
+
+def generated_form_key(application, variant):
+    """Document cache key of a generated application form; any change to the application yields a new one"""
+    version = application.updated_at.isoformat() if application.updated_at else ''
+    return f"generated-form:{variant}:{application.id}:{version}:{application.status}"
+
 @agency_bp.route('/dashboard')
 @login_required
+@read_only
 def dashboard():
     if current_user.role != 'agency':
         flash('Access denied', 'danger')
@@ -24,7 +71,8 @@ def dashboard():
     applications = Application.query.filter_by(status=status).order_by(Application.created_at.desc()).all()
     return render_template('agency/review-applications.html', 
                          applications=applications,
-                         current_status=status)
+                         current_status=status,
+                         status_counts=get_status_counts())
 
 @agency_bp.route('/update-status/<int:application_id>', methods=['GET', 'POST'])
 @login_required
@@ -40,31 +88,28 @@ def update_status(application_id):
         flash('This application has been finalized and cannot be updated further', 'warning')
         return redirect(url_for('agency.review_applications', status=application.status))
     
+    # Take or renew the lease, so no other reviewer works on this application meanwhile
+    if not acquire_lease(application.id, current_user.id):
+        holder = User.query.get(application.claimed_by)
+        flash(f'{holder.username if holder else "Another reviewer"} is reviewing this application until '
+              f'{application.lease_expires_at.strftime("%H:%M")} UTC', 'warning')
+        return redirect(url_for('agency.work_queue'))
+    
     form = UpdateStatusForm()
+    if request.method == 'GET':
+        form.version.data = application.version
     
     if form.validate_on_submit():
-        application.status = form.status.data
-        
-        status_update = StatusUpdate(
-            application_id=application.id,
-            status=form.status.data,
-            comment=form.comment.data,
-            updated_by=current_user.id
-        )
+        # The form must have been filled in against the application as it is now
+        if form.version.data != str(application.version):
+            flash('This application was changed by another reviewer; check its current details and try again', 'warning')
+            return redirect(url_for('agency.update_status', application_id=application.id))
         
         # Get the citizen's email
         citizen = User.query.get(application.user_id)
         notification_title = f"Application Status Updated"
         notification_message = f"Your {application.document_type} application ({application.application_number}) status has been updated to {form.status.data}."
         
-        # Create notification for the citizen
-        notification = Notification(
-            user_id=application.user_id,
-            notification_title=notification_title,
-            message=notification_message,
-            is_read=False
-        )
-        
         # Send email notification
         msg = Message(
             subject=notification_title,
@@ -86,13 +131,28 @@ Dastaavej Team
         
         # Inside the update_status function, update the try-except block:
         try:
-            db.session.add(status_update)
-            db.session.add(notification)
-            db.session.commit()
+            record_status_update(application, form.status.data, form.comment.data,
+                                 notification_title, notification_message)
+            
+            # Push the change to the citizen's open pages once it is committed
+            publish_event(application.user_id, 'status', {
+                'application_id': application.id,
+                'application_number': application.application_number,
+                'status': application.status,
+            })
+            publish_event(application.user_id, 'notification', {
+                'title': notification_title,
+                'message': notification_message,
+            })
             
             # Send email notification
             mail.send(msg)
             flash('Application status updated successfully', 'success')
+        except StaleDataError:
+            # Another reviewer's update was committed between our read and write
+            db.session.rollback()
+            flash('This application was changed by another reviewer; check its current details and try again', 'warning')
+            return redirect(url_for('agency.update_status', application_id=application_id))
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating status: {str(e)}', 'danger')  # Include error details
@@ -106,25 +166,185 @@ Dastaavej Team
     # Get status updates
     status_updates = StatusUpdate.query.filter_by(application_id=application_id).order_by(StatusUpdate.updated_at.desc()).all()
     
+    # Other applications using the same Aadhaar number, phone or photo
+    duplicates = find_duplicates(application)
+    
     return render_template('agency/update-status.html', 
                          application=application,
                          form=form,
                          status_updates=status_updates,
-                         documents=documents)
+                         documents=documents,
+                         duplicates=duplicates)
 
 
 @agency_bp.route('/review-applications')
 @agency_bp.route('/review-applications/<status>')
 @login_required
+@read_only
 def review_applications(status='pending'):
     if current_user.role != 'agency':
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    applications = Application.query.filter_by(status=status).order_by(Application.created_at.desc()).all()
+    applications = (Application.query.filter_by(status=status)
+                    .options(joinedload(Application.reviewer))
+                    .order_by(Application.created_at.desc()).all())
     return render_template('agency/review-applications.html', 
                          applications=applications,
-                         current_status=status)
+                         current_status=status,
+                         status_counts=get_status_counts(),
+                         now=datetime.utcnow())
+
+@agency_bp.route('/work-queue')
+@login_required
+def work_queue():
+    """Applications leased to the current reviewer"""
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    return render_template('agency/work-queue.html',
+                         applications=claimed_applications(current_user.id),
+                         unclaimed=queue_depth(),
+                         batch_size=current_app.config.get('REVIEW_BATCH_SIZE', 10),
+                         lease_minutes=current_app.config.get('REVIEW_LEASE_SECONDS', 900) // 60)
+
+@agency_bp.route('/work-queue/claim', methods=['POST'])
+@login_required
+def claim_applications():
+    """Lease the next batch of unclaimed applications to the current reviewer"""
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    claimed = claim_batch(current_user.id)
+    if claimed:
+        flash(f'{len(claimed)} application(s) added to your queue', 'success')
+    else:
+        flash('No more applications to claim', 'info')
+    return redirect(url_for('agency.work_queue'))
+
+@agency_bp.route('/work-queue/release/<int:application_id>', methods=['POST'])
+@login_required
+def release_application(application_id):
+    """Return an application to the shared queue"""
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    if release_lease(application_id, current_user.id):
+        flash('Application returned to the queue', 'info')
+    return redirect(url_for('agency.work_queue'))
+
+@agency_bp.route('/export/applications.<export_format>')
+@login_required
+@read_only
+def export_applications(export_format):
+    """Stream all matching applications as CSV or NDJSON for reporting"""
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    if export_format not in EXPORT_FORMATS:
+        abort(404)
+    
+    generate, mimetype = EXPORT_FORMATS[export_format]
+    records = iter_application_records(status=request.args.get('status'),
+                                       document_type=request.args.get('document_type'))
+    filename = f"applications-{time.strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    
+    # Rows are encoded and sent as they are read, so the whole export never sits in memory
+    return Response(stream_with_context(generate(records)),
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             'X-Accel-Buffering': 'no'})
+
+def bundle_response(application_ids, filename):
+    """Stream a ZIP of every document attached to the given applications"""
+    documents = bundle_documents(application_ids)
+    if not documents:
+        flash('No documents found for the selected applications', 'warning')
+        return redirect(request.referrer or url_for('agency.review_applications'))
+    
+    workers = current_app.config.get('BUNDLE_DOWNLOAD_WORKERS', 8)
+    return Response(stream_with_context(generate_zip(documents, max_workers=workers)),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             'X-Accel-Buffering': 'no'})
+
+@agency_bp.route('/application/<int:application_id>/documents.zip')
+@login_required
+@read_only
+def download_application_bundle(application_id):
+    """Download all documents of one application as a ZIP"""
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    application = Application.query.get_or_404(application_id)
+    return bundle_response([application.id], f"{application.application_number}.zip")
+
+@agency_bp.route('/application/<int:application_id>/dossier.pdf')
+@login_required
+@read_only
+def view_dossier(application_id):
+    """One bookmarked PDF with the application form followed by every uploaded document"""
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    application = Application.query.get_or_404(application_id)
+    try:
+        cached_path = get_dossier(current_app._get_current_object(),
+                                  dossier_application(application),
+                                  dossier_documents(application.id))
+    except Exception as e:
+        current_app.logger.error(f"Error building dossier for {application.application_number}: {str(e)}")
+        flash('Error building the application dossier', 'danger')
+        return redirect(url_for('agency.application_details', application_id=application_id))
+    return send_document(cached_path, mimetype='application/pdf',
+                         download_name=f"{application.application_number}_dossier.pdf")
+
+@agency_bp.route('/documents.zip')
+@login_required
+@read_only
+def download_bundle():
+    """Download the documents of several applications as one ZIP
+
+    Select applications with repeated ``application_id`` parameters, or with
+    ``status`` and an optional ``date`` (YYYY-MM-DD) of last update.
+    """
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    query = db.session.query(Application.id)
+    application_ids = request.args.getlist('application_id', type=int)
+    status = request.args.get('status')
+    day = request.args.get('date')
+    
+    if application_ids:
+        query = query.filter(Application.id.in_(application_ids))
+    elif status:
+        query = query.filter(Application.status == status)
+        if day:
+            try:
+                start = datetime.strptime(day, '%Y-%m-%d')
+            except ValueError:
+                abort(400)
+            query = query.filter(Application.updated_at >= start,
+                                 Application.updated_at < start + timedelta(days=1))
+    else:
+        abort(400)
+    
+    limit = current_app.config.get('BUNDLE_MAX_APPLICATIONS', 500)
+    ids = [row.id for row in query.order_by(Application.id).limit(limit + 1)]
+    if len(ids) > limit:
+        flash(f'Too many applications selected; bundles are limited to {limit}', 'warning')
+        return redirect(request.referrer or url_for('agency.review_applications'))
+    
+    filename = f"{status or 'applications'}-{day or time.strftime('%Y%m%d')}.zip".replace(' ', '-')
+    return bundle_response(ids, filename)
 
 @agency_bp.route('/view-application/<int:application_id>')
 @login_required
@@ -148,16 +368,7 @@ def view_application_form(application_id):
         # Check if it's a Google Drive ID
         if len(application_form.file_path) > 25 and not os.path.exists(application_form.file_path):
             try:
-                # Create a temporary file for viewing
-                temp_dir = os.path.join(current_app.root_path, 'uploads', 'temp')
-                os.makedirs(temp_dir, exist_ok=True)
-                
-                # Create a unique filename with timestamp
-                timestamp = int(time.time())
-                temp_pdf_path = os.path.join(temp_dir, f"temp_application_{application_id}_{timestamp}.pdf")
-                
-                # Download from Google Drive
-                from drive_api import download_from_drive, get_drive_preview_url
+                from drive_api import get_drive_preview_url
                 
                 # Get the preview URL from Google Drive
                 preview_url = get_drive_preview_url(application_form.file_path)
@@ -165,12 +376,12 @@ def view_application_form(application_id):
                     # Redirect to Google Drive preview
                     return redirect(preview_url)
                 else:
-                    # Fallback to downloading and displaying locally
-                    download_from_drive(application_form.file_path, temp_pdf_path)
-                    return send_file(
-                        temp_pdf_path,
-                        mimetype='application/pdf'
-                    )
+                    # Fallback to the locally cached copy
+                    response = serve_document(application_form.file_path, mimetype='application/pdf')
+                    if not response:
+                        flash('Failed to download application form', 'danger')
+                        return redirect(url_for('agency.dashboard'))
+                    return response
             except Exception as e:
                 flash(f'Error viewing application form: {str(e)}', 'danger')
                 return redirect(url_for('agency.dashboard'))
@@ -185,6 +396,12 @@ def view_application_form(application_id):
                 flash(f'Error viewing application form: {str(e)}', 'danger')
                 return redirect(url_for('agency.dashboard'))
     else:
+        download_name = f"{application.document_type}_application_{application.application_number}.pdf"
+        cache_key = generated_form_key(application, 'view')
+        cached_path = cached_file(cache_key)
+        if cached_path:
+            return send_document(cached_path, mimetype='application/pdf', download_name=download_name)
+        
         # Generate the application form on-the-fly
         # Get application data
         application_data = {
@@ -244,13 +461,13 @@ def view_application_form(application_id):
                 temp_dir
             )
             
-            # Return the PDF file as a download
-            return send_file(
-                pdf_path,
-                mimetype='application/pdf',
-                as_attachment=False,
-                download_name=f"{application.document_type}_application_{application.application_number}.pdf"
-            )
+            if not pdf_path:
+                flash('Error generating application form', 'danger')
+                return redirect(url_for('agency.application_details', application_id=application_id))
+            
+            # Keep the PDF for later views of this application version and let the proxy serve it
+            cached_path = cache_file(cache_key, pdf_path)
+            return send_document(cached_path, mimetype='application/pdf', download_name=download_name)
 
 @agency_bp.route('/download-application/<int:application_id>')
 @login_required
@@ -271,30 +488,28 @@ def download_application_form(application_id):
     
     if application_form:
         try:
-            # Create a temporary file
-            temp_dir = tempfile.mkdtemp()
-            temp_file = os.path.join(temp_dir, f"application_{application_id}.pdf")
-            
-            # Download the file from Google Drive
-            from drive_api import download_from_drive
-            download_success = download_from_drive(application_form.file_path, temp_file)
-            
-            if not download_success:
-                flash('Failed to download application form', 'danger')
-                return redirect(url_for('agency.application_details', application_id=application_id))
-            
-            # Send the file to the user
-            return send_file(
-                temp_file,
+            # Send the user to a signed link for the cached copy
+            response = serve_document(
+                application_form.file_path,
+                mimetype='application/pdf',
                 as_attachment=True,
-                download_name=f"{application.application_number}_application.pdf",
-                mimetype='application/pdf'
+                download_name=f"{application.application_number}_application.pdf"
             )
+            if not response:
+                flash('Failed to download application form', 'danger')
+                return redirect(url_for('agency.application_details', application_id=application_id))
+            return response
         except Exception as e:
             current_app.logger.error(f"Error downloading application form: {str(e)}")
             flash('Error downloading application form', 'danger')
             return redirect(url_for('agency.application_details', application_id=application_id))
     else:
+        download_name = f"{application.document_type}_application_{application.application_number}.pdf"
+        cache_key = generated_form_key(application, 'download')
+        cached_path = cached_file(cache_key)
+        if cached_path:
+            return send_document(cached_path, mimetype='application/pdf', as_attachment=True, download_name=download_name)
+        
         # Generate the application form on-the-fly
         # Get application data
         application_data = {
@@ -333,13 +548,13 @@ def download_application_form(application_id):
                 temp_dir
             )
             
+            if not pdf_path:
+                flash('Error generating application form', 'danger')
+                return redirect(url_for('agency.application_details', application_id=application_id))
+            
             # Return the PDF file as a download
-            return send_file(
-                pdf_path,
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name=f"{application.document_type}_application_{application.application_number}.pdf"
-            )
+            cached_path = cache_file(cache_key, pdf_path)
+            return send_document(cached_path, mimetype='application/pdf', as_attachment=True, download_name=download_name)
 
 @agency_bp.route('/view-document/<int:document_id>')
 @login_required
@@ -354,9 +569,8 @@ def view_document(document_id):
     
     # Check if it's an image type document
     is_image = document.document_type in ['photo', 'signature'] or (
-        hasattr(document, 'file_name') and 
-        document.file_name and 
-        document.file_name.lower().endswith(('.jpg', '.jpeg', '.png'))
+        document.filename and 
+        document.filename.lower().endswith(('.jpg', '.jpeg', '.png'))
     )
     
     try:
@@ -368,13 +582,6 @@ def view_document(document_id):
                 return redirect(direct_url)
         
         # For non-images or if direct URL fails, use the existing approach
-        # Create a temporary file for viewing
-        temp_dir = os.path.join(current_app.root_path, 'uploads', 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Create a unique filename with timestamp
-        timestamp = int(time.time())
-        
         # Determine file extension based on document type
         if is_image:
             # For photos, use jpg extension
@@ -384,59 +591,37 @@ def view_document(document_id):
             elif document.document_type == 'signature':
                 file_ext = 'png'
             # Otherwise try to get extension from filename or default to jpg
-            elif hasattr(document, 'file_name') and document.file_name and '.' in document.file_name:
-                file_ext = document.file_name.rsplit('.', 1)[1].lower()
+            elif document.filename and '.' in document.filename:
+                file_ext = document.filename.rsplit('.', 1)[1].lower()
             else:
                 file_ext = 'jpg'
         else:
             file_ext = 'pdf'
-            
-        temp_file_path = os.path.join(temp_dir, f"temp_doc_{document_id}_{timestamp}.{file_ext}")
-        
-        # Download from Google Drive
-        from drive_api import download_from_drive
-        download_success = download_from_drive(document.file_path, temp_file_path)
         
-        if download_success:
-            # For images, serve the file directly
-            if is_image:
-                # Determine the correct MIME type based on extension
-                if file_ext.lower() == 'png':
-                    mimetype = 'image/png'
-                elif file_ext.lower() in ['jpg', 'jpeg']:
-                    mimetype = 'image/jpeg'
-                else:
-                    mimetype = f'image/{file_ext}'
-                    
-                # Log the file path and mimetype for debugging
-                current_app.logger.info(f"Serving image: {temp_file_path} with mimetype: {mimetype}")
-                
-                return send_file(
-                    temp_file_path,
-                    mimetype=mimetype,
-                    as_attachment=False
-                )
+        if is_image:
+            # Determine the correct MIME type based on extension
+            if file_ext.lower() == 'png':
+                mimetype = 'image/png'
+            elif file_ext.lower() in ['jpg', 'jpeg']:
+                mimetype = 'image/jpeg'
             else:
-                # For PDFs and other documents, try to use Google Drive preview
-                from drive_api import get_drive_preview_url
-                preview_url = get_drive_preview_url(document.file_path)
-                
-                if preview_url:
-                    # Redirect to Google Drive preview
-                    return redirect(preview_url)
-                else:
-                    # Fallback to local file
-                    mimetype = 'application/pdf'
-                    if hasattr(document, 'mime_type') and document.mime_type:
-                        mimetype = document.mime_type
-                    
-                    return send_file(
-                        temp_file_path,
-                        mimetype=mimetype
-                    )
+                mimetype = f'image/{file_ext}'
         else:
+            # For PDFs and other documents, try to use Google Drive preview
+            from drive_api import get_drive_preview_url
+            preview_url = get_drive_preview_url(document.file_path)
+            
+            if preview_url:
+                # Redirect to Google Drive preview
+                return redirect(preview_url)
+            mimetype = document.mime_type or 'application/pdf'
+        
+        # Fallback to the locally cached copy behind a signed link
+        response = serve_document(document.file_path, mimetype=mimetype)
+        if not response:
             flash('Failed to download document', 'danger')
             return redirect(url_for('agency.application_details', application_id=document.application_id))
+        return response
     except Exception as e:
         current_app.logger.error(f"Error viewing document: {str(e)}")
         flash(f'Error viewing document: {str(e)}', 'danger')
@@ -445,6 +630,7 @@ def view_document(document_id):
 
 @agency_bp.route('/application-details/<int:application_id>')
 @login_required
+@read_only
 def application_details(application_id):
     """View application details"""
     if current_user.role != 'agency':
@@ -11,6 +11,10 @@ from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import datetime
 from itsdangerous import URLSafeTimedSerializer
 from flask_mail import Message
+from token_store import get_token_store
+from rate_limit import rate_limit
+from db_engine import write_transaction
+import secrets
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -24,7 +28,28 @@ class LoginForm(FlaskForm):
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+# Password hashing is slow on purpose; callers hash before the write transaction
+@write_transaction()
+def create_user(password_hash, **fields):
+    """Insert a user whose password is already hashed"""
+    user = User(**fields)
+    user.password_hash = password_hash
+    db.session.add(user)
+    return user
+
+@write_transaction()
+def delete_user(user):
+    db.session.delete(user)
+
+@write_transaction()
+def update_user(user, **fields):
+    """Set columns of an existing user, e.g. ``password_hash`` or ``is_verified``"""
+    for name, value in fields.items():
+        setattr(user, name, value)
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('20/minute', keys=('ip',))
+@rate_limit('5/minute', keys=('user',))
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('citizen.dashboard') if current_user.role == 'citizen' else url_for('agency.dashboard'))
@@ -46,6 +71,7 @@ def login():
     return render_template('login.html', form=form)
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
+@rate_limit('10/hour', keys=('ip', 'email'))
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
@@ -79,10 +105,8 @@ def register():
         
         # For agency officials, create unverified account and send verification email
         if role == 'agency':
-            user = User(username=username, email=email, role=role, government_id=government_id, is_verified=False)
-            user.set_password(password)
-            db.session.add(user)
-            db.session.commit()
+            user = create_user(generate_password_hash(password), username=username, email=email, role=role,
+                               government_id=government_id, is_verified=False)
             
             # Generate verification token
             verification_token = generate_verification_token()
@@ -93,7 +117,7 @@ def register():
                 'user_id': user.id,
                 'timestamp': datetime.now().timestamp()
             }
-            current_app.config['VERIFICATION_CACHE'][cache_key] = verification_data
+            get_token_store().set(cache_key, verification_data, current_app.config['AGENCY_VERIFICATION_TTL'])
             
             # Send verification email to admin
             app = current_app
@@ -101,24 +125,27 @@ def register():
                 flash('Registration pending admin verification. You will be notified via email when approved.', 'info')
                 return redirect(url_for('auth.login'))
             else:
-                db.session.delete(user)
-                db.session.commit()
+                delete_user(user)
                 flash('Failed to process registration. Please try again.', 'danger')
         
         # For citizens, require OTP verification
         otp = generate_otp()
         app = current_app
         if send_otp_email(app, email, otp):
-            # Store registration data in session
-            session['registration_data'] = {
+            # Keep the pending registration server-side; the session only carries its id
+            registration_id = secrets.token_urlsafe(16)
+            registration_data = {
                 'username': username,
                 'email': email,
-                'password': password,
+                'password_hash': generate_password_hash(password),
                 'role': role,
                 'government_id': government_id,
                 'otp': otp,
                 'otp_time': datetime.now().timestamp()
             }
+            get_token_store().set(f'registration_{registration_id}', registration_data,
+                                  current_app.config['REGISTRATION_TTL'])
+            session['registration_id'] = registration_id
             flash('OTP sent to your email. Please verify to complete registration.', 'info')
             return redirect(url_for('auth.verify_otp'))
         else:
@@ -133,38 +160,50 @@ def register():
             
     return render_template('register.html', form=form)
 
+def get_pending_registration():
+    """Get the pending registration referenced by the session, if any"""
+    registration_id = session.get('registration_id')
+    if not registration_id:
+        return None, None
+    cache_key = f'registration_{registration_id}'
+    return cache_key, get_token_store().get(cache_key)
+
 @auth_bp.route('/verify-otp', methods=['GET', 'POST'])
 def verify_otp():
-    if current_user.is_authenticated or 'registration_data' not in session:
+    cache_key, registration_data = get_pending_registration()
+    if current_user.is_authenticated or not registration_data:
+        session.pop('registration_id', None)
         return redirect(url_for('main.index'))
     
     form = OTPVerificationForm()
     if form.validate_on_submit():
-        registration_data = session['registration_data']
         user_otp = form.otp.data
         stored_otp = registration_data['otp']
         otp_time = registration_data['otp_time']
         
         # Check if OTP is expired (10 minutes)
-        if datetime.now().timestamp() - otp_time > 600:
+        if datetime.now().timestamp() - otp_time > current_app.config['OTP_TTL']:
             flash('OTP has expired. Please request a new one.', 'danger')
             return redirect(url_for('auth.resend_otp'))
         
         # Verify OTP
         if user_otp == stored_otp:
+            # Claim the registration atomically so a double submit cannot create two users
+            if get_token_store().pop(cache_key) is None:
+                session.pop('registration_id', None)
+                return redirect(url_for('main.index'))
+            
             # Create user
-            user = User(
+            create_user(
+                registration_data['password_hash'],
                 username=registration_data['username'],
                 email=registration_data['email'],
                 role=registration_data['role'],
                 government_id=registration_data.get('government_id', '')
             )
-            user.set_password(registration_data['password'])
-            db.session.add(user)
-            db.session.commit()
             
             # Clear session data
-            session.pop('registration_data', None)
+            session.pop('registration_id', None)
             
             flash('Account created successfully! You can now log in.', 'success')
             return redirect(url_for('auth.login'))
@@ -173,22 +212,29 @@ def verify_otp():
     
     return render_template('verify_otp.html', form=form)
 
+def pending_registration_email():
+    """Rate limit key for OTP resends: the email of the pending registration"""
+    registration_data = get_pending_registration()[1]
+    return registration_data['email'].lower() if registration_data else None
+
 @auth_bp.route('/resend-otp', methods=['GET'])
+@rate_limit('5/hour', keys=('ip', pending_registration_email), methods=None)
 def resend_otp():
-    if current_user.is_authenticated or 'registration_data' not in session:
+    cache_key, registration_data = get_pending_registration()
+    if current_user.is_authenticated or not registration_data:
+        session.pop('registration_id', None)
         return redirect(url_for('main.index'))
     
-    registration_data = session['registration_data']
     email = registration_data['email']
     
     # Generate new OTP
     new_otp = generate_otp()
     app = current_app
     if send_otp_email(app, email, new_otp):
-        # Update session data
+        # Update the pending registration
         registration_data['otp'] = new_otp
         registration_data['otp_time'] = datetime.now().timestamp()
-        session['registration_data'] = registration_data
+        get_token_store().set(cache_key, registration_data, current_app.config['REGISTRATION_TTL'])
         
         flash('New OTP sent to your email.', 'info')
     else:
@@ -209,6 +255,8 @@ def verify_reset_token(token, expiration=3600):
         return None
 
 @auth_bp.route('/forgot-password', methods=['GET', 'POST'])
+@rate_limit('20/hour', keys=('ip',))
+@rate_limit('3/hour', keys=('email',))
 def forgot_password():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
@@ -312,8 +360,7 @@ def reset_password(token):
     
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        user.set_password(form.password.data)
-        db.session.commit()
+        update_user(user, password_hash=generate_password_hash(form.password.data))
         flash('Your password has been updated! You can now log in with your new password.', 'success')
         return redirect(url_for('auth.login'))
         
@@ -329,7 +376,8 @@ def logout():
 @auth_bp.route('/verify-agency/<token>')
 def verify_agency(token):
     cache_key = f'agency_verification_{token}'
-    verification_data = current_app.config['VERIFICATION_CACHE'].get(cache_key)
+    # Pop up front so the same link cannot be used twice
+    verification_data = get_token_store().pop(cache_key)
     
     if not verification_data:
         flash('Invalid or expired verification link.', 'danger')
@@ -340,11 +388,7 @@ def verify_agency(token):
         flash('User not found.', 'danger')
         return redirect(url_for('main.index'))
     
-    user.is_verified = True
-    db.session.commit()
-    
-    # Remove verification data from cache
-    current_app.config['VERIFICATION_CACHE'].pop(cache_key, None)
+    update_user(user, is_verified=True)
     
     # Send confirmation email to the agency official
     app = current_app
@@ -354,6 +398,8 @@ def verify_agency(token):
     return redirect(url_for('main.index'))
 
 @auth_bp.route('/send-otp', methods=['POST'])
+@rate_limit('10/hour', keys=('ip',))
+@rate_limit('5/hour', keys=('email',))
 def send_otp():
     email = request.form.get('email')
     if email:
@@ -380,19 +426,16 @@ def register_agency():
         flash('All fields are required', 'danger')
         return redirect(url_for('auth.register'))
     
-    # Create unverified agency user
-    user = User(
-        username=username,
-        email=email,
-        role='agency',
-        government_id=government_id,
-        is_verified=False
-    )
-    user.set_password(password)
-    
     try:
-        db.session.add(user)
-        db.session.commit()
+        # Create unverified agency user
+        user = create_user(
+            generate_password_hash(password),
+            username=username,
+            email=email,
+            role='agency',
+            government_id=government_id,
+            is_verified=False
+        )
         
         # Generate verification token and send email
         verification_token = generate_verification_token()
@@ -403,7 +446,7 @@ def register_agency():
             'user_id': user.id,
             'timestamp': datetime.now().timestamp()
         }
-        current_app.config['VERIFICATION_CACHE'][cache_key] = verification_data
+        get_token_store().set(cache_key, verification_data, current_app.config['AGENCY_VERIFICATION_TTL'])
         
         # Send verification email
         app = current_app
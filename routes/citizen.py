@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file, jsonify, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file, jsonify, session, Response
 import os
 import uuid
 from datetime import datetime
@@ -6,7 +6,9 @@ import time
 import tempfile
 from werkzeug.utils import secure_filename
 from models import User, Application, Document, StatusUpdate, Notification
-from extensions import db
+from db_engine import write_transaction
+from db_routing import read_only
+from events import get_event_broker, event_stream
 from forms import (
     UploadDocumentForm, PassportApplicationForm, PassportDocumentForm, 
     PanCardApplicationForm, PanCardDocumentForm
@@ -20,6 +22,7 @@ citizen_bp = Blueprint('citizen', __name__)
 
 @citizen_bp.route('/dashboard')
 @login_required
+@read_only
 def dashboard():
     """Display the citizen dashboard"""
     if not check_citizen_access():
@@ -44,6 +47,7 @@ def dashboard():
 
 @citizen_bp.route('/application-status/<int:application_id>')
 @login_required
+@read_only
 def application_status(application_id):
     if not check_citizen_access():
         return redirect(url_for('main.index'))
@@ -70,19 +74,21 @@ register_document_routes(citizen_bp)
 from .citizen_applications import register_application_routes
 register_application_routes(citizen_bp)
 
+@write_transaction()
+def mark_notifications_read(user_id):
+    """Mark all of a user's notifications as read with a single UPDATE"""
+    Notification.query.filter_by(user_id=user_id, is_read=False).update({'is_read': True})
+
 @citizen_bp.route('/notifications')
 @login_required
 def notifications():
     if not check_citizen_access():
         return redirect(url_for('main.index'))
     
-    notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).all()
-    
     # Mark all notifications as read
-    for notification in notifications:
-        if not notification.is_read:
-            notification.is_read = True
-            db.session.commit()
+    mark_notifications_read(current_user.id)
+    
+    notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).all()
     
     return render_template('citizen/notifications.html', notifications=notifications)
 
@@ -90,6 +96,7 @@ def notifications():
 # Add the missing view_applications route
 @citizen_bp.route('/view-applications')
 @login_required
+@read_only
 def view_applications():
     """View all applications for the current user"""
     if not check_citizen_access():
@@ -98,4 +105,36 @@ def view_applications():
     # Get all applications for the current user
     applications = Application.query.filter_by(user_id=current_user.id).order_by(Application.created_at.desc()).all()
     
-    return render_template('citizen/view_applications.html', applications=applications)
\ No newline at end of file
+    return render_template('citizen/view_applications.html', applications=applications)
+
+
+@citizen_bp.route('/events')
+@login_required
+def events():
+    """Server-Sent Events stream of status changes and notifications for the current user"""
+    if current_user.role != 'citizen':
+        return Response(status=403)
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    broker = get_event_broker()
+    config = current_app.config
+    
+    # 204 tells EventSource not to reconnect: this worker serves no streams
+    if not broker.enabled:
+        return Response(status=204)
+    
+    # Each stream holds a worker thread; past the cap, clients retry later instead
+    if broker.is_full():
+        return Response(status=503, headers={'Retry-After': '30'})
+    
+    # The generator runs after this request's context is gone, so it must not touch db.session
+    stream = event_stream(broker, current_user.id, last_event_id,
+                          keepalive=config['EVENTS_KEEPALIVE'],
+                          max_seconds=config['EVENTS_MAX_STREAM_SECONDS'])
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -6,12 +6,12 @@ import tempfile
 import io
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from models import Application, Document
 from extensions import db
 from forms import PassportApplicationForm, PassportDocumentForm, PanCardApplicationForm, PanCardDocumentForm
 from drive_api import upload_to_drive
 from utils import generate_application_pdf
-from routes.citizen_helpers import check_citizen_access, allowed_file, upload_document_to_drive
+from routes.citizen_helpers import (check_citizen_access, allowed_file, upload_document_to_drive, form_error_message,
+                                   hash_photo, save_application)
 
 def register_application_routes(bp):
     
@@ -98,7 +98,8 @@ def register_application_routes(bp):
                 # Parse date string back to date object
                 dob = datetime.strptime(application_data['date_of_birth'], '%Y-%m-%d')
                 
-                new_application = Application(
+                # Written with its documents once every file is in storage
+                application_fields = dict(
                     user_id=current_user.id,
                     document_type='passport',
                     application_number=application_number,
@@ -122,9 +123,7 @@ def register_application_routes(bp):
                     next_of_kin_relation=application_data['next_of_kin_relation'],
                     next_of_kin_phone=application_data['next_of_kin_phone']
                 )
-                
-                db.session.add(new_application)
-                db.session.flush()
+                documents = []
                 
                 # Create a temporary directory for file processing
                 with tempfile.TemporaryDirectory() as temp_dir:
@@ -151,16 +150,9 @@ def register_application_routes(bp):
                         pdf_drive_id = upload_to_drive(pdf_path, f"{application_number}_application_form.pdf", app)
                         
                         # Add application form as a document
-                        application_form_doc = Document(
-                            application_id=new_application.id,
-                            document_type='application_form',
-                            file_path=pdf_drive_id,
-                            filename=f"{application_number}_application_form.pdf"
-                        )
-                        db.session.add(application_form_doc)
-                        
-                        # Add logging here after the document is created
-                        app.logger.info(f"Created application form document with ID: {application_form_doc.id} and file path: {pdf_drive_id}")
+                        documents.append(('application_form', pdf_drive_id,
+                                          f"{application_number}_application_form.pdf", 'application/pdf'))
+                        app.logger.info(f"Uploaded application form with file path: {pdf_drive_id}")
                     
                     # Continue with existing file upload code...
                     files = {
@@ -183,24 +175,20 @@ def register_application_routes(bp):
                                 mime_type = None
                             
                             if drive_file_id:
-                                new_document = Document(
-                                    application_id=new_application.id,
-                                    document_type=field_name,
-                                    file_path=drive_file_id,
-                                    filename=secure_filename(file.filename),
-                                    mime_type=mime_type
-                                )
-                                db.session.add(new_document)
-                                app.logger.info(f"Created {field_name} document with ID: {new_document.id} and MIME type: {mime_type}")
+                                documents.append((field_name, drive_file_id, secure_filename(file.filename), mime_type))
+                                app.logger.info(f"Uploaded {field_name} document with MIME type: {mime_type}")
                             else:
                                 app.logger.error(f"Failed to upload {field_name}")
                     
+                    # Fingerprint the photo for reviewers' duplicate checks
+                    photo_hash = hash_photo(photo_path, application_number)
+                
+                # Save the application, its documents and fingerprints in one transaction
+                save_application(application_fields, documents, photo_hash)
+                
                 # Clear session data after successful submission
                 session.pop('passport_application_data', None)
                 
-                # Make sure to commit the session before returning
-                db.session.commit()
-                
                 return jsonify({
                     'success': True,
                     'message': 'Documents uploaded successfully',
@@ -215,7 +203,7 @@ def register_application_routes(bp):
         if request.method == 'GET':
             return render_template('citizen/upload-passport.html', form=form)
         
-        return jsonify({'success': False, 'error': 'Invalid form data'}), 400
+        return jsonify({'success': False, 'error': form_error_message(form), 'errors': form.errors}), 400
 
     @bp.route('/upload-pancard', methods=['GET', 'POST'])
     @login_required
@@ -241,8 +229,8 @@ def register_application_routes(bp):
                 # Parse date string back to date object
                 dob = datetime.strptime(application_data['date_of_birth'], '%Y-%m-%d')
                 
-                # Create the application object first
-                new_application = Application(
+                # Written with its documents once every file is in storage
+                application_fields = dict(
                     user_id=current_user.id,
                     document_type='pancard',
                     application_number=application_number,
@@ -264,10 +252,7 @@ def register_application_routes(bp):
                     father_name=application_data.get('father_name', ''),
                     aadhaar_number=application_data.get('aadhaar_number', '')
                 )
-                
-                db.session.add(new_application)
-                db.session.flush()
-                app.logger.info(f"Created new application with ID: {new_application.id}")
+                documents = []
                 
                 # Create a temporary directory for file processing
                 with tempfile.TemporaryDirectory() as temp_dir:
@@ -309,14 +294,8 @@ def register_application_routes(bp):
                     app.logger.info(f"Uploaded PDF to Drive with ID: {pdf_drive_id}")
                     
                     # Add application form as a document
-                    application_form_doc = Document(
-                        application_id=new_application.id,
-                        document_type='application_form',
-                        file_path=pdf_drive_id,
-                        filename=f"{application_number}_application_form.pdf"
-                    )
-                    db.session.add(application_form_doc)
-                    app.logger.info(f"Created application form document with ID: {application_form_doc.id}")
+                    documents.append(('application_form', pdf_drive_id,
+                                      f"{application_number}_application_form.pdf", 'application/pdf'))
                     
                     # Process other document uploads
                     files = {
@@ -364,16 +343,9 @@ def register_application_routes(bp):
                                     drive_file_id = result
                                     mime_type = None
                                 
-                                # Create document record in database
-                                new_document = Document(
-                                    application_id=new_application.id,
-                                    document_type=field_name,
-                                    file_path=drive_file_id,
-                                    filename=secure_filename(file.filename if file.filename else ''),
-                                    mime_type=mime_type
-                                )
-                                db.session.add(new_document)
-                                app.logger.info(f"Created {field_name} document with ID: {new_document.id}")
+                                # Document record, written with the application below
+                                documents.append((field_name, drive_file_id,
+                                                  secure_filename(file.filename if file.filename else ''), mime_type))
                                 successful_uploads += 1
                             except Exception as e:
                                 app.logger.error(f"Error processing {field_name}: {str(e)}")
@@ -383,11 +355,15 @@ def register_application_routes(bp):
                     if successful_uploads < required_uploads:
                         app.logger.warning(f"Not all documents were uploaded successfully: {successful_uploads}/{required_uploads}")
                     
+                    # Fingerprint the photo for reviewers' duplicate checks
+                    photo_hash = hash_photo(photo_path, application_number)
+                    
+                    # Save the application, its documents and fingerprints in one transaction
+                    new_application = save_application(application_fields, documents, photo_hash)
+                    app.logger.info(f"Created new application with ID: {new_application.id}")
+                    
                     # Clear session data after successful submission
                     session.pop('pancard_application_data', None)
-                    
-                    # Commit all changes to the database
-                    db.session.commit()
                     app.logger.info("Successfully completed PAN card application submission")
                     
                     return jsonify({
@@ -405,6 +381,6 @@ def register_application_routes(bp):
         if request.method == 'GET':
             return render_template('citizen/upload-pancard.html', form=form)
         
-        return jsonify({'success': False, 'error': 'Invalid form data'}), 400
+        return jsonify({'success': False, 'error': form_error_message(form), 'errors': form.errors}), 400
     
     return bp
\ No newline at end of file
@@ -1,16 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app, send_file
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app
 from flask_login import login_required, current_user
 import os
 import uuid
 import tempfile
-import time
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from models import Application, Document
 from extensions import db
 from forms import UploadDocumentForm
-from drive_api import download_from_drive, get_drive_preview_url
-from routes.citizen_helpers import check_citizen_access, allowed_file, upload_document_to_drive
+from drive_api import get_drive_preview_url
+from download_tokens import serve_document
+from routes.citizen_helpers import (check_citizen_access, allowed_file, upload_document_to_drive, form_error_message,
+                                   hash_photo, save_application)
 
 def register_document_routes(bp):
     @bp.route('/upload-documents', methods=['GET', 'POST'])
@@ -28,20 +29,6 @@ def register_document_routes(bp):
                 # Generate unique application number
                 application_number = f"{document_type.upper()}-{str(uuid.uuid4())[:8]}"
             
-                new_application = Application(
-                    user_id=current_user.id,
-                    document_type=document_type,
-                    application_number=application_number,
-                    status='pending',
-                    name=current_user.username,
-                    dob=datetime.now(),
-                    gender='not_specified',
-                    address='not_specified'
-                )
-            
-                db.session.add(new_application)
-                db.session.flush()
-            
                 # File Uploads
                 if document_type == 'passport':
                     files = {
@@ -58,21 +45,31 @@ def register_document_routes(bp):
                         'signature': form.pan_signature.data
                     }
                 
-                # Create temp directory for file processing
+                # Hash the photo before the uploads consume its stream
+                photo_hash = hash_photo(files['photo'].stream if files['photo'] else None, application_number)
+            
+                # Store every file first; the database rows are written afterwards in one short transaction
+                documents = []
                 with tempfile.TemporaryDirectory() as temp_dir:
                     for field_name, file in files.items():
                         if file and allowed_file(file.filename):
                             # Upload to Google Drive
-                            drive_file_id = upload_document_to_drive(file, application_number, field_name, temp_dir)
-                            
-                            new_document = Document(
-                                application_id=new_application.id,
-                                document_type=field_name,
-                                file_path=drive_file_id
-                            )
-                            db.session.add(new_document)
+                            result = upload_document_to_drive(file, application_number, field_name, temp_dir)
+                            if not result:
+                                raise ValueError(f"Failed to upload {field_name.replace('_', ' ')}")
+                            drive_file_id, mime_type = result
+                            documents.append((field_name, drive_file_id, secure_filename(file.filename), mime_type))
             
-                db.session.commit()
+                save_application({
+                    'user_id': current_user.id,
+                    'document_type': document_type,
+                    'application_number': application_number,
+                    'status': 'pending',
+                    'name': current_user.username,
+                    'dob': datetime.now(),
+                    'gender': 'not_specified',
+                    'address': 'not_specified'
+                }, documents, photo_hash)
                 
                 return jsonify({
                     'success': True,
@@ -85,7 +82,7 @@ def register_document_routes(bp):
                 return jsonify({'success': False, 'error': str(e)}), 400
 
         if form.errors:
-            return jsonify({'success': False, 'error': 'Invalid form data', 'errors': form.errors}), 400
+            return jsonify({'success': False, 'error': form_error_message(form), 'errors': form.errors}), 400
         
         if request.method == 'GET':
             return render_template('citizen/upload-documents.html', form=form)
@@ -147,24 +144,21 @@ def register_document_routes(bp):
             return redirect(url_for('citizen.application_status', application_id=application_id))
         
         try:
-            # Create a temporary file
-            temp_dir = tempfile.mkdtemp()
             file_extension = 'pdf'  # Default extension
-            if hasattr(document, 'file_name') and document.file_name:
-                file_extension = document.file_name.split('.')[-1]
-                
-            temp_file = os.path.join(temp_dir, f"{doc_type}.{file_extension}")
+            if document.filename and '.' in document.filename:
+                file_extension = document.filename.rsplit('.', 1)[1].lower()
             
-            # Download the file from Google Drive
-            download_from_drive(document.file_path, temp_file)
-            
-            # Send the file to the user
-            return send_file(
-                temp_file,
+            # Access is checked; hand the browser a signed link to the cached copy
+            response = serve_document(
+                document.file_path,
+                mimetype=document.mime_type or 'application/octet-stream',
                 as_attachment=True,
-                download_name=getattr(document, 'file_name', f"{doc_type}.{file_extension}"),
-                mimetype=getattr(document, 'mime_type', 'application/octet-stream')
+                download_name=document.filename or f"{doc_type}.{file_extension}"
             )
+            if not response:
+                flash('Error downloading document', 'danger')
+                return redirect(url_for('citizen.application_status', application_id=application_id))
+            return response
         except Exception as e:
             current_app.logger.error(f"Error downloading document: {str(e)}")
             flash('Error downloading document', 'danger')
@@ -210,14 +204,12 @@ def register_document_routes(bp):
                 if preview_url:
                     return redirect(preview_url)
                 else:
-                    # Fallback to downloading and displaying locally
-                    temp_dir = os.path.join(current_app.root_path, 'uploads', 'temp')
-                    os.makedirs(temp_dir, exist_ok=True)
-                    timestamp = int(time.time())
-                    temp_pdf_path = os.path.join(temp_dir, f"temp_application_{application_id}_{timestamp}.pdf")
-                    current_app.logger.info(f"Downloading to: {temp_pdf_path}")
-                    download_from_drive(application_form.file_path, temp_pdf_path)
-                    return send_file(temp_pdf_path, mimetype='application/pdf')
+                    # Fallback to the locally cached copy
+                    response = serve_document(application_form.file_path, mimetype='application/pdf')
+                    if not response:
+                        flash('Error viewing application form', 'danger')
+                        return redirect(url_for('citizen.dashboard'))
+                    return response
             except Exception as e:
                 current_app.logger.error(f"Error viewing application form: {str(e)}")
                 flash(f'Error viewing application form: {str(e)}', 'danger')
@@ -247,20 +239,16 @@ def register_document_routes(bp):
             return redirect(url_for('citizen.application_status', application_id=application_id))
             
         try:
-            # Create a temporary file
-            temp_dir = tempfile.mkdtemp()
-            temp_file = os.path.join(temp_dir, f"application_{application_id}.pdf")
-            
-            # Download the file from Google Drive
-            download_from_drive(application_form.file_path, temp_file)
-            
-            # Send the file to the user
-            return send_file(
-                temp_file,
+            response = serve_document(
+                application_form.file_path,
+                mimetype='application/pdf',
                 as_attachment=True,
-                download_name=f"{application.application_number}_application.pdf",
-                mimetype='application/pdf'
+                download_name=f"{application.application_number}_application.pdf"
             )
+            if not response:
+                flash('Error downloading application form', 'danger')
+                return redirect(url_for('citizen.application_status', application_id=application_id))
+            return response
         except Exception as e:
             current_app.logger.error(f"Error downloading application form: {str(e)}")
             flash('Error downloading application form', 'danger')
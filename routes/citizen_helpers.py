@@ -4,8 +4,13 @@ import os
 import tempfile
 import uuid
 from werkzeug.utils import secure_filename
-from models import Document
+from models import Application, Document
+from extensions import db
 from drive_api import upload_to_drive, download_from_drive, get_drive_preview_url
+from upload_validation import inspect_upload, UploadRejected
+from db_engine import write_transaction
+from counters import record_new_application
+from duplicates import index_application, perceptual_hash
 
 def check_citizen_access():
     """Check if the current user has citizen access"""
@@ -19,6 +24,11 @@ def allowed_file(filename):
     allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', {'pdf', 'jpg', 'jpeg', 'png'})
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
+def form_error_message(form, default='Invalid form data'):
+    """One line naming each invalid field, for the upload pages that show a single error"""
+    messages = [f"{form[name].label.text}: {errors[0]}" for name, errors in form.errors.items() if errors]
+    return '; '.join(messages) or default
+
 def upload_document_to_drive(file, application_number, field_name, temp_dir=None):
     """Upload a document to Google Drive and return the file ID and mime type"""
     app = current_app
@@ -29,16 +39,12 @@ def upload_document_to_drive(file, application_number, field_name, temp_dir=None
         
     filename = secure_filename(file.filename)
     
-    # Determine MIME type based on file extension
-    mime_type = None
-    if '.' in filename:
-        ext = filename.rsplit('.', 1)[1].lower()
-        if ext == 'pdf':
-            mime_type = 'application/pdf'
-        elif ext in ['jpg', 'jpeg']:
-            mime_type = 'image/jpeg'
-        elif ext == 'png':
-            mime_type = 'image/png'
+    # Record the type the content actually has, and stop bad files before any storage I/O
+    try:
+        mime_type = inspect_upload(file).mime_type
+    except UploadRejected as e:
+        app.logger.error(f"Rejected {field_name} upload {filename}: {e}")
+        return None
     
     # Create a temporary directory if not provided
     created_temp_dir = False
@@ -79,6 +85,35 @@ def upload_document_to_drive(file, application_number, field_name, temp_dir=None
             except Exception as e:
                 app.logger.error(f"Error cleaning up temp files: {str(e)}")
 
+def hash_photo(photo, application_number):
+    """Perceptual hash of an uploaded photo (path or file object) for duplicate checks, or None"""
+    if photo is None:
+        return None
+    photo_hash = perceptual_hash(photo)
+    if photo_hash is None:
+        current_app.logger.warning(f"Could not hash the photo of {application_number}")
+    return photo_hash
+
+@write_transaction()
+def save_application(fields, documents, photo_hash=None):
+    """Create an application, its documents, fingerprints and counter entry in one transaction
+
+    ``documents`` are ``(document_type, file_path, filename, mime_type)`` tuples
+    for files already in storage. Only database work happens here, so the
+    transaction can be retried when the database is busy.
+    """
+    application = Application(**fields)
+    db.session.add(application)
+    db.session.flush()
+    db.session.add_all(
+        Document(application_id=application.id, document_type=document_type, file_path=file_path,
+                 filename=filename, mime_type=mime_type)
+        for document_type, file_path, filename, mime_type in documents
+    )
+    index_application(application, photo_hash)
+    record_new_application(application)
+    return application
+
 def get_document_preview(document):
     """Get a preview URL for a document"""
     if not document:
@@ -7,6 +7,12 @@ error_bp = Blueprint('error', __name__)
 def not_found_error(error):
     return render_template('error/error-404.html'), 404
 
+@error_bp.app_errorhandler(429)
+def too_many_requests_error(error):
+    retry_after = error.retry_after.total_seconds() if hasattr(error.retry_after, 'total_seconds') else error.retry_after
+    headers = {'Retry-After': str(int(retry_after))} if retry_after else {}
+    return render_template('error/error-429.html', retry_after=retry_after and int(retry_after)), 429, headers
+
 @error_bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()  # ✅ Fix: No circular import issue now
@@ -4,6 +4,8 @@ from wtforms import StringField, TextAreaField
 from wtforms.validators import DataRequired, Email, ValidationError
 from flask_mail import Message
 from extensions import mail
+from rate_limit import rate_limit
+from page_cache import cached_page
 
 main_bp = Blueprint('main', __name__)
 
@@ -12,24 +14,28 @@ class ContactForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
     message = TextAreaField('Message', validators=[DataRequired()])
 
+# Shown on the about page; built once instead of on every request
+PRIVACY_QUESTIONS = [
+    ("What information do we collect?", "We collect personal details like name, email, and usage data."),
+    ("How do we use your information?", "We use your data for processing applications and improving services."),
+    ("How is my data protected?", "Your data is encrypted and stored securely."),
+    ("Do we use cookies?", "Yes, we use cookies to improve user experience."),
+    ("How can I delete my account?", "You can request account deletion in your profile settings.")
+]
+
 @main_bp.route('/')
+@cached_page('index.html')
 def index():
     return render_template('index.html')
 
 @main_bp.route('/about')
+@cached_page('about.html')
 def about():
     # Pass `enumerate` explicitly to Jinja
-    privacy_questions = [
-        ("What information do we collect?", "We collect personal details like name, email, and usage data."),
-        ("How do we use your information?", "We use your data for processing applications and improving services."),
-        ("How is my data protected?", "Your data is encrypted and stored securely."),
-        ("Do we use cookies?", "Yes, we use cookies to improve user experience."),
-        ("How can I delete my account?", "You can request account deletion in your profile settings.")
-    ]
-    
-    return render_template('about.html', privacy_questions=privacy_questions, enumerate=enumerate)
+    return render_template('about.html', privacy_questions=PRIVACY_QUESTIONS, enumerate=enumerate)
 
 @main_bp.route('/contact', methods=['GET', 'POST'])
+@rate_limit('5/hour', keys=('ip', 'email'))
 def contact():
     form = ContactForm()
     if form.validate_on_submit():
@@ -86,10 +92,12 @@ Dastaavej Support Team
     return render_template('contact.html', form=form)
 
 @main_bp.route('/terms')
+@cached_page('legal/terms.html')
 def terms():
     return render_template('legal/terms.html')
 
 @main_bp.route('/privacy')
+@cached_page('legal/privacy.html')
 def privacy():
     return render_template('legal/privacy.html')
 
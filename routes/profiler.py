@@ -0,0 +1,62 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app, Response
+from flask_login import login_required, current_user
+from forms import ProfilerForm
+from profiler import get_profiler
+
+profiler_bp = Blueprint('profiler', __name__)
+
+def profiler_form():
+    form = ProfilerForm()
+    form.endpoints.choices = [(endpoint, endpoint) for endpoint in sorted(current_app.view_functions)
+                              if endpoint != 'static']
+    return form
+
+@profiler_bp.route('/', methods=['GET', 'POST'])
+@login_required
+def index():
+    """Arm the sampling profiler for chosen endpoints and show the current session"""
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    profiler = get_profiler()
+    form = profiler_form()
+    
+    if form.validate_on_submit():
+        profiler.store.arm(form.endpoints.data, form.duration.data,
+                           form.interval_ms.data / 1000, form.sample_rate.data)
+        profiler.refresh()
+        flash('Profiling started on every worker', 'success')
+        return redirect(url_for('profiler.index'))
+    
+    return render_template('agency/profiler.html',
+                           form=form,
+                           session=profiler.store.get_session(),
+                           sample_total=profiler.store.sample_total())
+
+@profiler_bp.route('/stop', methods=['POST'])
+@login_required
+def stop():
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    profiler = get_profiler()
+    profiler.store.disarm()
+    profiler.refresh()
+    flash('Profiling stopped; collected samples are kept until the next session', 'info')
+    return redirect(url_for('profiler.index'))
+
+@profiler_bp.route('/collapsed.txt')
+@login_required
+def collapsed():
+    """Download the aggregated samples in collapsed-stack format"""
+    if current_user.role != 'agency':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    profiler = get_profiler()
+    # Samples still buffered in this worker are written out first
+    profiler.sampler.flush()
+    return Response(profiler.store.collapsed(), mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename=profile.collapsed.txt'})
@@ -0,0 +1,220 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, func, select
+from werkzeug.security import generate_password_hash
+from extensions import db
+from models import User, Application, Document, StatusUpdate, Notification
+from counters import rebuild_application_counters
+
+# Every generated account shares this password so load tests can log in as anyone
+SYNTHETIC_PASSWORD = 'Synthetic#Pass1'
+
+DEFAULT_STATUS_MIX = {'pending': 0.4, 'under review': 0.2, 'approved': 0.3, 'rejected': 0.1}
+
+DOCUMENT_TYPES = {
+    'passport': ('application_form', 'id_proof', 'photo', 'address_proof', 'dob_proof'),
+    'pancard': ('application_form', 'id_proof', 'photo', 'address_proof', 'signature'),
+}
+
+MIME_TYPES = {'photo': ('image/jpeg', 'jpg'), 'signature': ('image/png', 'png')}
+
+FIRST_NAMES = ('Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Isha', 'Kabir', 'Meera', 'Rohan', 'Saanvi',
+               'Arjun', 'Kavya', 'Neha', 'Pranav', 'Riya', 'Tanvi', 'Vikram', 'Zara', 'Farhan', 'Gurpreet')
+LAST_NAMES = ('Sharma', 'Verma', 'Iyer', 'Reddy', 'Khan', 'Singh', 'Patel', 'Gupta', 'Nair', 'Das',
+              'Mehta', 'Joshi', 'Kulkarni', 'Banerjee', 'Chopra')
+STATES = ('Delhi', 'Maharashtra', 'Karnataka', 'Tamil Nadu', 'Uttar Pradesh', 'West Bengal', 'Gujarat', 'Kerala')
+
+
+def parse_mix(text):
+    """Parse ``pending=0.4,approved=0.6`` into normalized status weights"""
+    mix = {}
+    for part in text.split(','):
+        status, _, weight = part.partition('=')
+        mix[status.strip()] = float(weight)
+    total = sum(mix.values())
+    return {status: weight / total for status, weight in mix.items()}
+
+
+def _next_id(model):
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+class _BatchInserter:
+    """Buffers rows per table and flushes them with executemany INSERTs"""
+
+    def __init__(self, connection, batch_size):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, table, row):
+        buffer = self.buffers.setdefault(table, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        tables = [table] if table is not None else list(self.buffers)
+        for name in tables:
+            rows = self.buffers.get(name)
+            if rows:
+                self.connection.execute(insert(name), rows)
+                self.counts[name.name] = self.counts.get(name.name, 0) + len(rows)
+                self.buffers[name] = []
+
+
+def generate_dataset(citizens=1000, agency_users=10, applications=10000, status_mix=None,
+                     passport_share=0.6, days=365, read_ratio=0.7, batch_size=5000, seed=None,
+                     progress=None):
+    """Bulk-insert synthetic users, applications, documents, status updates and notifications
+
+    Rows get explicit ids past the current maximum, so foreign keys are known
+    up front and every table is written with plain executemany batches.
+    Returns the number of rows written per table. Call inside an app context.
+    """
+    rng = random.Random(seed)
+    status_mix = status_mix or DEFAULT_STATUS_MIX
+    statuses, weights = zip(*status_mix.items())
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+
+    user_id = _next_id(User)
+    application_id = _next_id(Application)
+    document_id = _next_id(Document)
+    status_update_id = _next_id(StatusUpdate)
+    notification_id = _next_id(Notification)
+    db.session.commit()
+
+    started = time.perf_counter()
+    with db.engine.begin() as connection:
+        inserter = _BatchInserter(connection, batch_size)
+
+        agency_ids = []
+        for i in range(agency_users):
+            agency_ids.append(user_id)
+            inserter.add(User.__table__, {
+                'id': user_id, 'username': f'SynAgency!{user_id}', 'email': f'agency{user_id}@synthetic.test',
+                'password_hash': password_hash, 'role': 'agency', 'government_id': f'GOV{user_id:08d}',
+                'created_at': now - timedelta(days=days), 'is_verified': True,
+            })
+            user_id += 1
+
+        citizen_ids = []
+        for i in range(citizens):
+            citizen_ids.append(user_id)
+            inserter.add(User.__table__, {
+                'id': user_id, 'username': f'SynCitizen!{user_id}', 'email': f'citizen{user_id}@synthetic.test',
+                'password_hash': password_hash, 'role': 'citizen', 'government_id': None,
+                'created_at': now - timedelta(days=days, seconds=-rng.randrange(days * 86400 or 1)),
+                'is_verified': True,
+            })
+            user_id += 1
+        inserter.flush()
+
+        for i in range(applications):
+            document_type = 'passport' if rng.random() < passport_share else 'pancard'
+            status = rng.choices(statuses, weights)[0]
+            citizen_id = rng.choice(citizen_ids)
+            created_at = now - timedelta(seconds=rng.randrange(days * 86400 or 1))
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+            # Status history walks pending -> under review -> final status
+            history = []
+            if status != 'pending':
+                history = ['under review'] if status == 'under review' else \
+                    rng.choice([['under review', status], [status]])
+            moment = created_at
+            timeline = []
+            for step in history:
+                moment = moment + timedelta(seconds=rng.randrange(3600, 14 * 86400))
+                timeline.append((step, min(moment, now)))
+            updated_at = timeline[-1][1] if timeline else created_at
+
+            inserter.add(Application.__table__, {
+                'id': application_id, 'user_id': citizen_id, 'document_type': document_type,
+                'application_number': f'{document_type.upper()}-SYN{application_id:09d}',
+                'status': status, 'created_at': created_at, 'updated_at': updated_at,
+                'name': f'{first} {last}',
+                'dob': (created_at - timedelta(days=rng.randrange(18 * 365, 70 * 365))).date(),
+                'gender': rng.choice(('male', 'female', 'other')),
+                'address': f'{rng.randrange(1, 999)} Main Road, {rng.choice(STATES)} {rng.randrange(110000, 999999)}',
+                'phone': f'9{rng.randrange(10 ** 9):09d}',
+                'email': f'citizen{citizen_id}@synthetic.test',
+                'father_name': f'{rng.choice(FIRST_NAMES)} {last}' if document_type == 'pancard' else None,
+                'aadhaar_number': f'{rng.randrange(10 ** 12):012d}' if document_type == 'pancard' else None,
+                'next_of_kin': f'{rng.choice(FIRST_NAMES)} {last}' if document_type == 'passport' else None,
+                'next_of_kin_relation': 'parent' if document_type == 'passport' else None,
+                'next_of_kin_phone': f'8{rng.randrange(10 ** 9):09d}' if document_type == 'passport' else None,
+            })
+
+            for kind in DOCUMENT_TYPES[document_type]:
+                mime_type, extension = MIME_TYPES.get(kind, ('application/pdf', 'pdf'))
+                inserter.add(Document.__table__, {
+                    'id': document_id, 'application_id': application_id, 'document_type': kind,
+                    'file_path': f'local-{uuid.UUID(int=rng.getrandbits(128)).hex}',
+                    'filename': f'{kind}.{extension}', 'mime_type': mime_type,
+                    'created_at': created_at, 'updated_at': created_at, 'uploaded_at': created_at,
+                })
+                document_id += 1
+
+            for step, moment in timeline:
+                inserter.add(StatusUpdate.__table__, {
+                    'id': status_update_id, 'application_id': application_id, 'status': step,
+                    'comment': f'Status changed to {step}', 'updated_by': rng.choice(agency_ids),
+                    'updated_at': moment,
+                })
+                inserter.add(Notification.__table__, {
+                    'id': notification_id, 'user_id': citizen_id, 'title': 'Application Status Updated',
+                    'message': f'Your {document_type} application status has been updated to {step}.',
+                    'is_read': rng.random() < read_ratio, 'created_at': moment,
+                })
+                status_update_id += 1
+                notification_id += 1
+
+            application_id += 1
+            if progress and (i + 1) % 100000 == 0:
+                progress(i + 1, time.perf_counter() - started)
+
+        inserter.flush()
+
+    # Dashboard counters are maintained incrementally; bring them in line with the new rows
+    rebuild_application_counters()
+    return inserter.counts
+
+
+@click.command('generate-data')
+@click.option('--citizens', default=1000, show_default=True)
+@click.option('--agency-users', default=10, show_default=True)
+@click.option('--applications', default=10000, show_default=True)
+@click.option('--status-mix', default='pending=0.4,under review=0.2,approved=0.3,rejected=0.1', show_default=True,
+              help='Relative weights of application statuses.')
+@click.option('--passport-share', default=0.6, show_default=True, help='Fraction of applications that are passports.')
+@click.option('--days', default=365, show_default=True, help='Spread creation dates over this many days.')
+@click.option('--read-ratio', default=0.7, show_default=True, help='Fraction of notifications already read.')
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--seed', type=int, default=None, help='Seed for reproducible datasets.')
+@with_appcontext
+def generate_data_command(citizens, agency_users, applications, status_mix, passport_share, days,
+                          read_ratio, batch_size, seed):
+    """Bulk-insert synthetic users, applications and their history for scaling tests."""
+    if agency_users < 1 or citizens < 1:
+        raise click.BadParameter('At least one citizen and one agency user are needed')
+
+    started = time.perf_counter()
+    counts = generate_dataset(
+        citizens=citizens, agency_users=agency_users, applications=applications,
+        status_mix=parse_mix(status_mix), passport_share=passport_share, days=days,
+        read_ratio=read_ratio, batch_size=batch_size, seed=seed,
+        progress=lambda done, elapsed: click.echo(f"{done} applications in {elapsed:.1f}s"),
+    )
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    for table, count in sorted(counts.items()):
+        click.echo(f"{table}: {count} rows")
+    click.echo(f"{total} rows in {elapsed:.1f}s ({total / elapsed * 60:,.0f} rows/minute)")
+    click.echo(f"All synthetic accounts use the password {SYNTHETIC_PASSWORD}")
@@ -0,0 +1,212 @@
+import copy
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin, SecureCookieSessionInterface
+from werkzeug.datastructures import CallbackDict
+from token_store import SQLiteStore
+
+
+class SQLiteSessionStore(SQLiteStore):
+    """Session payloads keyed by session id, with a version bumped on every write"""
+
+    def __init__(self, path, table='sessions', sweep_interval=60, busy_timeout=5.0):
+        super().__init__(path, table, sweep_interval=sweep_interval, busy_timeout=busy_timeout)
+
+    def _create_schema(self, conn):
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{self.table}_expires_at ON {self.table} (expires_at)')
+
+    def load(self, sid, cached_version=None):
+        """Return ``(version, expires_at, payload)`` for a live session, or None
+
+        ``payload`` is None when the stored version still equals
+        ``cached_version``, so an unchanged session is never re-sent.
+        """
+        return self._connection().execute(
+            f'SELECT version, expires_at, CASE WHEN version = ? THEN NULL ELSE value END '
+            f'FROM {self.table} WHERE key = ? AND expires_at > ?',
+            (cached_version, sid, time.time())
+        ).fetchone()
+
+    def save(self, sid, payload, ttl):
+        """Store a payload and return its new version"""
+        row = self._connection().execute(
+            f'INSERT INTO {self.table} (key, value, version, expires_at) VALUES (?, ?, 1, ?) '
+            f'ON CONFLICT(key) DO UPDATE SET value = excluded.value, version = version + 1, '
+            f'expires_at = excluded.expires_at RETURNING version',
+            (sid, payload, time.time() + ttl)
+        ).fetchone()
+        self._maybe_sweep()
+        return row[0]
+
+    def touch(self, sid, ttl):
+        """Extend the lifetime of a session without rewriting it"""
+        self._connection().execute(
+            f'UPDATE {self.table} SET expires_at = ? WHERE key = ?',
+            (time.time() + ttl, sid)
+        )
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session whose data lives in the session store; the cookie only holds ``sid``"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+        self.initial_user_id = self.get('_user_id')
+
+
+def is_session_exempt(app, request):
+    """Requests under ``SESSION_EXEMPT_PATHS`` get a null session
+
+    Nothing is loaded or saved for them and their responses do not vary on
+    Cookie, so shared caches can store them.
+    """
+    return request.path.startswith(tuple(app.config.get('SESSION_EXEMPT_PATHS', ())))
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    """Flask's signed-cookie sessions, minus the exempt paths"""
+
+    def open_session(self, app, request):
+        if is_session_exempt(app, request):
+            return None
+        return super().open_session(app, request)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface backed by :class:`SQLiteSessionStore`
+
+    Deserialized sessions are kept in a small per-process cache together
+    with their version. Loading a session only pulls the payload from SQLite
+    when another request has changed it since this worker last saw it.
+    """
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, store, cache_size=1000):
+        self.store = store
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _generate_sid(self):
+        return secrets.token_urlsafe(32)
+
+    def _ttl(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def _cache_get(self, sid):
+        with self._cache_lock:
+            entry = self._cache.get(sid)
+            if entry is not None:
+                self._cache.move_to_end(sid)
+            return entry
+
+    def _cache_put(self, sid, version, data):
+        with self._cache_lock:
+            self._cache[sid] = (version, data)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, sid):
+        with self._cache_lock:
+            self._cache.pop(sid, None)
+
+    def open_session(self, app, request):
+        if is_session_exempt(app, request):
+            return None
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or len(sid) > 64:
+            return self.session_class(sid=self._generate_sid(), new=True)
+
+        cached = self._cache_get(sid)
+        row = self.store.load(sid, cached[0] if cached else None)
+        if row is None:
+            self._cache_drop(sid)
+            return self.session_class(sid=self._generate_sid(), new=True)
+
+        version, expires_at, payload = row
+        if payload is None:
+            data = cached[1]
+        else:
+            data = self.serializer.loads(payload)
+            self._cache_put(sid, version, data)
+        # Hand out a copy so in-place edits never leak into the cache
+        return self.session_class(copy.deepcopy(data), sid=sid, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.discard(session.sid)
+                self._cache_drop(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        ttl = self._ttl(app)
+        # Issue a fresh id whenever the logged-in user changes to prevent session fixation
+        if not session.new and session.get('_user_id') != session.initial_user_id:
+            self.store.discard(session.sid)
+            self._cache_drop(session.sid)
+            session.sid = self._generate_sid()
+            session.new = True
+
+        if session.modified or session.new:
+            data = dict(session)
+            version = self.store.save(session.sid, self.serializer.dumps(data), ttl)
+            self._cache_put(session.sid, version, copy.deepcopy(data))
+        elif session.expires_at is not None and session.expires_at - time.time() < ttl / 2:
+            # Sliding expiry, written at most once per half lifetime
+            self.store.touch(session.sid, ttl)
+        elif not session.new and not self.should_set_cookie(app, session):
+            return
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+
+
+def init_session_store(app):
+    """Switch the app to server-side sessions when ``SESSION_BACKEND`` is 'server'"""
+    if app.config.get('SESSION_BACKEND', 'server') != 'server':
+        app.session_interface = CookieSessionInterface()
+        return
+    store = SQLiteSessionStore(
+        app.config['SESSION_STORE_PATH'],
+        sweep_interval=app.config.get('TOKEN_STORE_SWEEP_INTERVAL', 60)
+    )
+    app.session_interface = ServerSideSessionInterface(
+        store, cache_size=app.config.get('SESSION_CACHE_SIZE', 1000)
+    )
@@ -0,0 +1,53 @@
+// Live status and notification updates for citizens over Server-Sent Events.
+// The browser reconnects on its own and sends Last-Event-ID, so events missed
+// while offline are replayed by the server.
+(function () {
+    var script = document.currentScript;
+    if (!script || !window.EventSource) {
+        return;
+    }
+
+    var source = new EventSource(script.dataset.eventsUrl);
+    var page = document.getElementById('live-updates');
+    var pageApplicationId = page ? page.dataset.applicationId : null;
+    var pageKind = page ? page.dataset.page : null;
+
+    function showAlert(message) {
+        var container = document.querySelector('.container.mt-3');
+        if (!container) {
+            return;
+        }
+        var alert = document.createElement('div');
+        alert.className = 'alert alert-info alert-dismissible fade show';
+        alert.setAttribute('role', 'alert');
+        alert.textContent = message;
+        var close = document.createElement('button');
+        close.type = 'button';
+        close.className = 'btn-close';
+        close.setAttribute('data-bs-dismiss', 'alert');
+        close.setAttribute('aria-label', 'Close');
+        alert.appendChild(close);
+        container.appendChild(alert);
+    }
+
+    source.addEventListener('status', function (event) {
+        var data = JSON.parse(event.data);
+        if (pageApplicationId && String(data.application_id) === pageApplicationId) {
+            // The page shows this application; reload it once instead of polling
+            window.location.reload();
+            return;
+        }
+        showAlert('Application ' + data.application_number + ' is now ' + data.status + '.');
+    });
+
+    source.addEventListener('notification', function (event) {
+        var data = JSON.parse(event.data);
+        if (pageKind === 'notifications') {
+            window.location.reload();
+            return;
+        }
+        if (!pageApplicationId) {
+            showAlert(data.title + ': ' + data.message);
+        }
+    });
+})();
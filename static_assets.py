@@ -0,0 +1,121 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+from compression import brotli, COMPRESSIBLE_MIMETYPES
+
+# Build output lives under static/ so the existing static route can serve it
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def fingerprint_name(path, digest):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def build_static(static_folder, hash_length=12):
+    """Copy every static asset to ``dist/`` under a content-hashed name and write the manifest
+
+    Text assets also get ``.gz`` (and, with brotli installed, ``.br``)
+    siblings so they are never compressed per request. Returns the manifest.
+    """
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist_folder):
+        shutil.rmtree(dist_folder)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist_folder)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            hashed = fingerprint_name(relative, hashlib.sha256(data).hexdigest()[:hash_length])
+            target = os.path.join(dist_folder, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+
+            if mimetypes.guess_type(name)[0] in COMPRESSIBLE_MIMETYPES:
+                with open(target + '.gz', 'wb') as f:
+                    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as f:
+                        f.write(brotli.compress(data, quality=11))
+            manifest[relative] = f"{DIST_DIR}/{hashed}"
+
+    os.makedirs(dist_folder, exist_ok=True)
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def serve_static(filename):
+    """Static route: fingerprinted files are cached forever and served precompressed when possible"""
+    app = current_app
+    if not filename.startswith(f"{DIST_DIR}/"):
+        return app.send_static_file(filename)
+
+    response = None
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = app.send_static_file(filename)
+
+    response.vary.add('Accept-Encoding')
+    # The name changes whenever the content does, so browsers never need to revalidate
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config.get('STATIC_MAX_AGE', 365 * 24 * 3600)
+    response.cache_control.immutable = True
+    return response
+
+
+def init_static_assets(app):
+    """Point ``url_for('static')`` at fingerprinted files once ``flask build-static`` has run"""
+    if not app.static_folder or 'static' not in app.view_functions:
+        return
+    manifest = load_manifest(app.static_folder)
+    app.extensions['static_manifest'] = manifest
+    app.view_functions['static'] = serve_static
+
+    if not manifest:
+        return
+
+    @app.url_defaults
+    def fingerprinted_static_url(endpoint, values):
+        if endpoint == 'static':
+            hashed = manifest.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+
+
+@click.command('build-static')
+@with_appcontext
+def build_static_command():
+    """Fingerprint static assets and precompress them for long-lived caching."""
+    manifest = build_static(current_app.static_folder)
+    for original, hashed in sorted(manifest.items()):
+        click.echo(f"{original} -> {hashed}")
+    click.echo(f"{len(manifest)} assets written; restart the app to pick up the manifest")
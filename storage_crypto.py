@@ -0,0 +1,289 @@
+import base64
+import io
+import os
+import shutil
+import struct
+import click
+from local_storage import setting
+
+# Encrypted blobs start with this marker, so files stored before encryption
+# was turned on (plain PDF/JPEG/PNG) are still read as they are.
+MAGIC = b'DSTVENC1'
+TAG_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+# Header: magic, chunk size, nonce prefix, key id length; then key id, wrapped key length, wrapped key
+_FIXED_HEADER = struct.Struct('>8sI7sB')
+_WRAPPED_LENGTH = struct.Struct('>H')
+
+
+class DecryptionError(ValueError):
+    """A stored blob is damaged, truncated or encrypted under an unknown master key"""
+
+
+def parse_master_keys(value):
+    """``{key_id: key}`` from ``id:base64key[,id:base64key...]``; the first id is used for new files"""
+    keys = {}
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        key_id, _, encoded = item.partition(':')
+        key = base64.urlsafe_b64decode(encoded)
+        if len(key) not in (16, 24, 32):
+            raise ValueError(f"Storage master key {key_id!r} must be 16, 24 or 32 bytes")
+        keys[key_id] = key
+    return keys
+
+
+def _master_keys():
+    return parse_master_keys(setting('STORAGE_ENCRYPTION_KEYS'))
+
+
+def encryption_enabled():
+    """Whether new blobs are encrypted; reading encrypted blobs only needs their key to be listed"""
+    return bool(setting('STORAGE_ENCRYPTION_KEYS'))
+
+
+def _chunk_nonce(prefix, index, last):
+    # STREAM construction: a counter per chunk plus a flag on the final one, so
+    # chunks cannot be reordered, dropped or appended without failing authentication
+    return prefix + struct.pack('>I?', index, last)
+
+
+class EncryptingReader(io.RawIOBase):
+    """Read-only, seekable view of a plaintext file as its encrypted blob
+
+    Each chunk is encrypted when it is read, so only one chunk is held in
+    memory and uploads can retry or resume from any offset.
+    """
+
+    def __init__(self, source, key_id, master_key, chunk_size):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        from cryptography.hazmat.primitives.keywrap import aes_key_wrap
+
+        self._source = source
+        self.chunk_size = chunk_size
+        data_key = AESGCM.generate_key(bit_length=256)
+        self._aead = AESGCM(data_key)
+        self._nonce_prefix = os.urandom(NONCE_PREFIX_SIZE)
+        encoded_id = key_id.encode()
+        wrapped = aes_key_wrap(master_key, data_key)
+        self.header = (_FIXED_HEADER.pack(MAGIC, chunk_size, self._nonce_prefix, len(encoded_id))
+                       + encoded_id + _WRAPPED_LENGTH.pack(len(wrapped)) + wrapped)
+
+        source.seek(0, os.SEEK_END)
+        plaintext_size = source.tell()
+        # An empty file is still one (empty) final chunk
+        self._chunks = max(1, -(-plaintext_size // chunk_size))
+        self.size = len(self.header) + plaintext_size + self._chunks * TAG_SIZE
+        self._position = 0
+        self._cached = (None, b'')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._position = max(offset, 0)
+        return self._position
+
+    def _chunk(self, index):
+        if self._cached[0] != index:
+            self._source.seek(index * self.chunk_size)
+            plaintext = self._source.read(self.chunk_size)
+            nonce = _chunk_nonce(self._nonce_prefix, index, index == self._chunks - 1)
+            # The header is authenticated with every chunk, binding the key and parameters to the data
+            self._cached = (index, self._aead.encrypt(nonce, plaintext, self.header))
+        return self._cached[1]
+
+    def readinto(self, buffer):
+        position = self._position
+        if position >= self.size:
+            return 0
+        header_size = len(self.header)
+        if position < header_size:
+            data = self.header[position:]
+        else:
+            index, offset = divmod(position - header_size, self.chunk_size + TAG_SIZE)
+            data = self._chunk(index)[offset:]
+        count = min(len(buffer), len(data))
+        buffer[:count] = data[:count]
+        self._position += count
+        return count
+
+    def close(self):
+        self._source.close()
+        super().close()
+
+
+class DecryptingReader(io.RawIOBase):
+    """Read-only, seekable view of an encrypted blob as its plaintext
+
+    Seeking only touches the chunks that hold the requested bytes, which is
+    what lets Range requests be served without decrypting the whole file.
+    """
+
+    def __init__(self, source, master_keys):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        from cryptography.hazmat.primitives.keywrap import aes_key_unwrap, InvalidUnwrap
+
+        self._source = source
+        source.seek(0)
+        fixed = source.read(_FIXED_HEADER.size)
+        if len(fixed) < _FIXED_HEADER.size:
+            raise DecryptionError("Encrypted blob header is truncated")
+        magic, self.chunk_size, self._nonce_prefix, id_length = _FIXED_HEADER.unpack(fixed)
+        if magic != MAGIC or not self.chunk_size:
+            raise DecryptionError("Not an encrypted blob")
+        encoded_id = source.read(id_length)
+        length = source.read(_WRAPPED_LENGTH.size)
+        if len(encoded_id) < id_length or len(length) < _WRAPPED_LENGTH.size:
+            raise DecryptionError("Encrypted blob header is truncated")
+        key_id = encoded_id.decode(errors='replace')
+        wrapped_length = _WRAPPED_LENGTH.unpack(length)[0]
+        wrapped = source.read(wrapped_length)
+        if len(wrapped) < wrapped_length:
+            raise DecryptionError("Encrypted blob header is truncated")
+        self.header = fixed + encoded_id + length + wrapped
+
+        master_key = master_keys.get(key_id)
+        if master_key is None:
+            raise DecryptionError(f"Blob is encrypted with unknown master key {key_id!r}")
+        try:
+            self._aead = AESGCM(aes_key_unwrap(master_key, wrapped))
+        except InvalidUnwrap:
+            raise DecryptionError(f"Data key does not unwrap with master key {key_id!r}")
+
+        source.seek(0, os.SEEK_END)
+        body_size = source.tell() - len(self.header)
+        stride = self.chunk_size + TAG_SIZE
+        self._chunks = max(1, -(-body_size // stride))
+        self.size = body_size - self._chunks * TAG_SIZE
+        if self.size < 0:
+            raise DecryptionError("Encrypted blob is truncated")
+        self._position = 0
+        self._cached = (None, b'')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._position = max(offset, 0)
+        return self._position
+
+    def _chunk(self, index):
+        from cryptography.exceptions import InvalidTag
+
+        if self._cached[0] != index:
+            stride = self.chunk_size + TAG_SIZE
+            self._source.seek(len(self.header) + index * stride)
+            ciphertext = self._source.read(stride)
+            nonce = _chunk_nonce(self._nonce_prefix, index, index == self._chunks - 1)
+            try:
+                self._cached = (index, self._aead.decrypt(nonce, ciphertext, self.header))
+            except InvalidTag:
+                raise DecryptionError(f"Chunk {index} of encrypted blob failed authentication")
+        return self._cached[1]
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        index, offset = divmod(self._position, self.chunk_size)
+        data = self._chunk(index)[offset:]
+        count = min(len(buffer), len(data))
+        buffer[:count] = data[:count]
+        self._position += count
+        return count
+
+    def close(self):
+        self._source.close()
+        super().close()
+
+
+def is_encrypted(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def encrypting_reader(path):
+    """Buffered reader over the encrypted form of ``path`` under the current master key"""
+    keys = _master_keys()
+    key_id = next(iter(keys))
+    raw = EncryptingReader(open(path, 'rb'), key_id, keys[key_id], setting('STORAGE_ENCRYPTION_CHUNK_SIZE'))
+    return io.BufferedReader(raw, buffer_size=setting('STORAGE_ENCRYPTION_CHUNK_SIZE'))
+
+
+def open_decrypted(path):
+    """Open a stored blob for reading as plaintext, whether or not it is encrypted
+
+    Returns ``(file, size)``; the file is seekable either way.
+    """
+    source = open(path, 'rb')
+    if source.read(len(MAGIC)) != MAGIC:
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(0)
+        return source, size
+    try:
+        raw = DecryptingReader(source, _master_keys())
+    except Exception:
+        source.close()
+        raise
+    return io.BufferedReader(raw, buffer_size=raw.chunk_size), raw.size
+
+
+def encrypt_file(source_path, destination_path):
+    """Write the encrypted form of ``source_path`` chunk by chunk"""
+    with encrypting_reader(source_path) as reader, open(destination_path, 'wb') as out:
+        shutil.copyfileobj(reader, out)
+
+
+def decrypt_file(path):
+    """Decrypt a blob in place if it is encrypted; plain files are left alone"""
+    if not is_encrypted(path):
+        return
+    partial_path = f"{path}.plain"
+    try:
+        reader, _ = open_decrypted(path)
+        with reader, open(partial_path, 'wb') as out:
+            shutil.copyfileobj(reader, out)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def decrypt_bytes(data):
+    """Plaintext of an in-memory blob; plain data is returned unchanged"""
+    if not data.startswith(MAGIC):
+        return data
+    with io.BufferedReader(DecryptingReader(io.BytesIO(data), _master_keys())) as reader:
+        return reader.read()
+
+
+@click.command('generate-storage-key')
+@click.argument('key_id')
+def generate_storage_key_command(key_id):
+    """Print a new master key entry for STORAGE_ENCRYPTION_KEYS."""
+    key = base64.urlsafe_b64encode(os.urandom(32)).decode()
+    click.echo(f"{key_id}:{key}")
+    click.echo("Put it first in STORAGE_ENCRYPTION_KEYS and keep the old entries so existing files stay readable", err=True)
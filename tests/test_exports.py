@@ -0,0 +1,41 @@
+import csv
+import io
+import json
+
+from exports import CSV_HEADER, generate_csv, generate_ndjson
+
+
+def record(**fields):
+    base = dict.fromkeys(CSV_HEADER)
+    base.update(status_history=[], documents=[])
+    base.update(fields)
+    return base
+
+
+def read_csv(records):
+    return list(csv.DictReader(io.StringIO(''.join(generate_csv(records)))))
+
+
+def test_csv_neutralizes_formulas():
+    row, = read_csv([record(
+        name='=HYPERLINK("http://evil.example","click")', father_name='@SUM(A1:A9)', next_of_kin='-2+3',
+        email='+cmd|calc', phone='\t=1', application_number='PASSPORT-1',
+        status_history=[{'status': 'rejected', 'comment': '=1+1', 'updated_at': '2026-01-01T00:00:00'}],
+    )])
+    assert row['name'] == '\'=HYPERLINK("http://evil.example","click")'
+    assert row['father_name'] == "'@SUM(A1:A9)"
+    assert row['next_of_kin'] == "'-2+3"
+    assert row['email'] == "'+cmd|calc"
+    assert row['phone'] == "'\t=1"
+    assert row['last_status_comment'] == "'=1+1"
+    assert row['application_number'] == 'PASSPORT-1'
+
+
+def test_csv_leaves_plain_values_alone():
+    row, = read_csv([record(id=7, name='Asha Verma', email='asha@example.com')])
+    assert (row['id'], row['name'], row['email']) == ('7', 'Asha Verma', 'asha@example.com')
+
+
+def test_ndjson_stays_raw():
+    line, = generate_ndjson([{'name': '=HYPERLINK("x")'}])
+    assert json.loads(line) == {'name': '=HYPERLINK("x")'}
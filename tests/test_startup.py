@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import startup
+
+# Generous enough for a loaded CI machine; tighten locally with STARTUP_BUDGET_MS
+BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '3000'))
+RUNS = int(os.getenv('STARTUP_RUNS', '3'))
+LAZY_MODULES = ('reportlab', 'PIL', 'googleapiclient.discovery')
+
+
+@pytest.fixture
+def startup_env(tmp_path, monkeypatch):
+    """Point every store create_app opens at a temporary directory"""
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / 'app.db'))
+    for name in ('TOKEN_STORE_PATH', 'SESSION_STORE_PATH', 'RATELIMIT_STORE_PATH', 'EVENTS_STORE_PATH',
+                 'PROFILER_STORE_PATH', 'METRICS_STORE_PATH', 'LOCAL_STORAGE_PATH', 'DOCUMENT_CACHE_PATH'):
+        monkeypatch.setenv(name, str(tmp_path / name.lower()))
+    return tmp_path
+
+
+def test_startup_within_budget(startup_env):
+    report_path = startup_env / 'startup.json'
+    proc = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--runs', str(RUNS), '--json', str(report_path)],
+        cwd=startup.ROOT_DIR, capture_output=True, text=True
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    report = json.loads(report_path.read_text())
+    assert report['startup_ms_median'] < BUDGET_MS, proc.stdout
+
+
+def test_heavy_modules_stay_lazy(startup_env):
+    modules = set(startup.run_once()['modules'])
+    assert not modules & set(LAZY_MODULES)
@@ -0,0 +1,166 @@
+import base64
+import io
+import os
+
+import pytest
+from flask import Flask
+
+import storage_crypto
+from storage_crypto import (DecryptingReader, DecryptionError, EncryptingReader, MAGIC, TAG_SIZE,
+                            decrypt_bytes, open_decrypted, parse_master_keys)
+
+CHUNK_SIZE = 64
+KEY = os.urandom(32)
+
+
+def encrypt(plaintext, key_id='k1', key=KEY, chunk_size=CHUNK_SIZE):
+    with EncryptingReader(io.BytesIO(plaintext), key_id, key, chunk_size) as reader:
+        return reader.read()
+
+
+def decrypt(blob, keys=None):
+    with io.BufferedReader(DecryptingReader(io.BytesIO(blob), keys or {'k1': KEY})) as reader:
+        return reader.read()
+
+
+def header_size(blob):
+    return len(DecryptingReader(io.BytesIO(blob), {'k1': KEY}).header)
+
+
+@pytest.mark.parametrize('size', [0, 1, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE + 1, 5 * CHUNK_SIZE + 7])
+def test_round_trip(size):
+    plaintext = os.urandom(size)
+    blob = encrypt(plaintext)
+    assert blob.startswith(MAGIC)
+    assert decrypt(blob) == plaintext
+
+
+def test_encrypted_size_is_known_before_reading():
+    reader = EncryptingReader(io.BytesIO(os.urandom(300)), 'k1', KEY, CHUNK_SIZE)
+    assert reader.size == len(reader.read())
+
+
+def test_encrypting_reader_resumes_from_any_offset():
+    reader = EncryptingReader(io.BytesIO(os.urandom(300)), 'k1', KEY, CHUNK_SIZE)
+    blob = reader.read()
+    for offset in (0, 5, len(reader.header), len(reader.header) + CHUNK_SIZE + TAG_SIZE + 3):
+        reader.seek(offset)
+        assert reader.read() == blob[offset:]
+
+
+@pytest.mark.parametrize('start, length', [(0, 10), (60, 10), (64, 64), (100, 150), (319, 1), (250, 500)])
+def test_range_reads(start, length):
+    plaintext = os.urandom(320)
+    raw = DecryptingReader(io.BytesIO(encrypt(plaintext)), {'k1': KEY})
+    assert raw.size == len(plaintext)
+    # Raw reads stop at a chunk boundary; the buffered reader the app uses joins them
+    reader = io.BufferedReader(raw)
+    reader.seek(start)
+    assert reader.read(length) == plaintext[start:start + length]
+
+
+def test_truncated_last_chunk_fails():
+    blob = encrypt(os.urandom(300))
+    with pytest.raises(DecryptionError):
+        decrypt(blob[:-5])
+
+
+def test_dropped_final_chunk_fails():
+    plaintext = os.urandom(3 * CHUNK_SIZE)
+    blob = encrypt(plaintext)
+    # Cut exactly at a chunk boundary: the remaining chunks are intact but none is marked final
+    with pytest.raises(DecryptionError):
+        decrypt(blob[:-(CHUNK_SIZE + TAG_SIZE)])
+
+
+def test_truncated_header_fails():
+    blob = encrypt(b'hello')
+    for size in range(1, header_size(blob)):
+        with pytest.raises(DecryptionError):
+            decrypt(blob[:size])
+
+
+def test_reordered_chunks_fail():
+    blob = encrypt(os.urandom(3 * CHUNK_SIZE))
+    start = header_size(blob)
+    stride = CHUNK_SIZE + TAG_SIZE
+    first, second = blob[start:start + stride], blob[start + stride:start + 2 * stride]
+    swapped = blob[:start] + second + first + blob[start + 2 * stride:]
+    with pytest.raises(DecryptionError):
+        decrypt(swapped)
+
+
+def test_flipped_bit_fails():
+    blob = bytearray(encrypt(os.urandom(200)))
+    blob[header_size(bytes(blob)) + 10] ^= 1
+    with pytest.raises(DecryptionError):
+        decrypt(bytes(blob))
+
+
+def test_tampered_header_fails():
+    blob = bytearray(encrypt(os.urandom(200)))
+    # A byte of the nonce prefix; the header is authenticated with every chunk
+    blob[len(MAGIC) + 4] ^= 1
+    with pytest.raises(DecryptionError):
+        decrypt(bytes(blob))
+
+
+def test_unknown_key_id_fails():
+    blob = encrypt(b'secret', key_id='old')
+    with pytest.raises(DecryptionError, match='unknown master key'):
+        decrypt(blob, {'k1': KEY})
+
+
+def test_wrong_master_key_fails():
+    blob = encrypt(b'secret')
+    with pytest.raises(DecryptionError):
+        decrypt(blob, {'k1': os.urandom(32)})
+
+
+def test_rotated_keys_still_decrypt():
+    blob = encrypt(b'secret', key_id='old', key=KEY)
+    assert decrypt(blob, {'new': os.urandom(32), 'old': KEY}) == b'secret'
+
+
+def test_parse_master_keys():
+    encoded = base64.urlsafe_b64encode(KEY).decode()
+    assert parse_master_keys(f' k2:{encoded} , k1:{encoded},') == {'k2': KEY, 'k1': KEY}
+    with pytest.raises(ValueError):
+        parse_master_keys('k1:' + base64.urlsafe_b64encode(b'short').decode())
+
+
+@pytest.fixture
+def app_context(tmp_path):
+    app = Flask(__name__)
+    app.config.update(STORAGE_ENCRYPTION_KEYS='k1:' + base64.urlsafe_b64encode(KEY).decode(),
+                      STORAGE_ENCRYPTION_CHUNK_SIZE=CHUNK_SIZE)
+    with app.app_context():
+        yield tmp_path
+
+
+def test_files_round_trip_under_app_config(app_context):
+    plaintext = os.urandom(1000)
+    source, encrypted = app_context / 'plain.pdf', app_context / 'blob'
+    source.write_bytes(plaintext)
+    storage_crypto.encrypt_file(str(source), str(encrypted))
+    assert storage_crypto.is_encrypted(str(encrypted))
+
+    reader, size = open_decrypted(str(encrypted))
+    with reader:
+        assert size == len(plaintext)
+        reader.seek(500)
+        assert reader.read(10) == plaintext[500:510]
+    assert decrypt_bytes(encrypted.read_bytes()) == plaintext
+
+    storage_crypto.decrypt_file(str(encrypted))
+    assert encrypted.read_bytes() == plaintext
+
+
+def test_plain_files_pass_through(app_context):
+    path = app_context / 'old.pdf'
+    path.write_bytes(b'%PDF-1.4 stored before encryption')
+    reader, size = open_decrypted(str(path))
+    with reader:
+        assert reader.read() == b'%PDF-1.4 stored before encryption'
+    assert size == path.stat().st_size
+    assert decrypt_bytes(b'plain') == b'plain'
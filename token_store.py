@@ -0,0 +1,243 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class MemoryTokenStore:
+    """In-process token store with LRU eviction and per-entry TTL"""
+
+    def __init__(self, max_entries=10000, sweep_interval=60):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        payload = json.dumps(value, separators=(',', ':'))
+        with self._lock:
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            # Evict least recently used entries once we are over capacity
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._maybe_sweep()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(payload)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return json.loads(entry[0])
+
+    def discard(self, key):
+        """Drop a key without deserializing it"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def sweep(self):
+        """Remove every expired entry and return how many were dropped"""
+        with self._lock:
+            return self._sweep_locked()
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self._sweep_locked()
+
+    def _sweep_locked(self):
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        self._last_sweep = time.monotonic()
+        return len(expired)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """Base for key/expiry tables kept in a SQLite file shared by every worker process"""
+
+    def __init__(self, path, table, sweep_interval=60, busy_timeout=5.0):
+        self.path = path
+        self.table = table
+        self.sweep_interval = sweep_interval
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._create_schema(self._connection())
+
+    def _create_schema(self, conn):
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{self.table}_expires_at ON {self.table} (expires_at)')
+
+    def _connection(self):
+        # Connections must not cross a fork or be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def discard(self, key):
+        """Drop a key without deserializing it"""
+        self._connection().execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def sweep(self):
+        """Remove every expired entry and return how many were dropped"""
+        cursor = self._connection().execute(
+            f'DELETE FROM {self.table} WHERE expires_at <= ?', (time.time(),)
+        )
+        self._last_sweep = time.monotonic()
+        return cursor.rowcount
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._last_sweep < self.sweep_interval:
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self.sweep()
+        except sqlite3.OperationalError:
+            # Another worker holds the write lock; it will sweep instead
+            pass
+        finally:
+            self._sweep_lock.release()
+
+    def __len__(self):
+        row = self._connection().execute(
+            f'SELECT COUNT(*) FROM {self.table} WHERE expires_at > ?', (time.time(),)
+        ).fetchone()
+        return row[0]
+
+
+class SQLiteTokenStore(SQLiteStore):
+    """Token store kept in a SQLite file so every worker process sees the same data"""
+
+    def __init__(self, path, table='tokens', sweep_interval=60, busy_timeout=5.0):
+        super().__init__(path, table, sweep_interval=sweep_interval, busy_timeout=busy_timeout)
+
+    def set(self, key, value, ttl):
+        payload = json.dumps(value, separators=(',', ':'))
+        self._connection().execute(
+            f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, payload, time.time() + ttl)
+        )
+        self._maybe_sweep()
+
+    def get(self, key):
+        row = self._connection().execute(
+            f'SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pop(self, key):
+        # DELETE ... RETURNING makes the read-and-remove atomic across workers
+        row = self._connection().execute(
+            f'DELETE FROM {self.table} WHERE key = ? RETURNING value, expires_at',
+            (key,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+
+class TieredTokenStore:
+    """Shared SQLite store fronted by a short-lived in-memory read cache
+
+    The local tier only keeps entries for ``local_ttl`` seconds so a value
+    changed or removed by another worker is never served stale for long.
+    """
+
+    def __init__(self, shared, local, local_ttl=2):
+        self.shared = shared
+        self.local = local
+        self.local_ttl = local_ttl
+
+    def set(self, key, value, ttl):
+        self.shared.set(key, value, ttl)
+        self.local.set(key, value, min(ttl, self.local_ttl))
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value = self.shared.get(key)
+        if value is not None:
+            self.local.set(key, value, self.local_ttl)
+        return value
+
+    def pop(self, key):
+        self.local.discard(key)
+        return self.shared.pop(key)
+
+    def discard(self, key):
+        self.local.discard(key)
+        self.shared.discard(key)
+
+    def sweep(self):
+        return self.local.sweep() + self.shared.sweep()
+
+    def __len__(self):
+        return len(self.shared)
+
+
+def create_token_store(config, table='tokens'):
+    """Build the token store configured by ``TOKEN_STORE_BACKEND``"""
+    backend = config.get('TOKEN_STORE_BACKEND', 'tiered')
+    sweep_interval = config.get('TOKEN_STORE_SWEEP_INTERVAL', 60)
+    local = MemoryTokenStore(
+        max_entries=config.get('TOKEN_STORE_MAX_ENTRIES', 10000),
+        sweep_interval=sweep_interval
+    )
+    if backend == 'memory':
+        return local
+
+    shared = SQLiteTokenStore(config['TOKEN_STORE_PATH'], table=table, sweep_interval=sweep_interval)
+    if backend == 'sqlite':
+        return shared
+    if backend == 'tiered':
+        return TieredTokenStore(shared, local, local_ttl=config.get('TOKEN_STORE_LOCAL_TTL', 2))
+    raise ValueError(f"Unknown token store backend: {backend}")
+
+
+def init_token_store(app):
+    """Attach the token store to the app"""
+    app.extensions['token_store'] = create_token_store(app.config)
+
+
+def get_token_store():
+    """Get the token store of the current app"""
+    return current_app.extensions['token_store']
@@ -0,0 +1,149 @@
+import os
+import struct
+from collections import namedtuple
+from flask import current_app
+from wtforms.validators import ValidationError
+
+EXTENSION_MIMETYPES = {
+    'pdf': 'application/pdf',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+MIMETYPE_LABELS = {
+    'application/pdf': 'PDF',
+    'image/jpeg': 'JPEG',
+    'image/png': 'PNG',
+}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+PDF_SIGNATURE = b'%PDF-'
+
+# Markers every complete file ends with; a file cut off in transit lacks them
+TRAILERS = {
+    'application/pdf': b'%%EOF',
+    'image/jpeg': b'\xff\xd9',
+    'image/png': b'IEND',
+}
+
+# SOF0-SOF15 carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but do not
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers that stand alone, without a length field
+JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01}
+
+UploadInfo = namedtuple('UploadInfo', ['mime_type', 'width', 'height'])
+
+
+class UploadRejected(ValueError):
+    """An uploaded file is not what it claims to be; the message is safe to show to the user"""
+
+
+def _read_at(stream, offset, size, whence=os.SEEK_SET):
+    stream.seek(offset, whence)
+    return stream.read(size)
+
+
+def sniff_mimetype(header):
+    """MIME type from the leading bytes of a file, or None if it is not a supported format"""
+    if header.startswith(PNG_SIGNATURE):
+        return 'image/png'
+    if header.startswith(JPEG_SIGNATURE):
+        return 'image/jpeg'
+    # Readers accept a PDF header anywhere in the first KB, after stray bytes from some scanners
+    if PDF_SIGNATURE in header[:1024]:
+        return 'application/pdf'
+    return None
+
+
+def png_dimensions(header):
+    """Width and height from the IHDR chunk, which must directly follow the signature"""
+    if len(header) < 24 or header[12:16] != b'IHDR':
+        raise UploadRejected('PNG image header is damaged')
+    return struct.unpack('>II', header[16:24])
+
+
+def jpeg_dimensions(stream, scan_limit):
+    """Width and height from the first SOF segment, skipping over the segments before it
+
+    Only the two-byte marker and length of each segment are read, so large
+    EXIF blocks and thumbnails are stepped over instead of decoded.
+    """
+    offset = 2
+    while offset < scan_limit:
+        marker = _read_at(stream, offset, 4)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+        code = marker[1]
+        if code == 0xFF:  # fill byte before a marker
+            offset += 1
+            continue
+        if code in JPEG_STANDALONE_MARKERS:
+            offset += 2
+            continue
+        if len(marker) < 4 or code in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            break
+        if code in JPEG_SOF_MARKERS:
+            frame = _read_at(stream, offset + 5, 4)
+            if len(frame) < 4:
+                break
+            height, width = struct.unpack('>HH', frame)
+            return width, height
+        offset += 2 + struct.unpack('>H', marker[2:4])[0]
+    raise UploadRejected('JPEG image header is damaged or truncated')
+
+
+def inspect_upload(file):
+    """Check an uploaded file's real type and image size from its headers
+
+    Only the first few KB and the last KB are read, and the stream
+    is rewound afterwards, so this runs before anything is saved or uploaded.
+    Returns an ``UploadInfo`` or raises ``UploadRejected``.
+    """
+    config = current_app.config
+    stream = file.stream
+    try:
+        header = _read_at(stream, 0, config.get('UPLOAD_SNIFF_BYTES', 8192))
+        mime_type = sniff_mimetype(header)
+        if mime_type is None:
+            raise UploadRejected('File is not a PDF, JPEG or PNG')
+
+        ext = file.filename.rsplit('.', 1)[1].lower() if file.filename and '.' in file.filename else None
+        if EXTENSION_MIMETYPES.get(ext) != mime_type:
+            raise UploadRejected(f'File content is {MIMETYPE_LABELS[mime_type]}, which does not match its .{ext} name')
+
+        # Writers may append a few bytes after the trailer, so look at the whole last KB
+        stream.seek(0, os.SEEK_END)
+        tail_size = min(stream.tell(), 1024)
+        if TRAILERS[mime_type] not in _read_at(stream, -tail_size, tail_size, os.SEEK_END):
+            raise UploadRejected(f'{MIMETYPE_LABELS[mime_type]} file is incomplete or damaged')
+        if mime_type == 'application/pdf':
+            return UploadInfo(mime_type, None, None)
+
+        if mime_type == 'image/png':
+            width, height = png_dimensions(header)
+        else:
+            width, height = jpeg_dimensions(stream, config.get('UPLOAD_JPEG_SCAN_BYTES', 256 * 1024))
+
+        min_side = config.get('UPLOAD_MIN_IMAGE_SIDE', 50)
+        if width < min_side or height < min_side:
+            raise UploadRejected(f'Image is too small ({width}x{height}); each side must be at least {min_side} pixels')
+        if width * height > config.get('UPLOAD_MAX_IMAGE_PIXELS', 40 * 1000 * 1000):
+            raise UploadRejected(f'Image is too large ({width}x{height})')
+        return UploadInfo(mime_type, width, height)
+    finally:
+        stream.seek(0)
+
+
+class FileContent:
+    """Form validator that checks an uploaded file's content with ``inspect_upload``"""
+
+    def __call__(self, form, field):
+        if not field.data or not getattr(field.data, 'filename', None):
+            return
+        try:
+            inspect_upload(field.data)
+        except UploadRejected as e:
+            raise ValidationError(str(e))
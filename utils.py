@@ -4,18 +4,12 @@ import string
 from datetime import datetime
 from flask_mail import Message
 from extensions import mail
+from metrics import traced
 import secrets
 import os
 import time
 import uuid  # Add this import for UUID generation
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from io import BytesIO
-from PIL import Image as PILImage
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+import threading
 
 def generate_otp():
     """Generate a 6-digit OTP"""
@@ -241,16 +235,47 @@ Dastaavej Team
             return False
 
 
-# Add this to your existing utils.py file
-import os
-from datetime import datetime
-from reportlab.lib.pagesizes import letter as LETTER_SIZE
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch as INCH
-from reportlab.lib.enums import TA_CENTER as TEXT_ALIGN_CENTER, TA_LEFT as TEXT_ALIGN_LEFT
+_pdf_styles = None
+_pdf_styles_lock = threading.Lock()
 
+def get_pdf_styles():
+    """Get the ReportLab stylesheet used for application forms, built once per process"""
+    global _pdf_styles
+    if _pdf_styles is None:
+        with _pdf_styles_lock:
+            if _pdf_styles is None:
+                from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+                from reportlab.lib.enums import TA_CENTER
+                
+                styles = getSampleStyleSheet()
+                
+                # Modify existing styles instead of adding new ones
+                heading_style = styles['Heading1']
+                heading_style.alignment = TA_CENTER
+                heading_style.fontSize = 16
+                
+                # Add a new style for centered normal text
+                styles.add(ParagraphStyle(
+                    name='Normal_CENTER',
+                    parent=styles['Normal'],
+                    alignment=TA_CENTER
+                ))
+                _pdf_styles = styles
+    return _pdf_styles
+
+def warm_pdf_renderer():
+    """Import ReportLab and render a throwaway page so fonts and styles are loaded"""
+    from io import BytesIO
+    from reportlab.platypus import SimpleDocTemplate, Paragraph
+    import PIL.Image  # noqa: F401 - loaded by ReportLab when embedding photos
+    
+    styles = get_pdf_styles()
+    SimpleDocTemplate(BytesIO()).build([
+        Paragraph("Warm up", styles['Heading1']),
+        Paragraph("<b>Warm up:</b> warm up", styles['Normal_CENTER']),
+    ])
+
+@traced('pdf')
 def generate_application_pdf(app, application_data, photo_path, document_type, temp_dir):
     """
     Generate a PDF application form with embedded photo
@@ -265,6 +290,12 @@ def generate_application_pdf(app, application_data, photo_path, document_type, t
     Returns:
         Path to the generated PDF file
     """
+    # ReportLab is only needed here, so keep it off the import path of every worker
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+    from reportlab.lib.units import inch
+    
     try:
         # Create a unique filename
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
@@ -282,19 +313,8 @@ def generate_application_pdf(app, application_data, photo_path, document_type, t
         )
         
         # Styles
-        styles = getSampleStyleSheet()
-        
-        # Modify existing styles instead of adding new ones
+        styles = get_pdf_styles()
         heading_style = styles['Heading1']
-        heading_style.alignment = TA_CENTER
-        heading_style.fontSize = 16
-        
-        # Add a new style for centered normal text
-        styles.add(ParagraphStyle(
-            name='Normal_CENTER',
-            parent=styles['Normal'],
-            alignment=TA_CENTER
-        ))
         
         # Content elements
         elements = []
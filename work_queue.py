@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+from extensions import db
+from models import Application
+from db_engine import write_transaction
+
+# Applications a reviewer can still act on
+CLAIMABLE_STATUSES = ('pending', 'under review')
+
+# Leases are bookkeeping, not changes to the application: setting updated_at to itself
+# overrides its onupdate, so cache keys, bundle date filters and "Last Updated" stay put
+_KEEP_UPDATED_AT = {'updated_at': Application.updated_at}
+
+
+def _lease_is_free(now):
+    return or_(Application.claimed_by.is_(None), Application.lease_expires_at.is_(None),
+               Application.lease_expires_at <= now)
+
+
+def _lease_expiry(now):
+    return now + timedelta(seconds=current_app.config.get('REVIEW_LEASE_SECONDS', 900))
+
+
+def claimed_applications(reviewer_id, now=None):
+    """Applications whose lease ``reviewer_id`` currently holds, oldest first"""
+    now = now or datetime.utcnow()
+    return Application.query.filter(
+        Application.claimed_by == reviewer_id,
+        Application.lease_expires_at > now,
+        Application.status.in_(CLAIMABLE_STATUSES),
+    ).order_by(Application.created_at).all()
+
+
+@write_transaction()
+def claim_batch(reviewer_id, batch_size=None, now=None):
+    """Lease up to ``batch_size`` unclaimed applications to a reviewer and return their ids
+
+    A single ``UPDATE ... WHERE id IN (SELECT ... LIMIT n)`` takes the rows,
+    so two reviewers never receive the same application. On PostgreSQL the
+    inner select uses ``FOR UPDATE SKIP LOCKED``, letting concurrent claims
+    pass each other instead of queueing; SQLite serializes writers anyway.
+    Leases that have expired count as unclaimed, so abandoned work returns
+    to the queue without a sweeper.
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or current_app.config.get('REVIEW_BATCH_SIZE', 10)
+    # Leases already held count against the batch, and are renewed with it
+    held = db.session.execute(
+        update(Application)
+        .where(Application.claimed_by == reviewer_id, Application.lease_expires_at > now,
+               Application.status.in_(CLAIMABLE_STATUSES))
+        .values(lease_expires_at=_lease_expiry(now), **_KEEP_UPDATED_AT)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    wanted = batch_size - held
+    if wanted <= 0:
+        return []
+
+    candidates = (
+        select(Application.id)
+        .where(Application.status.in_(CLAIMABLE_STATUSES), _lease_is_free(now))
+        .order_by(Application.created_at, Application.id)
+        .limit(wanted)
+        .with_for_update(skip_locked=True)
+    )
+    statement = (
+        update(Application)
+        .where(Application.id.in_(candidates.scalar_subquery()), _lease_is_free(now))
+        .values(claimed_by=reviewer_id, lease_expires_at=_lease_expiry(now), **_KEEP_UPDATED_AT)
+        .execution_options(synchronize_session=False)
+    )
+    if db.engine.dialect.update_returning:
+        return [row[0] for row in db.session.execute(statement.returning(Application.id))]
+
+    # Without RETURNING, take the candidates one by one; the guard on each UPDATE keeps claims exclusive
+    claimed = []
+    for application_id in db.session.scalars(candidates).all():
+        result = db.session.execute(
+            update(Application)
+            .where(Application.id == application_id, _lease_is_free(now))
+            .values(claimed_by=reviewer_id, lease_expires_at=_lease_expiry(now), **_KEEP_UPDATED_AT)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(application_id)
+    return claimed
+
+
+@write_transaction()
+def acquire_lease(application_id, reviewer_id, now=None):
+    """Claim or renew one application's lease; False if another reviewer holds it"""
+    now = now or datetime.utcnow()
+    result = db.session.execute(
+        update(Application)
+        .where(Application.id == application_id,
+               or_(Application.claimed_by == reviewer_id, _lease_is_free(now)))
+        .values(claimed_by=reviewer_id, lease_expires_at=_lease_expiry(now), **_KEEP_UPDATED_AT)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+@write_transaction()
+def release_lease(application_id, reviewer_id):
+    """Hand an application back to the queue; only the lease holder can release it"""
+    result = db.session.execute(
+        update(Application)
+        .where(Application.id == application_id, Application.claimed_by == reviewer_id)
+        .values(claimed_by=None, lease_expires_at=None, **_KEEP_UPDATED_AT)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def queue_depth(now=None):
+    """Number of actionable applications nobody holds a live lease on"""
+    now = now or datetime.utcnow()
+    return db.session.scalar(
+        select(db.func.count(Application.id))
+        .where(and_(Application.status.in_(CLAIMABLE_STATUSES), _lease_is_free(now)))
+    )
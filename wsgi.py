@@ -0,0 +1,42 @@
+"""Production WSGI entry point
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master process, so the app is
+built and warmed once and every forked worker shares those memory pages.
+"""
+from app import create_app
+from extensions import db
+from drive_api import warm_drive_client, reset_drive_service
+from utils import warm_pdf_renderer
+from background import reset_executors
+from events import limit_event_streams
+
+def warm_up(app):
+    """Load the expensive singletons before workers are forked"""
+    # Compile every template into the Jinja cache
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+    
+    # ReportLab modules, fonts and the application form stylesheet
+    warm_pdf_renderer()
+    
+    # Drive credentials and discovery document; the service itself is built per worker thread
+    if not warm_drive_client():
+        app.logger.warning("Google Drive client could not be warmed up")
+
+def reset_after_fork(app, threads=1):
+    """Drop state that must not be shared with the master process, and size the worker's event streams"""
+    with app.app_context():
+        # Connections opened in the master belong to it; workers open their own
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    reset_drive_service()
+    reset_executors()
+    
+    # Streams must leave threads free for page requests; a sync worker serves none
+    if not limit_event_streams(app, threads):
+        app.logger.info("Live updates are off in this worker; run gthread workers with GUNICORN_THREADS > 1 for them")
+
+app = create_app()
+warm_up(app)